@@ -0,0 +1,101 @@
+"""
+Compression benchmark: size and CPU cost of compressing the large JSON
+responses (`/my-history` and `/essay-results`) at different levels.
+
+    python benchmarks/compression.py --tests 30 --runs 20
+
+Payloads are synthetic tests serialized like the API does (UTF-8, no ASCII
+escaping). Brotli rows are skipped when the `compression` extra is missing.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from scripts.fake_openai_server import build_grading  # noqa: E402
+from storage_layout import QUESTION, synthetic_essay  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVELS = (1, 4, 6, 9)
+BROTLI_QUALITIES = (1, 4, 5, 8, 11)
+
+
+def build_test(rng: random.Random) -> dict:
+    return {
+        "_id": "%024x" % rng.getrandbits(96),
+        "user_id": "%024x" % rng.getrandbits(96),
+        "created_at": datetime.utcnow().isoformat(),
+        "question": QUESTION,
+        "essay": synthetic_essay(rng),
+        "results": build_grading(QUESTION),
+    }
+
+
+def payloads(tests: int, seed: int) -> dict[str, bytes]:
+    rng = random.Random(seed)
+    history = [build_test(rng) for _ in range(tests)]
+
+    def encode(value):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+    return {"essay-results": encode(history[0]), f"my-history ({tests})": encode(history)}
+
+
+def gzip_compress(level: int):
+    def compress(data: bytes) -> bytes:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    return compress
+
+
+def measure(compress, data: bytes, runs: int) -> tuple[int, float]:
+    size = len(compress(data))
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        compress(data)
+        best = min(best, time.perf_counter() - start)
+    return size, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response compression size and CPU cost")
+    parser.add_argument("--tests", type=int, default=30, help="tests in the history payload")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    codecs = [(f"gzip -{level}", gzip_compress(level)) for level in GZIP_LEVELS]
+    if brotli is not None:
+        codecs += [
+            (f"br q{quality}", lambda data, q=quality: brotli.compress(data, quality=q))
+            for quality in BROTLI_QUALITIES
+        ]
+    else:
+        print("brotli not installed, install the `compression` extra for br rows\n")
+
+    for name, data in payloads(args.tests, args.seed).items():
+        print(f"{name}: {len(data):,} B raw")
+        for label, compress in codecs:
+            size, ms = measure(compress, data, args.runs)
+            print(
+                f"  {label:<8} {size:>10,} B  ratio {len(data) / size:5.1f}x  "
+                f"{ms:7.2f} ms  {len(data) / 1e6 / (ms / 1000):7.1f} MB/s"
+            )
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Startup benchmark: how long `import app` takes, measured with `python -X importtime`.
+
+    python benchmarks/import_time.py --budget-ms 400
+
+Exits with status 1 when the best of --runs exceeds the budget, so it can gate CI.
+Heavy SDKs (openai, clerk_backend_api, motor/pymongo, zstandard) are expected to stay out of the
+import path; they are loaded in the app lifespan.
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+LAZY_MODULES = (
+    "openai",
+    "clerk_backend_api",
+    "motor",
+    "pymongo",
+    "zstandard",
+    "config.llmPrompts",
+)
+
+
+def measure_once() -> tuple[float, dict[str, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import app failed:\n{result.stderr[-2000:]}")
+
+    cumulative: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    return cumulative.get("app", 0) / 1000, cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget for `import app`")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "400")),
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # The first run warms the bytecode cache and is discarded.
+    measure_once()
+    runs = [measure_once() for _ in range(args.runs)]
+    best_ms, modules = min(runs, key=lambda run: run[0])
+
+    print(f"import app: best {best_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print(f"\nTop {args.top} top-level packages by cumulative import time:")
+    top_level = {name: us for name, us in modules.items() if "." not in name}
+    for name, us in sorted(top_level.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    eager = [name for name in LAZY_MODULES if name in modules]
+    if eager:
+        print(f"\nFAIL: lazily loaded modules imported eagerly: {', '.join(eager)}")
+    if best_ms > args.budget_ms:
+        print(f"\nFAIL: import time {best_ms:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+    if eager or best_ms > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
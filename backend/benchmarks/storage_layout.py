@@ -0,0 +1,148 @@
+"""
+Storage benchmark: the legacy single-document test layout against the
+summary/detail split with compressed text.
+
+    python benchmarks/storage_layout.py --users 20 --tests-per-user 50
+
+Uses MONGO_URI. Writes synthetic tests to two throwaway databases
+(`<db>_bench_legacy` and `<db>_bench_split`, dropped afterwards) and reports
+collection size, average document size and history-query latency.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(Path(__file__).resolve().parent.parent / "src" / ".env")
+
+from bson import ObjectId  # noqa: E402
+
+from controllers.db import DB_NAME, PsycheckDB, close_mongo, get_mongo_client  # noqa: E402
+from scripts.fake_openai_server import build_grading  # noqa: E402
+from services.text_analysis import CONNECTIVES, analyze_essay  # noqa: E402
+
+QUESTION = "האם לדעתך יש לחייב את בני הנוער להתנדב בקהילה כחלק מלימודיהם בבית הספר? נמק את עמדתך."
+WORDS = (
+    "התנדבות קהילה בני נוער בית ספר חובה אחריות חברתית ערכים חינוך זמן פנוי "
+    "לימודים מחויבות תרומה ניסיון עצמאות בחירה חופשית מוטיבציה תלמידים מורים"
+).split()
+
+
+def synthetic_essay(rng: random.Random, paragraphs: int = 5) -> str:
+    def sentence():
+        opener = rng.choice(CONNECTIVES)
+        return f"{opener} " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 20))) + "."
+
+    return "\n\n".join(
+        " ".join(sentence() for _ in range(rng.randint(3, 5))) for _ in range(paragraphs)
+    )
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def fill(legacy_db, split_db: PsycheckDB, users: int, tests_per_user: int, seed: int):
+    rng = random.Random(seed)
+    user_ids = [str(ObjectId()) for _ in range(users)]
+    for user_id in user_ids:
+        for _ in range(tests_per_user):
+            essay = synthetic_essay(rng)
+            results = build_grading(QUESTION)
+            analysis = analyze_essay(essay)
+            created_at = datetime.utcnow()
+            await legacy_db.tests.insert_one(
+                {
+                    "user_id": ObjectId(user_id),
+                    "created_at": created_at,
+                    "results": results,
+                    "question": QUESTION,
+                    "essay": essay,
+                    "analysis": analysis,
+                }
+            )
+            await split_db.create_test(user_id, created_at, results, QUESTION, essay, analysis)
+    await legacy_db.tests.create_index([("user_id", 1), ("created_at", -1)])
+    await split_db.ensure_indexes()
+    return user_ids
+
+
+async def coll_stats(db, name: str) -> dict:
+    stats = await db.command("collStats", name)
+    return {"size": stats.get("size", 0), "avg": stats.get("avgObjSize", 0)}
+
+
+async def time_queries(query, user_ids: list[str], rounds: int) -> list[float]:
+    timings = []
+    for _ in range(rounds):
+        for user_id in user_ids:
+            start = time.perf_counter()
+            await query(user_id)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: list[float]):
+    print(
+        f"  {label:<28} p50 {percentile(timings, 50):7.2f} ms  "
+        f"p95 {percentile(timings, 95):7.2f} ms  mean {statistics.mean(timings):7.2f} ms"
+    )
+
+
+async def run(args):
+    client = get_mongo_client()
+    legacy = client[f"{DB_NAME}_bench_legacy"]
+    split = PsycheckDB(client[f"{DB_NAME}_bench_split"])
+    await client.drop_database(legacy.name)
+    await client.drop_database(split.db.name)
+
+    try:
+        user_ids = await fill(legacy, split, args.users, args.tests_per_user, args.seed)
+
+        legacy_stats = await coll_stats(legacy, "tests")
+        summary_stats = await coll_stats(split.db, "tests")
+        detail_stats = await coll_stats(split.db, "test_details")
+        print(f"{args.users * args.tests_per_user} tests")
+        print(f"  legacy tests          {legacy_stats['size']:>12,} B  avg {legacy_stats['avg']:>7,} B")
+        print(f"  split tests (summary) {summary_stats['size']:>12,} B  avg {summary_stats['avg']:>7,} B")
+        print(f"  split test_details    {detail_stats['size']:>12,} B  avg {detail_stats['avg']:>7,} B")
+
+        async def legacy_history(user_id):
+            cursor = legacy.tests.find({"user_id": ObjectId(user_id)}).sort("created_at", -1)
+            return await cursor.to_list(length=None)
+
+        print("History query latency:")
+        report("legacy full documents", await time_queries(legacy_history, user_ids, args.rounds))
+        report("split full (summary+detail)", await time_queries(split.get_user_tests, user_ids, args.rounds))
+        report("split summaries only", await time_queries(split.get_user_test_summaries, user_ids, args.rounds))
+    finally:
+        if not args.keep:
+            await client.drop_database(legacy.name)
+            await client.drop_database(split.db.name)
+        close_mongo()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy vs split test storage")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tests-per-user", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=int(os.getenv("BENCH_SEED", "7")))
+    parser.add_argument("--keep", action="store_true", help="keep the bench databases")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,78 @@
-import traceback
+import asyncio
+from contextlib import asynccontextmanager
+import os
 from fastapi import FastAPI, Request, Response
-import fastapi
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from routes import checks, users, limiter
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
 from fastapi.exceptions import RequestValidationError
-from pymongo.errors import PyMongoError
 import logging
 
+# Load the environment once, before the routes read any module-level settings.
 load_dotenv()
 
-app = FastAPI(debug=True)
+from routes import admin, checks, sessions, users  # noqa: E402
+from routes.limiter import limiter  # noqa: E402
+from controllers.db import close_mongo, get_mongo_client, warm_up_mongo  # noqa: E402
+from utils.ClerkAuth import close_clerk, get_clerk, warm_up_clerk  # noqa: E402
+from utils.llm_router import close_llm_router, get_llm_router, warm_up_llm  # noqa: E402
+from services.question_catalog import close_question_catalog  # noqa: E402
+from utils.http import close_http_client  # noqa: E402
+from utils.metrics import (  # noqa: E402
+    RATE_LIMIT_REJECTIONS,
+    mark_worker_dead,
+    render_metrics,
+)
+from utils.tracing import setup_tracing  # noqa: E402
+from utils.logs import DEVELOPMENT, setup_logging  # noqa: E402
+from utils.timing import ServerTimingMiddleware  # noqa: E402
+from utils.compression import CompressionMiddleware  # noqa: E402
+from utils.profiler import ProfilerMiddleware  # noqa: E402
 
-app.state.limiter = limiter
+logger = logging.getLogger("uvicorn.error")
 
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
-logger = logging.getLogger("uvicorn.error")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker after fork, so no client is ever shared between processes.
+    # Warm-up pays for the lazy SDK imports, TLS handshakes and the Mongo pool
+    # here instead of on the first requests.
+    import config.llmPrompts  # noqa: F401
+
+    # Missing configuration is fatal; the getters raise before any network I/O.
+    get_mongo_client()
+    get_llm_router()
+    get_clerk()
+    await warm_up()
+    app.state.ready = True
+    logger.info("Worker %s ready", os.getpid())
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        await close_question_catalog()
+        close_llm_router()
+        close_clerk()
+        await close_http_client()
+        close_mongo()
+        mark_worker_dead()
+
+
+async def warm_up():
+    timeout = float(os.getenv("WARMUP_TIMEOUT", "10"))
+    steps = {"mongo": warm_up_mongo(), "llm": warm_up_llm(), "clerk": warm_up_clerk()}
+    results = await asyncio.gather(
+        *(asyncio.wait_for(step, timeout) for step in steps.values()),
+        return_exceptions=True,
+    )
+    for name, result in zip(steps, results):
+        # A slow or unreachable dependency is logged, not fatal: requests retry it.
+        if isinstance(result, BaseException):
+            logger.warning("Warm-up of %s failed: %r", name, result)
 
 
-@app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     # Get first error message
     error_msg = "Invalid input"
@@ -34,7 +83,6 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 
-@app.exception_handler(Exception)
 async def unhandled_exception_handler(request, exc):
     logger.error("Unhandled error" + str(exc), exc_info=True)
     return JSONResponse(
@@ -43,20 +91,76 @@ async def unhandled_exception_handler(request, exc):
     )
 
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    route = request.scope.get("route")
+    RATE_LIMIT_REJECTIONS.labels(path=getattr(route, "path", request.url.path)).inc()
+    return _rate_limit_exceeded_handler(request, exc)
 
 
-@app.get("/", tags=["Root"])
 async def root():
     return Response("Server is ruuning")
 
 
-app.include_router(checks.router, prefix="/api")
-app.include_router(users.router, prefix="/api")
-# app.include_router(webhooks.router, prefix="/webhooks")
+async def ready(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
+
+def create_app() -> FastAPI:
+    # Called in every worker, so each one gets its own listener thread.
+    setup_logging()
+    app = FastAPI(debug=DEVELOPMENT, lifespan=lifespan)
+
+    app.state.limiter = limiter
+    app.state.ready = False
+
+    setup_tracing(app)
+
+    app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+    app.add_exception_handler(RequestValidationError, validation_exception_handler)
+    app.add_exception_handler(Exception, unhandled_exception_handler)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Server-Timing", "ETag", "Idempotent-Replayed", "Retry-After"],
+    )
+    # Inside ServerTimingMiddleware so the header includes the compress stage.
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(ServerTimingMiddleware)
+    app.add_middleware(ProfilerMiddleware)
+
+    app.add_api_route("/", root, methods=["GET"], tags=["Root"])
+    app.add_api_route("/ready", ready, methods=["GET"], tags=["Root"])
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+
+    app.include_router(checks.router, prefix="/api")
+    app.include_router(users.router, prefix="/api")
+    app.include_router(sessions.router, prefix="/api")
+    app.include_router(admin.router, prefix="/api")
+    # app.include_router(webhooks.router, prefix="/webhooks")
+
+    return app
+
+
+_app = None
+
+
+def __getattr__(name: str):
+    # `uvicorn app:app` from before the factory still works; the app is only
+    # built on first access, so `import app` stays cheap.
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
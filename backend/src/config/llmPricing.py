@@ -0,0 +1,23 @@
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICING = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+}
+
+
+def estimate_cost(
+    model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0
+) -> float:
+    """Estimated USD cost of a single completion. Unknown models cost 0."""
+    pricing = MODEL_PRICING.get(model)
+    if not pricing:
+        return 0.0
+    input_price, cached_price, output_price = pricing
+    uncached_tokens = max(0, prompt_tokens - cached_tokens)
+    return (
+        uncached_tokens * input_price
+        + cached_tokens * cached_price
+        + completion_tokens * output_price
+    ) / 1_000_000
@@ -888,4 +888,58 @@ essay_test_user_prompt = """
 
 טקסט החיבור לבדיקה:
 {essay}
-"""
\ No newline at end of file
+"""
+essay_facts_prompt = """
+נתונים שחושבו מראש על החיבור (ספירה מדויקת, אין צורך לספור מחדש - הסתמך עליהם בהערכת קריטריוני הלשון והמבנה ובנימוקים):
+{facts}
+"""
+
+essay_question_prompt = """
+ניתוח שהוכן מראש לשאלה (משותף לכל הנבחנים שעונים עליה - אין צורך לנתח את השאלה מחדש; השתמש בנושא כ-task_topic):
+{question_analysis}
+"""
+
+question_analysis_system_prompt = """
+אתה מכין חומר עזר למעריכי מטלת הכתיבה בפסיכומטרי. בהינתן שאלת חיבור, נתח את השאלה בלבד (לא חיבור).
+
+Return the analysis in the following JSON structure:
+{
+  "topic": "משפט המתאר ממש בקצרה את הנושא של המשימה",
+  "key_arguments": ["3-6 טיעונים מרכזיים שחיבור טוב צפוי לדון בהם, בעד ונגד"],
+  "stances": ["2-4 עמדות אפשריות שנבחן יכול לנקוט, כל אחת במשפט אחד"]
+}
+
+החזר אך ורק אובייקט JSON תקני, ללא מלל נוסף.
+"""
+
+question_analysis_user_prompt = """
+השאלה:
+{question}
+"""
+
+essay_revision_user_prompt = """
+זוהי גרסה מתוקנת של חיבור שכבר נבדק. אין צורך לבדוק מחדש את כל החיבור - רק את ההשפעה של הפסקאות שהשתנו.
+
+השאלה:
+{question}
+
+ההערכה הקודמת (קריטריון: ציון - משוב):
+{previous_feedback}
+
+הפסקאות שנוספו או שונו בגרסה החדשה:
+{changed_paragraphs}
+
+פסקאות שהוסרו מהגרסה הקודמת:
+{removed_paragraphs}
+
+משפטי הקשר מהפסקאות הסמוכות שלא השתנו (להקשר בלבד, אין לבדוק אותם):
+{context}
+
+החזר אך ורק אובייקט JSON במבנה הבא, ובו רק הקריטריונים שהציון או המשוב שלהם משתנים בעקבות התיקונים (שמות הקריטריונים זהים לשמות בהערכה הקודמת):
+{{
+  "general_conclusion": "משפט מסכם מעודכן לחיבור כולו",
+  "content": {{"content_conclusion": "סיכום מעודכן או null", "criterias": [{{"criterion": "...", "score": 1-6, "feedback": "..."}}]}},
+  "language": {{"language_conclusion": "סיכום מעודכן או null", "criterias": [{{"criterion": "...", "score": 1-6, "feedback": "..."}}]}},
+  "suggestions": ["3–5 המלצות מעודכנות"]
+}}
+"""
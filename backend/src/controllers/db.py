@@ -1,17 +1,77 @@
+import asyncio
 from collections.abc import AsyncGenerator
+import json
 import logging
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from datetime import datetime
-from typing import Optional, Dict, Any, List
-from bson import ObjectId
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional, Dict, Any, List
+from bson import Binary, ObjectId
+from functools import lru_cache
 import os
-from dotenv import load_dotenv
+from utils.hashing import question_hash
+from utils.metrics import observe_db_method
+from utils.tracing import traced
 
-load_dotenv()
+# pymongo and zstandard are imported inside the functions that use them, like
+# motor, to keep them out of the `import app` path (benchmarks/import_time.py).
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 DB_NAME = "psycheck"
 
+# Length of the per-user and per-criterion score trends kept in user_stats.
+RECENT_STATS_SIZE = 20
+
+# Credits are refilled to DAILY_CREDITS once CREDIT_REFILL_INTERVAL has passed
+# since the last refill. The refill is never written on its own: reads compute
+# it with `available_credits`, and `spend_credit` applies it in the same atomic
+# update that spends, so concurrent requests cannot refill or spend twice.
+DAILY_CREDITS = int(os.getenv("DAILY_CREDITS", "2"))
+CREDIT_REFILL_INTERVAL = timedelta(hours=float(os.getenv("CREDIT_REFILL_HOURS", "24")))
+
+# Idempotency-Key records for check-essay. The owner of a pending record
+# refreshes its updated_at while the check runs (`touch_idempotency_key`); one
+# not refreshed for IDEMPOTENCY_PENDING_TIMEOUT belongs to a request that died
+# and may be taken over.
+IDEMPOTENCY_TTL = timedelta(hours=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+IDEMPOTENCY_PENDING_TIMEOUT = timedelta(
+    seconds=float(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "180"))
+)
+
+# The LLM ledger keeps one document per user and UTC day with $inc counters,
+# plus one per day under LEDGER_ALL_USERS with the totals over all users.
+LEDGER_ALL_USERS = "all"
+LEDGER_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd")
+
+# Tests are split into a compact, frequently read summary in `tests` (scores,
+# topic, timestamps, lookup keys) and a `test_details` document with the same
+# _id holding the question, the essay and the feedback tree. Large text
+# fields are stored zstd-compressed.
+STORAGE_COMPRESSION_MIN_BYTES = int(os.getenv("STORAGE_COMPRESSION_MIN_BYTES", "512"))
+STORAGE_ZSTD_LEVEL = int(os.getenv("STORAGE_ZSTD_LEVEL", "6"))
+
+# The question catalog holds one LLM analysis per question_hash. A worker
+# claims a question before analyzing it; a claim older than
+# QUESTION_CLAIM_TIMEOUT (a crash, or a failed analysis) may be taken over.
+QUESTION_CLAIM_TIMEOUT = timedelta(
+    seconds=float(os.getenv("QUESTION_CLAIM_TIMEOUT_SECONDS", "300"))
+)
+
+# Similarity fields are only used for lookups, never returned to clients.
+LOOKUP_FIELDS = ("minhash", "lsh_buckets")
+SUMMARY_PROJECTION = {field: 0 for field in LOOKUP_FIELDS}
+SUMMARY_LIST_PROJECTION = {
+    "user_id": 1,
+    "created_at": 1,
+    "topic": 1,
+    "scores": 1,
+    "revision_of": 1,
+    # Pre-split documents keep these inside the results tree.
+    "results.task_topic": 1,
+    "results.complete_score": 1,
+    "results.content.score": 1,
+    "results.language.score": 1,
+}
+
 logger = logging.getLogger(__name__)
 
 
@@ -26,13 +86,121 @@ def oid_to_str(doc):
     return doc
 
 
+@lru_cache(maxsize=None)
+def _zstd():
+    """(compressor, decompressor), created on first use."""
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=STORAGE_ZSTD_LEVEL), zstandard.ZstdDecompressor()
+
+
+def pack_text(text: str):
+    """Stores short text as is and long text as zstd-compressed bytes."""
+    data = text.encode("utf-8")
+    if len(data) < STORAGE_COMPRESSION_MIN_BYTES:
+        return text
+    return Binary(_zstd()[0].compress(data))
+
+
+def unpack_text(value):
+    if isinstance(value, bytes):
+        return _zstd()[1].decompress(value).decode("utf-8")
+    return value
+
+
+def pack_json(value):
+    return pack_text(json.dumps(value, ensure_ascii=False))
+
+
+def unpack_json(value):
+    if isinstance(value, (bytes, str)):
+        return json.loads(unpack_text(value))
+    return value
+
+
+def assemble_test(summary: dict, detail: Optional[dict]) -> dict:
+    """Rebuilds the full test from its summary and detail documents."""
+    if detail is None:
+        # Stored before the summary/detail split: already complete.
+        return summary
+    test = dict(summary)
+    test.update(
+        question=unpack_text(detail.get("question")),
+        essay=unpack_text(detail.get("essay")),
+        results=unpack_json(detail.get("results")),
+        analysis=detail.get("analysis"),
+    )
+    return test
+
+
+def summary_view(doc: dict) -> dict:
+    """Summary fields of a test, also for documents stored before the split."""
+    results = doc.pop("results", None)
+    if "scores" not in doc and results is not None:
+        doc["topic"] = results.get("task_topic")
+        doc["scores"] = {
+            "complete": results.get("complete_score"),
+            "content": results.get("content", {}).get("score"),
+            "language": results.get("language", {}).get("score"),
+        }
+    return doc
+
+
+def available_credits(user: dict, now: Optional[datetime] = None) -> int:
+    """Credits the user can spend right now, including a pending refill."""
+    now = now or datetime.utcnow()
+    credits = user.get("credits", 0)
+    last_refill = user.get("last_credit_update")
+    if last_refill is None or now - last_refill >= CREDIT_REFILL_INTERVAL:
+        return max(credits, DAILY_CREDITS)
+    return credits
+
+
+def _refill_due_expr() -> dict:
+    # Evaluated by the server against $$NOW, so every worker uses one clock.
+    return {
+        "$lte": [
+            {"$ifNull": ["$last_credit_update", datetime(1970, 1, 1)]},
+            {"$subtract": ["$$NOW", CREDIT_REFILL_INTERVAL.total_seconds() * 1000]},
+        ]
+    }
+
+
+def ledger_day(moment: Optional[datetime] = None) -> str:
+    return (moment or datetime.utcnow()).strftime("%Y-%m-%d")
+
+
+def stats_key(criterion: str) -> str:
+    """Criterion names are used as field names; Mongo forbids '.' and a leading '$'."""
+    return criterion.replace(".", "_").replace("$", "_")
+
+
 class PsycheckDB:
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: "AsyncIOMotorDatabase"):
         self.db = db
         self.users = db["users"]
         self.tests = db["tests"]
+        self.test_details = db["test_details"]
+        self.user_stats = db["user_stats"]
+        self.idempotency_keys = db["idempotency_keys"]
+        self.llm_ledger = db["llm_ledger"]
+        self.questions = db["questions"]
+
+    async def ensure_indexes(self):
+        await self.users.create_index("clerk_id")
+        await self.tests.create_index([("user_id", 1), ("created_at", -1)])
+        await self.tests.create_index("lsh_buckets")
+        await self.tests.create_index([("user_id", 1), ("lsh_buckets", 1)])
+        # Per-question analytics: tests of a question, newest first.
+        await self.tests.create_index([("question_hash", 1), ("created_at", -1)])
+        await self.idempotency_keys.create_index(
+            "created_at", expireAfterSeconds=int(IDEMPOTENCY_TTL.total_seconds())
+        )
+        await self.llm_ledger.create_index([("day", 1), ("user_id", 1)])
 
     # ------ user operations ------
+    @traced()
+    @observe_db_method
     async def get_user_obj(self, clerk_id: str) -> Optional[Dict[str, Any]]:
         try:
             user_obj = await self.users.find_one({"clerk_id": clerk_id})
@@ -41,10 +209,13 @@ class PsycheckDB:
             logger.exception(f"Error fetching user {clerk_id}")
             return None
 
+    @traced()
+    @observe_db_method
     async def create_user(self, clerk_id: str) -> Dict[str, Any]:
         user_obj = {
             "clerk_id": clerk_id,
-            "credits": 2,
+            "credits": DAILY_CREDITS,
+            "history_version": 0,
             "created_at": datetime.utcnow(),
             "last_credit_update": datetime.utcnow(),
         }
@@ -56,16 +227,387 @@ class PsycheckDB:
             logger.exception(f"Error creating user {clerk_id}")
             raise
 
+    @traced()
+    @observe_db_method
     async def update_user(self, _id, **user_details):
-        logger.debug(f"Updating user: {_id} with details {user_details}")
+        logger.debug("Updating user %s with details %s", _id, user_details)
         filter_query = {"_id": ObjectId(_id)}
         try:
             await self.users.update_one(filter_query, {"$set": {**user_details}})
-            logger.debug(f"User {_id} updated successfully.")
+            logger.debug("User %s updated successfully.", _id)
         except Exception as e:
             logger.error(f"Failed to update user {_id}: {e}")
 
+    @traced()
+    @observe_db_method
+    async def spend_credit(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically applies a pending refill and spends one credit.
+        Returns the updated user, or None when no credit is available.
+        """
+        from pymongo import ReturnDocument
+
+        due = _refill_due_expr()
+        user_obj = await self.users.find_one_and_update(
+            {
+                "_id": ObjectId(user_id),
+                "$expr": {"$or": [{"$gt": ["$credits", 0]}, due]},
+            },
+            [
+                {
+                    "$set": {
+                        "credits": {
+                            "$cond": [due, {"$max": ["$credits", DAILY_CREDITS]}, "$credits"]
+                        },
+                        "last_credit_update": {"$cond": [due, "$$NOW", "$last_credit_update"]},
+                    }
+                },
+                {"$set": {"credits": {"$subtract": ["$credits", 1]}}},
+            ],
+            return_document=ReturnDocument.AFTER,
+        )
+        return oid_to_str(user_obj) if user_obj else None
+
+    @traced()
+    @observe_db_method
+    async def refund_credit(self, user_id: str):
+        """Gives back a credit spent on a check that produced no test."""
+        try:
+            await self.users.update_one({"_id": ObjectId(user_id)}, {"$inc": {"credits": 1}})
+        except Exception:
+            logger.exception(f"Error refunding credit to user {user_id}")
+
+    @traced()
+    @observe_db_method
+    async def bump_history_version(self, user_id: str):
+        """Invalidates the user's cached history (see the my-history ETags)."""
+        try:
+            await self.users.update_one(
+                {"_id": ObjectId(user_id)}, {"$inc": {"history_version": 1}}
+            )
+        except Exception:
+            logger.exception(f"Error bumping history version for user {user_id}")
+
+    # ------ idempotency operations ------
+    @traced()
+    @observe_db_method
+    async def claim_idempotency_key(
+        self, user_id: str, key: str, fingerprint: str
+    ) -> tuple[bool, Dict[str, Any]]:
+        """
+        Tries to make this request the owner of an Idempotency-Key.
+        Returns (True, record) when the caller should run the check, otherwise
+        (False, record) with the record of the request that owns the key.
+        """
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        now = datetime.utcnow()
+        record_id = f"{user_id}:{key}"
+        record = {
+            "_id": record_id,
+            "fingerprint": fingerprint,
+            "status": "pending",
+            "test_id": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        try:
+            await self.idempotency_keys.insert_one(record)
+            return True, record
+        except DuplicateKeyError:
+            pass
+
+        # Take over keys whose first attempt failed or whose owner died.
+        taken = await self.idempotency_keys.find_one_and_update(
+            {
+                "_id": record_id,
+                "fingerprint": fingerprint,
+                "$or": [
+                    {"status": "failed"},
+                    {"status": "pending", "updated_at": {"$lt": now - IDEMPOTENCY_PENDING_TIMEOUT}},
+                ],
+            },
+            {"$set": {"status": "pending", "updated_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if taken:
+            return True, taken
+        existing = await self.idempotency_keys.find_one({"_id": record_id})
+        if existing is None:
+            # Expired between the insert and the lookup; try once more.
+            return await self.claim_idempotency_key(user_id, key, fingerprint)
+        return False, existing
+
+    @traced()
+    @observe_db_method
+    async def get_idempotency_record(self, user_id: str, key: str) -> Optional[Dict[str, Any]]:
+        return await self.idempotency_keys.find_one({"_id": f"{user_id}:{key}"})
+
+    @traced()
+    @observe_db_method
+    async def touch_idempotency_key(self, user_id: str, key: str):
+        """Heartbeat of the owner: keeps a pending record from being taken over."""
+        try:
+            await self.idempotency_keys.update_one(
+                {"_id": f"{user_id}:{key}", "status": "pending"},
+                {"$set": {"updated_at": datetime.utcnow()}},
+            )
+        except Exception:
+            logger.exception(f"Error refreshing idempotency key {key} for user {user_id}")
+
+    @traced()
+    @observe_db_method
+    async def finish_idempotency_key(self, user_id: str, key: str, test_id: Optional[str]):
+        """Stores the outcome: the test created for the key, or None on failure."""
+        try:
+            await self.idempotency_keys.update_one(
+                {"_id": f"{user_id}:{key}"},
+                {
+                    "$set": {
+                        "status": "done" if test_id else "failed",
+                        "test_id": test_id,
+                        "updated_at": datetime.utcnow(),
+                    }
+                },
+            )
+        except Exception:
+            logger.exception(f"Error finishing idempotency key {key} for user {user_id}")
+
+    # ------ LLM ledger operations ------
+    @traced()
+    @observe_db_method
+    async def record_llm_spend(self, user_id: str, usage: dict, graded: bool):
+        """Adds one check's LLM usage to the user's and the global ledger for today."""
+        from pymongo import UpdateOne
+
+        day = ledger_day()
+        inc = {field: usage.get(field, 0) for field in LEDGER_FIELDS}
+        inc["gradings"] = 1 if graded else 0
+        try:
+            await self.llm_ledger.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": f"{owner}:{day}"},
+                        {"$inc": inc, "$setOnInsert": {"user_id": owner, "day": day}},
+                        upsert=True,
+                    )
+                    for owner in (user_id, LEDGER_ALL_USERS)
+                ],
+                ordered=False,
+            )
+        except Exception:
+            logger.exception(f"Error recording LLM spend for user {user_id}")
+
+    @traced()
+    @observe_db_method
+    async def get_llm_spend(self, user_id: str, day: Optional[str] = None) -> tuple[float, float]:
+        """(user cost, total cost) in USD for a UTC day, today by default."""
+        day = day or ledger_day()
+        cursor = self.llm_ledger.find(
+            {"_id": {"$in": [f"{user_id}:{day}", f"{LEDGER_ALL_USERS}:{day}"]}},
+            {"user_id": 1, "cost_usd": 1},
+        )
+        costs = {doc["user_id"]: doc.get("cost_usd", 0.0) for doc in await cursor.to_list(length=2)}
+        return costs.get(user_id, 0.0), costs.get(LEDGER_ALL_USERS, 0.0)
+
+    @traced()
+    @observe_db_method
+    async def top_llm_spenders(self, since_day: str, limit: int = 20) -> List[Dict[str, Any]]:
+        pipeline = [
+            {"$match": {"day": {"$gte": since_day}, "user_id": {"$ne": LEDGER_ALL_USERS}}},
+            {
+                "$group": {
+                    "_id": "$user_id",
+                    **{field: {"$sum": f"${field}"} for field in (*LEDGER_FIELDS, "gradings")},
+                }
+            },
+            {"$sort": {"cost_usd": -1}},
+            {"$limit": limit},
+        ]
+        return await self.llm_ledger.aggregate(pipeline).to_list(length=limit)
+
+    @traced()
+    @observe_db_method
+    async def llm_cost_by_day(self, since_day: str) -> List[Dict[str, Any]]:
+        cursor = self.llm_ledger.find(
+            {"user_id": LEDGER_ALL_USERS, "day": {"$gte": since_day}}, {"_id": 0, "user_id": 0}
+        ).sort("day", 1)
+        return await cursor.to_list(length=None)
+
+    # ------ question catalog operations ------
+    @traced()
+    @observe_db_method
+    async def get_catalog_question(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.questions.find_one({"_id": key})
+        except Exception:
+            logger.exception(f"Error fetching catalog question {key}")
+            return None
+
+    @traced()
+    @observe_db_method
+    async def claim_catalog_question(self, key: str, question: str) -> bool:
+        """
+        Claims the analysis of a question: True for a new question, or one whose
+        earlier claim went stale without producing an analysis.
+        """
+        from pymongo.errors import DuplicateKeyError
+
+        now = datetime.utcnow()
+        try:
+            # Upsert: a ready or freshly claimed entry fails the filter, and the
+            # insert then collides on _id.
+            await self.questions.update_one(
+                {
+                    "_id": key,
+                    "status": {"$ne": "ready"},
+                    "claimed_at": {"$lt": now - QUESTION_CLAIM_TIMEOUT},
+                },
+                {
+                    "$set": {"status": "analyzing", "claimed_at": now},
+                    "$setOnInsert": {"question": question, "created_at": now},
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+        except Exception:
+            logger.exception(f"Error claiming catalog question {key}")
+            return False
+
+    @traced()
+    @observe_db_method
+    async def finish_catalog_question(self, key: str, analysis: Optional[dict]):
+        """Stores the analysis, or marks it failed; the claim then times out for a retry."""
+        update = (
+            {"status": "ready", "analysis": analysis, "analyzed_at": datetime.utcnow()}
+            if analysis is not None
+            else {"status": "failed"}
+        )
+        try:
+            await self.questions.update_one({"_id": key}, {"$set": update})
+        except Exception:
+            logger.exception(f"Error finishing catalog question {key}")
+
+    @traced()
+    @observe_db_method
+    async def question_stats(self, since: datetime, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most answered questions since `since`, with score averages and catalog topic."""
+        complete = {"$ifNull": ["$scores.complete", "$results.complete_score"]}
+        pipeline = [
+            {"$match": {"created_at": {"$gte": since}, "question_hash": {"$exists": True}}},
+            {
+                "$group": {
+                    "_id": "$question_hash",
+                    "tests": {"$sum": 1},
+                    "users": {"$addToSet": "$user_id"},
+                    "avg_complete": {"$avg": complete},
+                    "avg_content": {
+                        "$avg": {"$ifNull": ["$scores.content", "$results.content.score"]}
+                    },
+                    "avg_language": {
+                        "$avg": {"$ifNull": ["$scores.language", "$results.language.score"]}
+                    },
+                    "last_test_at": {"$max": "$created_at"},
+                }
+            },
+            {"$sort": {"tests": -1}},
+            {"$limit": limit},
+            {"$set": {"users": {"$size": "$users"}}},
+            {
+                "$lookup": {
+                    "from": self.questions.name,
+                    "localField": "_id",
+                    "foreignField": "_id",
+                    "as": "catalog",
+                }
+            },
+            {
+                "$set": {
+                    "topic": {"$first": "$catalog.analysis.topic"},
+                    "catalog_status": {"$first": "$catalog.status"},
+                }
+            },
+            {"$unset": "catalog"},
+        ]
+        try:
+            return await self.tests.aggregate(pipeline).to_list(length=limit)
+        except Exception:
+            logger.exception("Error aggregating question stats")
+            return []
+
+    # ------ user stats operations ------
+    @traced()
+    @observe_db_method
+    async def record_test_stats(self, user_id: str, created_at: datetime, results: dict):
+        """Folds one test into the user's stats document with a single atomic update."""
+        complete = float(results.get("complete_score") or 0)
+        content = float(results.get("content", {}).get("score") or 0)
+        language = float(results.get("language", {}).get("score") or 0)
+
+        inc = {
+            "count": 1,
+            "sum_complete": complete,
+            "sum_content": content,
+            "sum_language": language,
+        }
+        push = {
+            "recent": {
+                "$each": [
+                    {
+                        "created_at": created_at,
+                        "complete": complete,
+                        "content": content,
+                        "language": language,
+                    }
+                ],
+                "$slice": -RECENT_STATS_SIZE,
+            }
+        }
+        set_fields = {"last_test_at": created_at}
+        for section in ("content", "language"):
+            for criterion in results.get(section, {}).get("criterias", []):
+                name = criterion.get("criterion")
+                if not name:
+                    continue
+                key = f"criteria.{stats_key(name)}"
+                score = float(criterion.get("score") or 0)
+                inc[f"{key}.sum"] = inc.get(f"{key}.sum", 0) + score
+                inc[f"{key}.count"] = inc.get(f"{key}.count", 0) + 1
+                push[f"{key}.recent"] = {"$each": [score], "$slice": -RECENT_STATS_SIZE}
+                set_fields[f"{key}.name"] = name
+                set_fields[f"{key}.section"] = section
+
+        try:
+            await self.user_stats.update_one(
+                {"_id": ObjectId(user_id)},
+                {
+                    "$inc": inc,
+                    "$max": {"best_score": complete},
+                    "$push": push,
+                    "$set": set_fields,
+                },
+                upsert=True,
+            )
+        except Exception:
+            # Stats are derived data and can be rebuilt with the backfill script.
+            logger.exception(f"Error recording stats for user {user_id}")
+
+    @traced()
+    @observe_db_method
+    async def get_user_stats(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            stats = await self.user_stats.find_one({"_id": ObjectId(user_id)})
+            return oid_to_str(stats) if stats else None
+        except Exception:
+            logger.exception(f"Error fetching stats for user {user_id}")
+            return None
+
     # ------ test operations ------
+    @traced()
+    @observe_db_method
     async def create_test(
         self,
         user_id: str,
@@ -73,56 +615,177 @@ class PsycheckDB:
         results: dict,
         question: str,
         essay: str,
+        analysis: Optional[dict] = None,
+        minhash: Optional[List[int]] = None,
+        lsh_buckets: Optional[List[str]] = None,
+        near_duplicates: Optional[dict] = None,
+        revision_of: Optional[str] = None,
+        llm_usage: Optional[dict] = None,
     ) -> Dict[str, Any]:
-        test = {
+        test_id = ObjectId()
+        summary = {
+            "_id": test_id,
             "user_id": ObjectId(user_id),
             "created_at": created_at,
-            "results": results,
-            "question": question,
-            "essay": essay,
+            "question_hash": question_hash(question),
+            "topic": results.get("task_topic"),
+            "scores": {
+                "complete": results.get("complete_score"),
+                "content": results.get("content", {}).get("score"),
+                "language": results.get("language", {}).get("score"),
+            },
+            "minhash": minhash,
+            "lsh_buckets": lsh_buckets,
+            "near_duplicates": near_duplicates,
+            "revision_of": ObjectId(revision_of) if revision_of else None,
+            "llm_usage": llm_usage,
+        }
+        detail = {
+            "_id": test_id,
+            "user_id": ObjectId(user_id),
+            "question": pack_text(question),
+            "essay": pack_text(essay),
+            "results": pack_json(results),
+            "analysis": analysis,
         }
         try:
-            result = await self.tests.insert_one(test)
-            test["_id"] = result.inserted_id
-            return oid_to_str(test)
+            # Detail first: a visible summary always has its detail document.
+            await self.test_details.insert_one(detail)
+            await self.tests.insert_one(summary)
         except Exception:
             logger.exception(f"Error creating test for {user_id}")
             raise
+        await self.bump_history_version(user_id)
+        await self.record_test_stats(user_id, created_at, results)
 
+        test = {k: v for k, v in summary.items() if k not in LOOKUP_FIELDS}
+        test.update(question=question, essay=essay, results=results, analysis=analysis)
+        return oid_to_str(test)
+
+    @traced()
+    @observe_db_method
     async def get_test(self, test_id: str) -> Optional[Dict[str, Any]]:
         try:
-            test = await self.tests.find_one({"_id": ObjectId(test_id)})
-            if test:
-                test["_id"] = str(test["_id"])
-                test["user_id"] = str(test["user_id"])
-            return test
+            summary, detail = await asyncio.gather(
+                self.tests.find_one({"_id": ObjectId(test_id)}, SUMMARY_PROJECTION),
+                self.test_details.find_one({"_id": ObjectId(test_id)}),
+            )
+            return oid_to_str(assemble_test(summary, detail)) if summary else None
         except Exception:
             logger.exception(f"Error fetching test {test_id}")
             return None
 
+    @traced()
+    @observe_db_method
     async def get_user_tests(self, user_id: str) -> List[Dict[str, Any]]:
         try:
-            tests_cursor = self.tests.find({"user_id": ObjectId(user_id)})
-            tests = await tests_cursor.to_list(length=None)
+            tests_cursor = self.tests.find(
+                {"user_id": ObjectId(user_id)}, SUMMARY_PROJECTION
+            ).sort("created_at", 1)
+            summaries = await tests_cursor.to_list(length=None)
 
-            for test in tests:
-                test["_id"] = str(test["_id"])
-                test["user_id"] = str(test["user_id"])
-            return tests
+            details_cursor = self.test_details.find(
+                {"_id": {"$in": [summary["_id"] for summary in summaries]}}
+            )
+            details = {
+                detail["_id"]: detail
+                for detail in await details_cursor.to_list(length=None)
+            }
+            return oid_to_str(
+                [assemble_test(summary, details.get(summary["_id"])) for summary in summaries]
+            )
 
         except Exception:
             logger.exception(f"Error getting tests for user {user_id}")
             return []
 
+    @traced()
+    @observe_db_method
+    async def get_user_test_summaries(self, user_id: str) -> List[Dict[str, Any]]:
+        """The history from the compact summary documents only, oldest first like get_user_tests."""
+        try:
+            cursor = self.tests.find(
+                {"user_id": ObjectId(user_id)}, SUMMARY_LIST_PROJECTION
+            ).sort("created_at", 1)
+            return oid_to_str([summary_view(doc) for doc in await cursor.to_list(length=None)])
+        except Exception:
+            logger.exception(f"Error getting test summaries for user {user_id}")
+            return []
 
-# Dependency for FastAPI
-client = AsyncIOMotorClient(MONGO_URI)
+    @traced()
+    @observe_db_method
+    async def find_lsh_candidates(
+        self,
+        lsh_buckets: List[str],
+        user_id: Optional[str] = None,
+        exclude_user_id: Optional[str] = None,
+        question_key: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """
+        Newest tests sharing at least one LSH bucket, with just what's needed to
+        compare: of one user (and question), or of everyone but one user.
+        """
+        query: Dict[str, Any] = {"lsh_buckets": {"$in": lsh_buckets}}
+        if user_id is not None:
+            query["user_id"] = ObjectId(user_id)
+        elif exclude_user_id is not None:
+            query["user_id"] = {"$ne": ObjectId(exclude_user_id)}
+        if question_key is not None:
+            query["question_hash"] = question_key
+        try:
+            cursor = (
+                self.tests.find(query, {"user_id": 1, "minhash": 1})
+                .sort("created_at", -1)
+                .limit(limit)
+            )
+            candidates = await cursor.to_list(length=limit)
+            for candidate in candidates:
+                candidate["_id"] = str(candidate["_id"])
+                candidate["user_id"] = str(candidate["user_id"])
+            return candidates
+        except Exception:
+            logger.exception("Error finding LSH candidates")
+            return []
+
+
+# One client per worker process, created in the app lifespan (after fork).
+_client: Optional["AsyncIOMotorClient"] = None
+
+
+def get_mongo_client() -> "AsyncIOMotorClient":
+    global _client
+    if _client is None:
+        # Imported lazily to keep motor/pymongo out of the app import path.
+        from motor.motor_asyncio import AsyncIOMotorClient
 
+        _client = AsyncIOMotorClient(
+            os.getenv("MONGO_URI", "mongodb://localhost:27017/"),
+            maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+            minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "5")),
+            connectTimeoutMS=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+            serverSelectionTimeoutMS=int(
+                os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")
+            ),
+        )
+    return _client
 
+
+async def warm_up_mongo():
+    """Opens MONGO_MIN_POOL_SIZE pooled connections with concurrent pings."""
+    client = get_mongo_client()
+    connections = max(1, int(os.getenv("MONGO_MIN_POOL_SIZE", "5")))
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(connections)))
+    await PsycheckDB(client[DB_NAME]).ensure_indexes()
+
+
+def close_mongo():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+# Dependency for FastAPI
 async def get_db() -> AsyncGenerator[PsycheckDB, None]:
-    client = AsyncIOMotorClient(MONGO_URI)
-    try:
-        db = client[DB_NAME]
-        yield PsycheckDB(db)
-    finally:
-        client.close()
+    yield PsycheckDB(get_mongo_client()[DB_NAME])
@@ -0,0 +1,112 @@
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel, Field
+from controllers.db import PsycheckDB, get_db, ledger_day
+from utils.ClerkAuth import require_admin
+from utils.profiler import get_settings, update_settings
+from utils.llm_router import get_llm_router
+from utils.timing import TimedRoute
+
+router = APIRouter(
+    prefix="/admin", route_class=TimedRoute, dependencies=[Depends(require_admin)]
+)
+
+
+class ProfilerSettingsPayload(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+    slow_threshold_ms: Optional[float] = Field(None, ge=0)
+    interval: Optional[float] = Field(None, gt=0)
+
+
+@router.get("/profiler", tags=["Admin"])
+async def get_profiler():
+    return asdict(get_settings())
+
+
+@router.put("/profiler", tags=["Admin"])
+async def set_profiler(payload: ProfilerSettingsPayload):
+    settings = update_settings(**payload.model_dump(exclude_none=True))
+    return asdict(settings)
+
+
+class LLMSpend(BaseModel):
+    calls: int = 0
+    gradings: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+
+
+class UserLLMSpend(LLMSpend):
+    user_id: str
+
+
+class DailyLLMSpend(LLMSpend):
+    day: str
+    cost_per_grading: Optional[float] = None
+
+
+@router.get("/llm/providers", tags=["Admin"])
+async def llm_providers():
+    """Routing state of this worker: latency and error averages per provider."""
+    return get_llm_router().snapshot()
+
+
+@router.get("/llm/top-spenders", tags=["Admin"], response_model=List[UserLLMSpend])
+async def top_spenders(
+    days: int = Query(7, ge=1, le=366),
+    limit: int = Query(20, ge=1, le=200),
+    db: PsycheckDB = Depends(get_db),
+):
+    since = ledger_day(datetime.utcnow() - timedelta(days=days - 1))
+    spenders = await db.top_llm_spenders(since, limit)
+    for spender in spenders:
+        spender["user_id"] = spender.pop("_id")
+    return spenders
+
+
+@router.get("/llm/cost-per-grading", tags=["Admin"], response_model=List[DailyLLMSpend])
+async def cost_per_grading(
+    days: int = Query(30, ge=1, le=366),
+    db: PsycheckDB = Depends(get_db),
+):
+    since = ledger_day(datetime.utcnow() - timedelta(days=days - 1))
+    return [
+        {
+            **day,
+            "cost_per_grading": (
+                day["cost_usd"] / day["gradings"] if day.get("gradings") else None
+            ),
+        }
+        for day in await db.llm_cost_by_day(since)
+    ]
+
+
+class QuestionStats(BaseModel):
+    question_hash: str
+    topic: Optional[str] = None
+    catalog_status: Optional[str] = None
+    tests: int
+    users: int
+    avg_complete: Optional[float] = None
+    avg_content: Optional[float] = None
+    avg_language: Optional[float] = None
+    last_test_at: datetime
+
+
+@router.get("/questions", tags=["Admin"], response_model=List[QuestionStats])
+async def question_stats(
+    days: int = Query(30, ge=1, le=366),
+    limit: int = Query(50, ge=1, le=500),
+    db: PsycheckDB = Depends(get_db),
+):
+    """Most answered questions with score averages, and their catalog topic."""
+    since = datetime.utcnow() - timedelta(days=days)
+    questions = await db.question_stats(since, limit)
+    for question in questions:
+        question["question_hash"] = question.pop("_id")
+    return questions
@@ -1,14 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from typing import Annotated, Optional
+import asyncio
+from contextlib import nullcontext
+import hashlib
+import json
+import logging
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from typing import Annotated, Awaitable, Callable, Optional
 from pydantic import BaseModel, Field
 from utils.ClerkAuth import auth_and_get_user
-from services.essay_checker import check_essay_with_ai
-from controllers.db import PsycheckDB, get_db
+from services.essay_checker import (
+    check_essay_with_ai,
+    regrade_revision_with_ai,
+    reuse_results,
+)
+from services.text_analysis import analyze_essay, count_words_and_lines, diff_paragraphs
+from services.prescreen import prescreen_essay, rejection_detail
+from services.question_catalog import get_question_analysis
+from services.minhash import find_near_duplicates, lsh_buckets, minhash_signature
+from controllers.db import IDEMPOTENCY_PENDING_TIMEOUT, PsycheckDB, available_credits, get_db
 from datetime import datetime, timedelta, timezone
 from typing import Any, List
 from routes.limiter import limiter
-
-router = APIRouter(prefix="/checks")
+from utils.timing import TimedRoute
+from utils.metrics import track_stage
+from utils.cancellation import CancelPolicy
+from utils.admission import grading_admission, is_priority_user
+from utils.hashing import question_hash
+from utils.openAI import track_llm_usage
+from utils.http_cache import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    cache_headers,
+    etag_matches,
+    make_etag,
+    not_modified,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/checks", route_class=TimedRoute)
+
+# Revisions changing more than this share of paragraphs are graded from scratch.
+REVISION_MAX_CHANGED_RATIO = float(os.getenv("REVISION_MAX_CHANGED_RATIO", "0.6"))
+
+# Daily LLM spend limits in USD, per user and over all users (0 = unlimited).
+USER_DAILY_LLM_BUDGET_USD = float(os.getenv("USER_DAILY_LLM_BUDGET_USD", "0"))
+DAILY_LLM_BUDGET_USD = float(os.getenv("DAILY_LLM_BUDGET_USD", "0"))
+
+# Accepted essay length in estimated lines (more than MIN, at most MAX).
+MIN_ESSAY_LINES = 10
+MAX_ESSAY_LINES = 50
+
+# Per client on check-essay, and per user for checks over a grading session.
+CHECK_RATE_LIMIT = "5/minute"
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# How long a retry waits for the in-flight request with the same Idempotency-Key.
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "120"))
+# The owner refreshes its record this often, well within the takeover timeout.
+IDEMPOTENCY_HEARTBEAT_SECONDS = IDEMPOTENCY_PENDING_TIMEOUT.total_seconds() / 3
+# Claims per request: a retry runs the check itself after a failed first attempt,
+# which can only happen a bounded number of times before we give up.
+IDEMPOTENCY_MAX_CLAIMS = 3
 
 
 class CheckEssayPayload(BaseModel):
@@ -16,6 +69,11 @@ class CheckEssayPayload(BaseModel):
         ..., min_length=1, max_length=3000, description="The essay question"
     )
     essay: str = Field(..., min_length=1, max_length=6000, description="The essay text")
+    previous_test_id: Optional[str] = Field(
+        None,
+        pattern="^[a-fA-F0-9]{24}$",
+        description="Earlier test this essay revises; only changed paragraphs are re-graded",
+    )
 
 
 class CriterionResult(BaseModel):
@@ -46,6 +104,24 @@ class TestResults(BaseModel):
     suggestions: List[str]
 
 
+class TestScores(BaseModel):
+    complete: Optional[float] = None
+    content: Optional[float] = None
+    language: Optional[float] = None
+
+
+class TestSummary(BaseModel):
+    id: str = Field(..., alias="_id")
+    user_id: str
+    created_at: datetime
+    topic: Optional[str] = None
+    scores: TestScores
+    revision_of: Optional[str] = None
+
+    class Config:
+        validate_by_name = True
+
+
 class Test(BaseModel):
     id: str = Field(..., alias="_id")
     user_id: str
@@ -53,70 +129,333 @@ class Test(BaseModel):
     results: TestResults
     question: str
     essay: str
+    analysis: Optional[dict] = None
+    revision_of: Optional[str] = None
 
     class Config:
         validate_by_name = True  # lets you return either _id or id
 
 
+def essay_length_status(essay: str) -> str:
+    """"ok", "too_short" or "too_long", by the estimated line count."""
+    _, essay_lines_count = count_words_and_lines(essay)
+    if essay_lines_count <= MIN_ESSAY_LINES:
+        return "too_short"
+    if essay_lines_count > MAX_ESSAY_LINES:
+        return "too_long"
+    return "ok"
+
+
 async def check_essay_length(essay: str):
-    essay_word_count = len(essay.split())
-    essay_lines_count = essay_word_count // 12
-    if essay_lines_count <= 10:
+    status = essay_length_status(essay)
+    if status == "too_short":
         raise HTTPException(422, "Essay too short")
 
-    if essay_lines_count > 50:
+    if status == "too_long":
         raise HTTPException(422, "Essay too long")
     return
 
 
+async def check_llm_budget(db: PsycheckDB, user_id: str):
+    if not USER_DAILY_LLM_BUDGET_USD and not DAILY_LLM_BUDGET_USD:
+        return
+    user_cost, total_cost = await db.get_llm_spend(user_id)
+    if USER_DAILY_LLM_BUDGET_USD and user_cost >= USER_DAILY_LLM_BUDGET_USD:
+        raise HTTPException(429, "Daily grading budget exhausted")
+    if DAILY_LLM_BUDGET_USD and total_cost >= DAILY_LLM_BUDGET_USD:
+        logger.warning("Global daily LLM budget of %.2f USD reached", DAILY_LLM_BUDGET_USD)
+        raise HTTPException(503, "Grading is temporarily unavailable")
+
+
+async def regrade_revision(
+    payload: CheckEssayPayload,
+    revised: dict,
+    analysis: dict,
+    question_analysis: Optional[dict] = None,
+) -> dict:
+    """Re-grades only the paragraphs that changed since `revised`, or all of it if most did."""
+    diff = diff_paragraphs(revised["essay"], payload.essay)
+    if not diff["changed"] and not diff["removed"]:
+        return revised["results"]
+    # merge_revision only updates existing criteria, so results without any (a
+    # pre-screen rejection stored before those became 422s) are graded in full.
+    has_criteria = all(
+        revised["results"].get(section, {}).get("criterias") for section in ("content", "language")
+    )
+    if not has_criteria or diff["changed_ratio"] > REVISION_MAX_CHANGED_RATIO:
+        return await check_essay_with_ai(
+            question=payload.question,
+            essay=payload.essay,
+            analysis=analysis,
+            question_analysis=question_analysis,
+        )
+    return await regrade_revision_with_ai(
+        question=payload.question,
+        essay=payload.essay,
+        previous_results=revised["results"],
+        diff=diff,
+        analysis=analysis,
+    )
+
+
+async def load_revised_test(db: PsycheckDB, payload: CheckEssayPayload, user: dict) -> dict:
+    """The test named by `previous_test_id`, checked to be the user's and of the same question."""
+    revised = await db.get_test(payload.previous_test_id)
+    if not revised:
+        raise HTTPException(status_code=404, detail="Test not found")
+    if revised["user_id"] != user["_id"]:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    # Its feedback was written for its question; merging it into another would be wrong.
+    if question_hash(revised["question"]) != question_hash(payload.question):
+        raise HTTPException(422, "The previous test answers a different question")
+    return revised
+
+
+async def run_essay_check(
+    payload: CheckEssayPayload,
+    user: dict,
+    db: PsycheckDB,
+    policy: Optional[CancelPolicy] = None,
+    progress: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> dict:
+    """
+    Grades and stores one essay; `policy` decides whether the LLM call may be
+    abandoned, and `progress` is awaited with the name of each stage as it starts.
+    """
+    policy = policy or CancelPolicy.persistent()
+
+    async def report(stage: str):
+        if progress is not None:
+            await progress(stage)
+    with track_stage("credit_check"):
+        # Read-only early exit; the credit is actually spent before grading.
+        if available_credits(user) <= 0:
+            raise HTTPException(429, "Credits exhausted")
+
+    await check_essay_length(
+        payload.essay
+    )  # Preliminary check for essay length to avoid unnecessary LLM call
+
+    await report("analysis")
+    with track_stage("analysis"):
+        analysis = analyze_essay(payload.essay)
+
+    with track_stage("prescreen"):
+        screen = prescreen_essay(payload.question, payload.essay, user_id=user["_id"])
+    if not screen.passed:
+        # A heuristic decision: nothing is stored and no credit is spent.
+        raise HTTPException(422, rejection_detail(screen))
+
+    await report("near_duplicates")
+    with track_stage("near_duplicates"):
+        signature = minhash_signature(payload.essay)
+        buckets = lsh_buckets(signature)
+        near_duplicates = await find_near_duplicates(
+            db, user["_id"], payload.question, signature, buckets
+        )
+
+    revised = None
+    if payload.previous_test_id:
+        revised = await load_revised_test(db, payload, user)
+
+    duplicate = None
+    if not revised and near_duplicates["reused_from"]:
+        duplicate = await db.get_test(near_duplicates["reused_from"])
+
+    needs_llm = bool(revised or not duplicate)
+    question_analysis = None
+    if needs_llm:
+        with track_stage("budget_check"):
+            await check_llm_budget(db, user["_id"])
+        with track_stage("question_catalog"):
+            question_analysis = await get_question_analysis(db, payload.question)
+
+    # Only LLM work queues for a grading slot; the cheap paths never wait or shed.
+    admission = (
+        grading_admission.slot(is_priority_user(user)) if needs_llm else nullcontext()
+    )
+    async with admission:
+        with track_stage("spend_credit"):
+            if not await db.spend_credit(user["_id"]):
+                raise HTTPException(429, "Credits exhausted")
+
+        llm_usage, test = None, None
+        try:
+            await report("grading")
+            if revised:
+                with track_llm_usage() as llm_usage:
+                    results = await policy.run(
+                        regrade_revision(payload, revised, analysis, question_analysis)
+                    )
+            elif duplicate:
+                # A resubmission of the user's own essay with a few words changed.
+                results = reuse_results(duplicate["results"], payload.essay)
+            else:
+                with track_llm_usage() as llm_usage:
+                    results = await policy.run(
+                        check_essay_with_ai(
+                            question=payload.question,
+                            essay=payload.essay,
+                            analysis=analysis,
+                            question_analysis=question_analysis,
+                        )
+                    )
+
+            await report("saving")
+            with track_stage("create_test"):
+                test = await db.create_test(
+                    user_id=user["_id"],
+                    created_at=datetime.now(timezone.utc),
+                    results=results,
+                    question=payload.question,
+                    essay=payload.essay,
+                    analysis=analysis,
+                    minhash=signature,
+                    lsh_buckets=buckets,
+                    near_duplicates=near_duplicates,
+                    revision_of=revised["_id"] if revised else None,
+                    llm_usage=llm_usage.as_dict() if llm_usage and llm_usage.calls else None,
+                )
+        except Exception:
+            # No test was stored (failure, disconnect or deadline), so the check is not charged.
+            await db.refund_credit(user["_id"])
+            raise
+        finally:
+            # Tokens are paid for whether or not a test came out of them.
+            if llm_usage and llm_usage.calls:
+                await db.record_llm_spend(
+                    user["_id"], llm_usage.as_dict(), graded=test is not None
+                )
+
+    return test
+
+
+def payload_fingerprint(payload: CheckEssayPayload) -> str:
+    body = json.dumps(payload.model_dump(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+async def wait_for_idempotent_outcome(
+    db: PsycheckDB, user_id: str, key: str, record: dict
+) -> dict:
+    """Polls the record of the request that owns the key until it finishes or we give up."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.2
+    while record["status"] == "pending" and loop.time() < deadline:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 2.0)
+        record = await db.get_idempotency_record(user_id, key) or {"status": "failed"}
+    return record
+
+
+async def keep_idempotency_key(db: PsycheckDB, user_id: str, key: str):
+    """Refreshes the owner's pending record until cancelled."""
+    while True:
+        await asyncio.sleep(IDEMPOTENCY_HEARTBEAT_SECONDS)
+        await db.touch_idempotency_key(user_id, key)
+
+
+async def check_essay_idempotent(
+    payload: CheckEssayPayload, user: dict, key: str, response: Response, db: PsycheckDB
+) -> dict:
+    """
+    Runs the check at most once per Idempotency-Key. Retries of a finished
+    request get the stored test; retries of an in-flight one wait for it.
+    """
+    fingerprint = payload_fingerprint(payload)
+    for _ in range(IDEMPOTENCY_MAX_CLAIMS):
+        claimed, record = await db.claim_idempotency_key(user["_id"], key, fingerprint)
+        if claimed:
+            test = None
+            heartbeat = asyncio.create_task(keep_idempotency_key(db, user["_id"], key))
+            try:
+                # The outcome is stored for retries, so it must complete.
+                test = await run_essay_check(payload, user, db, CancelPolicy.persistent())
+                return test
+            finally:
+                heartbeat.cancel()
+                await db.finish_idempotency_key(user["_id"], key, test["_id"] if test else None)
+
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(422, "Idempotency-Key was already used for a different request")
+
+        with track_stage("idempotency_wait"):
+            record = await wait_for_idempotent_outcome(db, user["_id"], key, record)
+
+        if record["status"] == "done":
+            test = await db.get_test(record["test_id"])
+            if not test:
+                logger.error(f"Test {record['test_id']} of idempotency key {key} could not be loaded")
+                raise HTTPException(500, "The result of this Idempotency-Key could not be loaded")
+            response.headers["Idempotent-Replayed"] = "true"
+            return test
+        if record["status"] == "pending":
+            raise HTTPException(409, "A request with this Idempotency-Key is still in progress")
+        # The first attempt failed: claim the key and run the check ourselves.
+    raise HTTPException(409, "Another request with this Idempotency-Key keeps failing")
+
+
 @router.post("/check-essay", response_model=Test, tags=["Checks"])
-@limiter.limit("5/minute")
+@limiter.limit(CHECK_RATE_LIMIT)
 async def check_essay(
     payload: CheckEssayPayload,
     request: Request,
+    response: Response,
     db: PsycheckDB = Depends(get_db),
 ):
     user = await auth_and_get_user(request, db)
     if not user:
         raise HTTPException(401, "Unauthorized")
 
-    if user["credits"] <= 0:
-        raise HTTPException(429, "Credits exhausted")
+    key = request.headers.get("Idempotency-Key")
+    if key is None:
+        return await run_essay_check(payload, user, db, CancelPolicy.interactive(request))
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(422, "Invalid Idempotency-Key")
+    return await check_essay_idempotent(payload, user, key, response, db)
 
-    await check_essay_length(
-        payload.essay
-    )  # Preliminary check for essay length to avoid unnecessary LLM call
-
-    results = await check_essay_with_ai(
-        question=payload.question,
-        essay=payload.essay,
-    )
 
-    test = await db.create_test(
-        user_id=user["_id"],
-        created_at=datetime.now(timezone.utc),
-        results=results,
-        question=payload.question,
-        essay=payload.essay,
-    )
+async def user_history(request: Request, response: Response, db: PsycheckDB, full: bool):
+    user_obj = await auth_and_get_user(request, db)
+    if not user_obj:
+        raise HTTPException(status_code=401, detail="Unauthorized")
 
-    await db.update_user(
-        _id=user["_id"],
-        credits=user["credits"] - 1,
+    # history_version changes with every new test, so it validates the whole list.
+    etag = make_etag(
+        "history-full" if full else "history-summary",
+        user_obj["_id"],
+        user_obj.get("history_version", 0),
     )
+    if etag_matches(request, etag):
+        return not_modified(etag, REVALIDATE_CACHE_CONTROL)
 
-    return test
+    if full:
+        history = await db.get_user_tests(user_obj["_id"])
+    else:
+        history = await db.get_user_test_summaries(user_obj["_id"])
+    cache_headers(response, etag, REVALIDATE_CACHE_CONTROL)
+    return history
 
 
 @router.get("/my-history", tags=["Checks"], response_model=list[Test])
 @limiter.limit("20/minute")
-async def my_history(request: Request, db: PsycheckDB = Depends(get_db)):
+async def my_history(request: Request, response: Response, db: PsycheckDB = Depends(get_db)):
+    """Every test of the user in full, oldest first."""
+    return await user_history(request, response, db, full=True)
 
-    user_obj = await auth_and_get_user(request, db)
-    if not user_obj:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-    tests = await db.get_user_tests(user_obj["_id"])
-    return tests or []
+
+@router.get("/my-history/summary", tags=["Checks"], response_model=list[TestSummary])
+@limiter.limit("20/minute")
+async def my_history_summary(
+    request: Request, response: Response, db: PsycheckDB = Depends(get_db)
+):
+    """
+    Scores and topics only, oldest first like /my-history, read from the
+    summary documents without loading any test details. Each full test comes
+    from essay-results.
+    """
+    return await user_history(request, response, db, full=False)
 
 
 @router.get("/essay-results/{test_id}", tags=["Checks"], response_model=Test)
@@ -126,12 +465,20 @@ async def get_essay_results(
         str, Field(..., description="The ID of the test", pattern="^[a-fA-F0-9]{24}$")
     ],
     request: Request,
+    response: Response,
     db: PsycheckDB = Depends(get_db),
 ):
     user_obj = await auth_and_get_user(request, db)
     if not user_obj:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+    # Stored results never change. The ETag is bound to the requesting user, so
+    # a 304 without loading the test reveals nothing: a body is only ever sent
+    # after the ownership check below.
+    etag = make_etag("test", test_id, user_obj["_id"])
+    if etag_matches(request, etag):
+        return not_modified(etag, IMMUTABLE_CACHE_CONTROL)
+
     test = await db.get_test(test_id)
     if not test:
         raise HTTPException(status_code=404, detail="Test not found")
@@ -139,4 +486,5 @@ async def get_essay_results(
     if test["user_id"] != user_obj["_id"]:
         raise HTTPException(status_code=403, detail="Forbidden")
 
+    cache_headers(response, etag, IMMUTABLE_CACHE_CONTROL)
     return test
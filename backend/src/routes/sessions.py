@@ -0,0 +1,222 @@
+"""
+WebSocket grading session: live local metrics while the student writes, and
+the full grading with progress events on demand, over one socket.
+
+Client messages:
+    {"type": "draft", "essay": "..."}                      debounced keystroke batches
+    {"type": "check", "question": "...", "essay": "...",
+     "previous_test_id": null, "request_id": "..."}        full grading, one at a time
+    {"type": "ping"}
+
+Server messages: "ready", "metrics", "progress" (stage), "result" (the Test),
+"error" (status, detail, and retry_after when grading is busy or rate limited)
+and "pong".
+
+Checks count against the same per-minute limit as POST /check-essay, per user.
+Handshakes from browser origins other than the frontend's are rejected.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from limits import parse
+from pydantic import ValidationError
+
+from controllers.db import PsycheckDB, available_credits, get_db
+from routes.checks import (
+    CHECK_RATE_LIMIT,
+    MAX_ESSAY_LINES,
+    MIN_ESSAY_LINES,
+    CheckEssayPayload,
+    Test,
+    essay_length_status,
+    run_essay_check,
+)
+from routes.limiter import limiter
+from services.text_analysis import analyze_essay
+from utils.ClerkAuth import auth_and_get_user, websocket_auth_request, websocket_origin_allowed
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/sessions")
+
+# Drafts arriving faster than this are coalesced; only the latest is analyzed.
+DRAFT_INTERVAL = float(os.getenv("SESSION_DRAFT_INTERVAL_MS", "300")) / 1000
+MAX_DRAFT_CHARS = 6000
+# Same limit as POST /check-essay, keyed by user since a socket outlives any one request.
+CHECK_LIMIT = parse(CHECK_RATE_LIMIT)
+
+# 1008: policy violation, used for a rejected handshake.
+WS_POLICY_VIOLATION = 1008
+
+
+def draft_metrics(essay: str) -> dict:
+    analysis = analyze_essay(essay)
+    return {
+        "type": "metrics",
+        "word_count": analysis["word_count"],
+        "line_count": analysis["line_count"],
+        "length_status": essay_length_status(essay),
+        "min_lines": MIN_ESSAY_LINES + 1,
+        "max_lines": MAX_ESSAY_LINES,
+        "paragraph_count": analysis["paragraph_count"],
+        "sentence_count": analysis["sentence_count"],
+        "long_sentences": analysis["long_sentences"],
+        "connective_count": analysis["connective_count"],
+        "distinct_connectives": analysis["distinct_connectives"],
+        "paragraphs_opening_with_connective": analysis["paragraphs_opening_with_connective"],
+        "slang": analysis["slang"],
+    }
+
+
+class GradingSession:
+    def __init__(self, websocket: WebSocket, db: PsycheckDB, user: dict):
+        self.websocket = websocket
+        self.db = db
+        self.user = user
+        self.latest_draft: Optional[str] = None
+        self.draft_ready = asyncio.Event()
+        self.check_task: Optional[asyncio.Task] = None
+        self.closed = False
+
+    async def send(self, message: dict):
+        if self.closed:
+            return
+        try:
+            await self.websocket.send_json(message)
+        except (WebSocketDisconnect, RuntimeError):
+            self.closed = True
+
+    async def error(
+        self,
+        status: int,
+        detail: str,
+        request_id: Optional[str] = None,
+        retry_after: Optional[int] = None,
+    ):
+        message = {"type": "error", "status": status, "detail": detail, "request_id": request_id}
+        if retry_after is not None:
+            message["retry_after"] = retry_after
+        await self.send(message)
+
+    def check_retry_after(self) -> Optional[int]:
+        """Counts a check against the user's limit; seconds to wait when over it."""
+        if limiter.limiter.hit(CHECK_LIMIT, "session_check", self.user["_id"]):
+            return None
+        reset_time, _ = limiter.limiter.get_window_stats(CHECK_LIMIT, "session_check", self.user["_id"])
+        return max(1, int(reset_time - time.time()))
+
+    async def metrics_loop(self):
+        while True:
+            await self.draft_ready.wait()
+            self.draft_ready.clear()
+            await self.send(draft_metrics(self.latest_draft))
+            # Drafts arriving meanwhile only replace latest_draft.
+            await asyncio.sleep(DRAFT_INTERVAL)
+
+    async def grade(self, payload: CheckEssayPayload, request_id: Optional[str]):
+        async def progress(stage: str):
+            await self.send({"type": "progress", "stage": stage, "request_id": request_id})
+
+        try:
+            # Credits may have changed since the socket opened.
+            user = await self.db.get_user_obj(self.user["clerk_id"]) or self.user
+            test = await run_essay_check(payload, user, self.db, progress=progress)
+        except HTTPException as e:
+            retry_after = (e.headers or {}).get("Retry-After")
+            await self.error(
+                e.status_code,
+                e.detail,
+                request_id,
+                retry_after=int(retry_after) if retry_after else None,
+            )
+            return
+        except Exception:
+            logger.exception("Grading failed in session for user %s", self.user["_id"])
+            await self.error(500, "Internal server error", request_id)
+            return
+
+        await self.send(
+            {
+                "type": "result",
+                "request_id": request_id,
+                "test": Test.model_validate(test).model_dump(mode="json", by_alias=True),
+            }
+        )
+
+    async def handle(self, message: dict):
+        kind = message.get("type")
+        if kind == "draft":
+            essay = message.get("essay")
+            if not isinstance(essay, str) or len(essay) > MAX_DRAFT_CHARS:
+                await self.error(422, "Invalid draft")
+                return
+            self.latest_draft = essay
+            self.draft_ready.set()
+        elif kind == "check":
+            request_id = message.get("request_id")
+            if self.check_task is not None and not self.check_task.done():
+                await self.error(409, "A check is already running", request_id)
+                return
+            try:
+                payload = CheckEssayPayload.model_validate(message)
+            except ValidationError:
+                await self.error(422, "Invalid input", request_id)
+                return
+            retry_after = self.check_retry_after()
+            if retry_after is not None:
+                await self.error(429, "Rate limit exceeded", request_id, retry_after=retry_after)
+                return
+            self.check_task = asyncio.create_task(self.grade(payload, request_id))
+        elif kind == "ping":
+            await self.send({"type": "pong"})
+        else:
+            await self.error(422, "Unknown message type")
+
+    async def serve(self):
+        await self.send({"type": "ready", "credits": available_credits(self.user)})
+        metrics_task = asyncio.create_task(self.metrics_loop())
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    await self.error(422, "Invalid JSON")
+                    continue
+                if isinstance(message, dict):
+                    await self.handle(message)
+                else:
+                    await self.error(422, "Invalid input")
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.closed = True
+            metrics_task.cancel()
+            if self.check_task is not None:
+                # The credit is spent and the LLM paid for: let the check finish
+                # and store its test, which then shows up in the history.
+                await self.check_task
+
+
+@router.websocket("/grading")
+async def grading_session(websocket: WebSocket, db: PsycheckDB = Depends(get_db)):
+    if not websocket_origin_allowed(websocket):
+        await websocket.close(code=WS_POLICY_VIOLATION)
+        return
+    try:
+        user = await auth_and_get_user(websocket_auth_request(websocket), db)
+    except HTTPException:
+        await websocket.close(code=WS_POLICY_VIOLATION)
+        return
+    if not user:
+        await websocket.close(code=WS_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    await GradingSession(websocket, db, user).serve()
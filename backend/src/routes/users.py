@@ -1,11 +1,13 @@
 from pydantic import BaseModel, Field
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request
-from controllers.db import PsycheckDB, get_db
+from controllers.db import PsycheckDB, available_credits, get_db
 from utils.ClerkAuth import auth_and_get_user
 from routes.limiter import limiter
+from utils.timing import TimedRoute
 
-router = APIRouter(prefix="/users")
+router = APIRouter(prefix="/users", route_class=TimedRoute)
 
 
 class User(BaseModel):
@@ -16,15 +18,71 @@ class User(BaseModel):
     last_credit_update: datetime
 
 
+class ScorePoint(BaseModel):
+    created_at: datetime
+    complete: float
+    content: float
+    language: float
+
+
+class CriterionStats(BaseModel):
+    name: str
+    section: str
+    average: float
+    count: int
+    recent: List[float]
+
+
+class UserStats(BaseModel):
+    count: int = 0
+    average_complete: float = 0
+    average_content: float = 0
+    average_language: float = 0
+    best_score: float = 0
+    last_test_at: Optional[datetime] = None
+    recent: List[ScorePoint] = []
+    criteria: Dict[str, CriterionStats] = {}
+
+
+def format_user_stats(stats: Optional[dict]) -> UserStats:
+    if not stats or not stats.get("count"):
+        return UserStats()
+    count = stats["count"]
+    return UserStats(
+        count=count,
+        average_complete=stats.get("sum_complete", 0) / count,
+        average_content=stats.get("sum_content", 0) / count,
+        average_language=stats.get("sum_language", 0) / count,
+        best_score=stats.get("best_score", 0),
+        last_test_at=stats.get("last_test_at"),
+        recent=stats.get("recent", []),
+        criteria={
+            key: CriterionStats(
+                name=criterion.get("name", key),
+                section=criterion.get("section", ""),
+                average=criterion["sum"] / criterion["count"] if criterion.get("count") else 0,
+                count=criterion.get("count", 0),
+                recent=criterion.get("recent", []),
+            )
+            for key, criterion in stats.get("criteria", {}).items()
+        },
+    )
+
+
+@router.get("/stats", tags=["Users"], response_model=UserStats)
+@limiter.limit("20/minute")
+async def get_stats(request: Request, db: PsycheckDB = Depends(get_db)):
+    user_obj = await auth_and_get_user(request, db)
+    if not user_obj:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return format_user_stats(await db.get_user_stats(user_obj["_id"]))
+
+
 @router.get("/user-details", tags=["Users"], response_model=User)
 @limiter.limit("20/minute")
 async def get_user(request: Request, db: PsycheckDB = Depends(get_db)):
     user_obj = await auth_and_get_user(request, db)
-    last_update = user_obj.get("last_credit_update")
-    if last_update is not None and datetime.utcnow() - last_update > timedelta(days=1):
-        user_obj = await db.update_user(
-            _id=user_obj["_id"], credits=2, last_credit_update=datetime.utcnow()
-        )
     if not user_obj:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    return user_obj
+    # A due refill is shown here but only written when a credit is spent.
+    return {**user_obj, "credits": available_credits(user_obj)}
@@ -0,0 +1,151 @@
+"""
+Rebuilds the `user_stats` documents from all stored tests.
+
+Run from `backend/src`:
+    python -m scripts.backfill_user_stats [--user-id <id>]
+
+Safe to re-run: every user's document is replaced with the aggregated totals.
+Tests created while the backfill runs may be counted twice for that user, so
+run it before deploying the write path or in a quiet window.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import ReplaceOne
+
+from controllers.db import (
+    DB_NAME,
+    RECENT_STATS_SIZE,
+    close_mongo,
+    get_mongo_client,
+    stats_key,
+    unpack_json,
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def score(field: str, legacy_path: str) -> dict:
+    # Split tests keep their scores in `scores`; older ones only in `results`.
+    return {"$ifNull": [f"$scores.{field}", {"$ifNull": [f"$results.{legacy_path}", 0]}]}
+
+
+def totals_pipeline(match: dict) -> list:
+    complete = score("complete", "complete_score")
+    content = score("content", "content.score")
+    language = score("language", "language.score")
+    return [
+        {"$match": match},
+        {"$sort": {"user_id": 1, "created_at": 1}},
+        {
+            "$group": {
+                "_id": "$user_id",
+                "count": {"$sum": 1},
+                "sum_complete": {"$sum": complete},
+                "sum_content": {"$sum": content},
+                "sum_language": {"$sum": language},
+                "best_score": {"$max": complete},
+                "last_test_at": {"$max": "$created_at"},
+                "recent": {
+                    "$push": {
+                        "created_at": "$created_at",
+                        "complete": complete,
+                        "content": content,
+                        "language": language,
+                    }
+                },
+            }
+        },
+        {"$set": {"recent": {"$slice": ["$recent", -RECENT_STATS_SIZE]}}},
+    ]
+
+
+def fold_criteria(stats: dict, user_id, results: dict):
+    for section in ("content", "language"):
+        for criterion in results.get(section, {}).get("criterias", []):
+            name = criterion.get("criterion")
+            if not isinstance(name, str):
+                continue
+            score_value = float(criterion.get("score") or 0)
+            entry = stats.setdefault(user_id, {}).setdefault(
+                stats_key(name),
+                {"name": name, "section": section, "sum": 0.0, "count": 0, "recent": []},
+            )
+            entry["sum"] += score_value
+            entry["count"] += 1
+            entry["recent"] = (entry["recent"] + [score_value])[-RECENT_STATS_SIZE:]
+
+
+async def criteria_stats(db, match: dict) -> dict:
+    """
+    Per-user criterion stats. Criteria live in the (compressed) test_details
+    results, which aggregation can't read, so they are folded here in batches.
+    """
+    stats = {}
+    cursor = db.tests.find(
+        match, {"user_id": 1, "results.content.criterias": 1, "results.language.criterias": 1}
+    ).sort([("user_id", 1), ("created_at", 1)])
+
+    async def fold(batch):
+        details = {
+            detail["_id"]: detail
+            async for detail in db.test_details.find(
+                {"_id": {"$in": [summary["_id"] for summary in batch]}}, {"results": 1}
+            )
+        }
+        for summary in batch:
+            detail = details.get(summary["_id"])
+            results = unpack_json(detail["results"]) if detail else summary.get("results", {})
+            fold_criteria(stats, summary["user_id"], results or {})
+
+    batch = []
+    async for summary in cursor:
+        batch.append(summary)
+        if len(batch) >= BATCH_SIZE:
+            await fold(batch)
+            batch = []
+    if batch:
+        await fold(batch)
+    return stats
+
+
+async def backfill(user_id: str = None):
+    db = get_mongo_client()[DB_NAME]
+    match = {"user_id": ObjectId(user_id)} if user_id else {}
+
+    stats = {}
+    async for doc in db.tests.aggregate(totals_pipeline(match), allowDiskUse=True):
+        doc["criteria"] = {}
+        stats[doc["_id"]] = doc
+
+    for user, criteria in (await criteria_stats(db, match)).items():
+        if user in stats:
+            stats[user]["criteria"] = criteria
+
+    operations = [ReplaceOne({"_id": _id}, doc, upsert=True) for _id, doc in stats.items()]
+    for start in range(0, len(operations), BATCH_SIZE):
+        await db.user_stats.bulk_write(operations[start : start + BATCH_SIZE], ordered=False)
+    logger.info("Backfilled stats for %d users", len(operations))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild user_stats from tests")
+    parser.add_argument("--user-id", help="Only rebuild this user's stats")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(backfill(args.user_id))
+    finally:
+        close_mongo()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Local stand-in for the OpenAI chat-completions API.
+
+Returns essay-grading JSON shaped like the schema in `essay_test_system_prompt`
+(or a question analysis, for `question_analysis_system_prompt`) with
+configurable latency, output token rate, streaming and failure injection, so
+the app and the benchmarks can run without the network.
+
+Run from `backend/src`:
+    python -m scripts.fake_openai_server --port 8100 --latency-ms 800 --rate-429 0.05
+
+Then point the app at it with `OPENAI_BASE_URL=http://localhost:8100/v1`.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CONTENT_CRITERIA = [
+    "התמקדות בנושא ואי סטייה ממנו",
+    "הרחבה וביסוס של הטענות",
+    "הצגת מורכבות ונקודות מבט נוספות",
+    "מבנה וארגון הטקסט",
+]
+
+LANGUAGE_CRITERIA = [
+    "שפה עשירה, קולחת ואחידה ברמתה",
+    "דיוק בדקדוק ובתחביר",
+    "מבנה החיבור – פסקאות ומילות קישור",
+    "שימוש במשפטים מגוונים",
+    "ניסוח ההולם כתיבה עיונית",
+]
+
+
+@dataclass
+class FakeSettings:
+    latency_ms: float = float(os.getenv("FAKE_OPENAI_LATENCY_MS", "500"))
+    latency_jitter_ms: float = float(os.getenv("FAKE_OPENAI_LATENCY_JITTER_MS", "0"))
+    tokens_per_second: float = float(os.getenv("FAKE_OPENAI_TOKENS_PER_SECOND", "0"))
+    rate_429: float = float(os.getenv("FAKE_OPENAI_RATE_429", "0"))
+    rate_500: float = float(os.getenv("FAKE_OPENAI_RATE_500", "0"))
+    malformed_rate: float = float(os.getenv("FAKE_OPENAI_MALFORMED_RATE", "0"))
+    seed: int | None = (
+        int(os.environ["FAKE_OPENAI_SEED"]) if os.getenv("FAKE_OPENAI_SEED") else None
+    )
+
+
+settings = FakeSettings()
+rng = random.Random(settings.seed)
+
+app = FastAPI(title="Fake OpenAI")
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token estimate, good enough for usage numbers and pacing."""
+    return max(1, len(text) // 3)
+
+
+def build_grading(question: str) -> dict:
+    def criteria(names):
+        return [
+            {
+                "criterion": name,
+                "score": rng.randint(3, 6),
+                "feedback": "משוב לדוגמה שנוצר על ידי השרת המדומה.",
+            }
+            for name in names
+        ]
+
+    return {
+        "general_conclusion": "סיכום כללי לדוגמה.",
+        "task_topic": question[:120],
+        "content": {
+            "content_conclusion": "סיכום תוכן לדוגמה.",
+            "criterias": criteria(CONTENT_CRITERIA),
+        },
+        "language": {
+            "language_conclusion": "סיכום לשון לדוגמה.",
+            "criterias": criteria(LANGUAGE_CRITERIA),
+        },
+        "suggestions": ["המלצה לדוגמה לשיפור הכתיבה."],
+    }
+
+
+def build_question_analysis(question: str) -> dict:
+    return {
+        "topic": question[:120] or "נושא לדוגמה",
+        "key_arguments": ["טיעון בעד לדוגמה.", "טיעון נגד לדוגמה.", "טיעון נוסף לדוגמה."],
+        "stances": ["עמדה בעד לדוגמה.", "עמדה נגד לדוגמה."],
+    }
+
+
+def is_question_analysis(messages: list[dict]) -> bool:
+    # Only the question-analysis schema has key_arguments.
+    return any(
+        '"key_arguments"' in (m.get("content") or "")
+        for m in messages
+        if m.get("role") == "system"
+    )
+
+
+def extract_question(messages: list[dict]) -> str:
+    user_messages = [m.get("content") or "" for m in messages if m.get("role") == "user"]
+    if not user_messages:
+        return ""
+    lines = [line for line in user_messages[-1].splitlines() if line.strip()]
+    return lines[1] if len(lines) > 1 else ""
+
+
+def build_content(messages: list[dict]) -> str:
+    question = extract_question(messages)
+    if is_question_analysis(messages):
+        response = build_question_analysis(question)
+    else:
+        response = build_grading(question)
+    content = json.dumps(response, ensure_ascii=False)
+    if rng.random() < settings.malformed_rate:
+        # Cut the object in half so json.loads fails on the client side.
+        content = content[: len(content) // 2]
+    return content
+
+
+async def simulate_latency():
+    delay = settings.latency_ms + rng.uniform(0, settings.latency_jitter_ms)
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+
+
+def injected_error() -> JSONResponse | None:
+    roll = rng.random()
+    if roll < settings.rate_429:
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": "1"},
+            content={"error": {"message": "Rate limit reached", "type": "requests"}},
+        )
+    if roll < settings.rate_429 + settings.rate_500:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Internal error", "type": "server_error"}},
+        )
+    return None
+
+
+def usage_for(messages: list[dict], content: str) -> dict:
+    prompt_tokens = sum(approx_tokens(m.get("content") or "") for m in messages)
+    completion_tokens = approx_tokens(content)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o")
+    messages = body.get("messages", [])
+
+    await simulate_latency()
+    error = injected_error()
+    if error is not None:
+        return error
+
+    content = build_content(messages)
+    usage = usage_for(messages, content)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if body.get("stream"):
+        return StreamingResponse(
+            stream_chunks(completion_id, created, model, content, usage, body),
+            media_type="text/event-stream",
+        )
+
+    if settings.tokens_per_second > 0:
+        await asyncio.sleep(usage["completion_tokens"] / settings.tokens_per_second)
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": usage,
+    }
+
+
+async def stream_chunks(completion_id, created, model, content, usage, body):
+    def chunk(delta: dict, finish_reason=None, **extra) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+
+    # Emit roughly one token (3 characters) per chunk at the configured rate.
+    delay = 1 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0
+    for i in range(0, len(content), 3):
+        if delay:
+            await asyncio.sleep(delay)
+        yield chunk({"content": content[i : i + 3]})
+
+    yield chunk({}, finish_reason="stop")
+    if (body.get("stream_options") or {}).get("include_usage"):
+        usage_chunk = json.dumps(
+            {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": usage,
+            }
+        )
+        yield f"data: {usage_chunk}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {
+        "object": "list",
+        "data": [{"id": "gpt-4o", "object": "model", "owned_by": "fake"}],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=settings.latency_ms)
+    parser.add_argument("--latency-jitter-ms", type=float, default=settings.latency_jitter_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=settings.tokens_per_second)
+    parser.add_argument("--rate-429", type=float, default=settings.rate_429)
+    parser.add_argument("--rate-500", type=float, default=settings.rate_500)
+    parser.add_argument("--malformed-rate", type=float, default=settings.malformed_rate)
+    parser.add_argument("--seed", type=int, default=settings.seed)
+    args = parser.parse_args()
+
+    global rng
+    settings.latency_ms = args.latency_ms
+    settings.latency_jitter_ms = args.latency_jitter_ms
+    settings.tokens_per_second = args.tokens_per_second
+    settings.rate_429 = args.rate_429
+    settings.rate_500 = args.rate_500
+    settings.malformed_rate = args.malformed_rate
+    settings.seed = args.seed
+    rng = random.Random(args.seed)
+
+    import uvicorn
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
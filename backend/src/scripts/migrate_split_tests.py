@@ -0,0 +1,108 @@
+"""
+Moves tests stored before the summary/detail split into the new layout:
+question, essay and results go to `test_details` (compressed), and the
+`tests` document keeps only the summary fields.
+
+Run from `backend/src`:
+    python -m scripts.migrate_split_tests [--batch-size 200] [--dry-run]
+
+Idempotent: only documents that still have an `essay` field are touched, and
+the detail document is written before the summary is trimmed.
+"""
+
+import argparse
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+from pymongo import ReplaceOne, UpdateOne
+
+from controllers.db import (
+    DB_NAME,
+    close_mongo,
+    get_mongo_client,
+    pack_json,
+    pack_text,
+)
+from utils.hashing import question_hash
+
+logger = logging.getLogger(__name__)
+
+LEGACY_FIELDS = ("question", "essay", "results", "analysis")
+
+
+def split_legacy_test(test: dict) -> tuple[dict, dict]:
+    results = test.get("results") or {}
+    detail = {
+        "_id": test["_id"],
+        "user_id": test["user_id"],
+        "question": pack_text(test.get("question", "")),
+        "essay": pack_text(test.get("essay", "")),
+        "results": pack_json(results),
+        "analysis": test.get("analysis"),
+    }
+    summary_fields = {
+        "question_hash": question_hash(test.get("question", "")),
+        "topic": results.get("task_topic"),
+        "scores": {
+            "complete": results.get("complete_score"),
+            "content": results.get("content", {}).get("score"),
+            "language": results.get("language", {}).get("score"),
+        },
+    }
+    return detail, summary_fields
+
+
+async def migrate(batch_size: int, dry_run: bool):
+    db = get_mongo_client()[DB_NAME]
+    migrated = 0
+
+    while True:
+        batch = await db.tests.find({"essay": {"$exists": True}}).limit(batch_size).to_list(
+            length=batch_size
+        )
+        if not batch:
+            break
+
+        details, summaries = [], []
+        for test in batch:
+            detail, summary_fields = split_legacy_test(test)
+            details.append(ReplaceOne({"_id": test["_id"]}, detail, upsert=True))
+            summaries.append(
+                UpdateOne(
+                    {"_id": test["_id"]},
+                    {
+                        "$set": summary_fields,
+                        "$unset": {field: "" for field in LEGACY_FIELDS},
+                    },
+                )
+            )
+
+        if dry_run:
+            logger.info("Would migrate %d tests (dry run stops after one batch)", len(batch))
+            return
+
+        await db.test_details.bulk_write(details, ordered=False)
+        await db.tests.bulk_write(summaries, ordered=False)
+        migrated += len(batch)
+        logger.info("Migrated %d tests", migrated)
+
+    logger.info("Done, %d tests migrated", migrated)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split tests into summary and detail documents")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(migrate(args.batch_size, args.dry_run))
+    finally:
+        close_mongo()
+
+
+if __name__ == "__main__":
+    main()
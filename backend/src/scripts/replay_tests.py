@@ -0,0 +1,323 @@
+"""
+Replays stored tests against a prompt version and model, to measure the
+effect of a change on latency, tokens, cost and scores before shipping it.
+
+Run from `backend/src`:
+    python -m scripts.replay_tests --sample 50 --concurrency 8 --model gpt-4o-mini \
+        --output replay-gpt-4o-mini.json
+
+    # Against the local fake server, with a candidate prompt module that defines
+    # the same names as config.llmPrompts:
+    python -m scripts.replay_tests --base-url http://localhost:8100/v1 --api-key fake \
+        --prompts config.llmPrompts_v2
+
+Pass `--same-as <earlier report>` to replay exactly the same tests again.
+Like production, each grading gets the question's catalog analysis when one is
+ready (services.question_catalog); `--no-catalog` replays without it.
+Only first gradings are sampled: revisions (graded on the changed paragraphs),
+reused near-duplicates and pre-screen rejections have no full grading to
+compare against. The JSON report has the run settings, a summary (latency
+percentiles, token and cost totals, mean score deltas per criterion against
+the stored results) and one row per replayed test. Nothing is written to the database.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import importlib
+import json
+import logging
+import math
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from config.llmPricing import estimate_cost
+from controllers.db import DB_NAME, PsycheckDB, close_mongo, get_mongo_client
+from services.essay_checker import build_grading_prompt, calculate_results
+from utils.hashing import question_hash
+from utils.http import close_http_client
+from utils.llm_router import LLMRouter, Provider, ProviderConfig, build_client
+from utils.openAI import COMPLETION_OPTIONS
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ("content", "language")
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+def criterion_scores(results: dict) -> dict[str, float]:
+    scores = {}
+    for section in SECTIONS:
+        for criterion in results.get(section, {}).get("criterias", []):
+            if criterion.get("criterion") is not None and criterion.get("score") is not None:
+                scores[f"{section}:{criterion['criterion']}"] = float(criterion["score"])
+    return scores
+
+
+def score_deltas(stored: dict, replayed: dict) -> dict[str, float]:
+    deltas = {
+        "complete": replayed.get("complete_score", 0) - stored.get("complete_score", 0),
+        **{
+            section: replayed.get(section, {}).get("score", 0)
+            - stored.get(section, {}).get("score", 0)
+            for section in SECTIONS
+        },
+    }
+    old, new = criterion_scores(stored), criterion_scores(replayed)
+    for name in old.keys() & new.keys():
+        deltas[name] = new[name] - old[name]
+    return deltas
+
+
+def has_criteria(results: dict | None) -> bool:
+    """False for pre-screen rejections, which were stored with empty criteria."""
+    return bool(results) and any(
+        results.get(section, {}).get("criterias") for section in SECTIONS
+    )
+
+
+async def load_tests(db: PsycheckDB, test_ids: list[str]) -> list[dict]:
+    tests = await asyncio.gather(*(db.get_test(test_id) for test_id in test_ids))
+    return [test for test in tests if test and has_criteria(test.get("results"))]
+
+
+async def sample_tests(db: PsycheckDB, size: int, user_id: str | None, since: str | None):
+    # Null also matches documents stored before these fields existed.
+    match = {"revision_of": None, "near_duplicates.reused_from": None}
+    if user_id:
+        match["user_id"] = ObjectId(user_id)
+    if since:
+        match["created_at"] = {"$gte": datetime.fromisoformat(since)}
+    sampled = await db.tests.aggregate(
+        [{"$match": match}, {"$sample": {"size": size}}, {"$project": {"_id": 1}}]
+    ).to_list(length=size)
+    return await load_tests(db, [str(doc["_id"]) for doc in sampled])
+
+
+def test_question_hash(test: dict) -> str:
+    # Tests stored before the catalog have no question_hash.
+    return test.get("question_hash") or question_hash(test["question"])
+
+
+async def load_catalog(db: PsycheckDB, tests: list[dict]) -> dict[str, dict]:
+    """Ready catalog analyses of the tests' questions, by question_hash."""
+    keys = list({test_question_hash(test) for test in tests})
+    entries = await asyncio.gather(*(db.get_catalog_question(key) for key in keys))
+    return {
+        key: entry["analysis"]
+        for key, entry in zip(keys, entries)
+        if entry and entry.get("status") == "ready"
+    }
+
+
+async def replay_one(
+    router: LLMRouter, prompts, test: dict, question_analysis: dict | None = None
+) -> dict:
+    system_prompt, prompt = build_grading_prompt(
+        test["question"], test["essay"], test.get("analysis"), prompts, question_analysis
+    )
+    row = {"test_id": test["_id"]}
+    start = time.perf_counter()
+    try:
+        provider, response = await router.create(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            **COMPLETION_OPTIONS,
+        )
+        row["latency_s"] = time.perf_counter() - start
+        replayed = json.loads(response.choices[0].message.content.strip())
+        if question_analysis:
+            # As in check_essay_with_ai.
+            replayed["task_topic"] = question_analysis["topic"]
+        replayed = calculate_results(replayed, test["essay"])
+    except Exception as e:
+        row["latency_s"] = time.perf_counter() - start
+        row["error"] = repr(e)
+        return row
+
+    usage = response.usage
+    if usage is not None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) or 0
+        row.update(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_tokens=cached,
+            cost_usd=estimate_cost(
+                provider.pricing_model, usage.prompt_tokens, usage.completion_tokens, cached
+            ),
+        )
+    row["stored_score"] = test["results"].get("complete_score")
+    row["replayed_score"] = replayed.get("complete_score")
+    row["deltas"] = score_deltas(test["results"], replayed)
+    return row
+
+
+def summarize(rows: list[dict]) -> dict:
+    ok = [row for row in rows if "error" not in row]
+    latencies = [row["latency_s"] for row in ok]
+    deltas = defaultdict(list)
+    for row in ok:
+        for name, delta in row["deltas"].items():
+            deltas[name].append(delta)
+
+    def total(field):
+        return sum(row.get(field, 0) for row in ok)
+
+    return {
+        "replayed": len(rows),
+        "failed": len(rows) - len(ok),
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies, default=None),
+            "mean": statistics.mean(latencies) if latencies else None,
+        },
+        "tokens": {
+            "prompt": total("prompt_tokens"),
+            "completion": total("completion_tokens"),
+            "cached": total("cached_tokens"),
+        },
+        "cost_usd": {
+            "total": total("cost_usd"),
+            "per_grading": total("cost_usd") / len(ok) if ok else None,
+        },
+        "score_deltas": {
+            name: {
+                "count": len(values),
+                "mean": statistics.mean(values),
+                "mean_abs": statistics.mean(abs(v) for v in values),
+            }
+            for name, values in sorted(deltas.items())
+        },
+    }
+
+
+async def run(args) -> dict:
+    prompts = importlib.import_module(args.prompts)
+    config = ProviderConfig(
+        name="replay",
+        model=args.model,
+        base_url=args.base_url,
+        api_key=args.api_key,
+        api_key_env=None if args.api_key else args.api_key_env,
+        pricing_model=args.pricing_model,
+        max_retries=args.max_retries,
+    )
+    router = LLMRouter([Provider(config, build_client(config))])
+    db = PsycheckDB(get_mongo_client()[args.db])
+
+    if args.same_as:
+        # Replay exactly the tests of an earlier report, for a like-for-like comparison.
+        with open(args.same_as, encoding="utf-8") as f:
+            test_ids = [row["test_id"] for row in json.load(f)["tests"]]
+        tests = await load_tests(db, test_ids)
+    else:
+        tests = await sample_tests(db, args.sample, args.user_id, args.since)
+    catalog = {} if args.no_catalog else await load_catalog(db, tests)
+    logger.info(
+        "Replaying %d tests with concurrency %d, %d with a catalog analysis",
+        len(tests),
+        args.concurrency,
+        sum(test_question_hash(test) in catalog for test in tests),
+    )
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded(test):
+        async with semaphore:
+            return await replay_one(
+                router, prompts, test, catalog.get(test_question_hash(test))
+            )
+
+    started = time.perf_counter()
+    rows = await asyncio.gather(*(bounded(test) for test in tests))
+    wall_s = time.perf_counter() - started
+
+    return {
+        "run": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "model": args.model,
+            "base_url": args.base_url,
+            "prompts": args.prompts,
+            "catalog": not args.no_catalog,
+            "system_prompt_sha256": hashlib.sha256(
+                prompts.essay_test_system_prompt.encode()
+            ).hexdigest(),
+            "sample": len(tests),
+            "concurrency": args.concurrency,
+            "wall_s": wall_s,
+        },
+        "summary": summarize(rows),
+        "tests": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stored tests against a prompt and model")
+    parser.add_argument("--sample", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--pricing-model", default=None, help="model name for cost, if different")
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--api-key-env", default="OPENAI_API_KEY")
+    parser.add_argument("--max-retries", type=int, default=2)
+    parser.add_argument("--prompts", default="config.llmPrompts", help="prompt module to replay")
+    parser.add_argument(
+        "--no-catalog", action="store_true", help="grade without the questions' catalog analyses"
+    )
+    parser.add_argument("--user-id", default=None)
+    parser.add_argument("--since", default=None, help="ISO date, only tests created after it")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--same-as", default=None, help="replay the tests of an earlier report")
+    parser.add_argument("--output", default=None, help="report path (default: stdout)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    async def run_and_close():
+        try:
+            return await run(args)
+        finally:
+            await close_http_client()
+            close_mongo()
+
+    report = asyncio.run(run_and_close())
+    text = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        summary = report["summary"]
+        logger.info(
+            "Wrote %s: %d replayed, %d failed, p50 %.2fs, p95 %.2fs, cost %.4f USD",
+            args.output,
+            summary["replayed"],
+            summary["failed"],
+            summary["latency_s"]["p50"] or 0,
+            summary["latency_s"]["p95"] or 0,
+            summary["cost_usd"]["total"],
+        )
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
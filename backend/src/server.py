@@ -1,9 +1,50 @@
-import logging
-from app import app
+"""
+Production entry point.
+
+    WEB_CONCURRENCY=4 python server.py
+
+Runs WEB_CONCURRENCY uvicorn workers (default: one per core). Each worker
+builds its own app through `create_app()` and opens its Mongo, OpenAI and
+Clerk clients in the lifespan, after the fork. Logging is set up by
+utils.logs (queued, production defaults unless APP_ENV=development).
+
+For a single development worker, `uvicorn app:create_app --factory --reload`;
+the older `uvicorn app:app` also still works.
+"""
+
+import os
+import shutil
+import tempfile
+
+from dotenv import load_dotenv
 
 if __name__ == "__main__":
     import uvicorn
 
-    logging.basicConfig(level=logging.INFO)
+    load_dotenv()
+    from utils.logs import LOG_LEVEL, setup_logging
+
+    setup_logging()
+
+    workers = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+    metrics_dir = None
+    if workers > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Workers inherit the environment, so they all share this directory.
+        metrics_dir = tempfile.mkdtemp(prefix="prometheus-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
 
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="debug")
+    try:
+        uvicorn.run(
+            "app:create_app",
+            factory=True,
+            host=os.getenv("HOST", "0.0.0.0"),
+            port=int(os.getenv("PORT", "8000")),
+            workers=workers,
+            log_level=LOG_LEVEL.lower(),
+            # uvicorn's loggers propagate to the queued root handler instead.
+            log_config=None,
+        )
+    finally:
+        if metrics_dir is not None:
+            # Only a directory we created; a configured one belongs to the operator.
+            shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -1,10 +1,18 @@
+import copy
 import logging
 from utils.openAI import prompt_llm 
-from config.llmPrompts import essay_test_system_prompt, essay_test_user_prompt
+from utils.metrics import track_stage
+from utils.tracing import traced
+from utils.logs import log_payload
+from services.text_analysis import format_analysis_facts
+from services.question_catalog import format_question_analysis
 
 logger = logging.getLogger(__name__)
 
+LENGTH_SUGGESTION = "וודא שאורך החיבור תואם את הטווח המותר: 25-50 שורות."
 
+
+@traced("calculate_results")
 def calculate_results(results: dict, essay: str) -> dict:
     """
     Calculates and updates the results dictionary with content, language, and complete scores,
@@ -44,15 +52,13 @@ def calculate_results(results: dict, essay: str) -> dict:
     elif 10 < essay_lines_count <= 19:
         language_score = max(0, language_score - 1)
         results['length_conclusion'] = 'החיבור קצר מדי – נוכתה נקודה מציון השפה .'
-        results['suggestions'].append(
-            "וודא שאורך החיבור תואם את הטווח המותר: 25-50 שורות."
-        )
+        if LENGTH_SUGGESTION not in results['suggestions']:
+            results['suggestions'].append(LENGTH_SUGGESTION)
     elif 20 <= essay_lines_count <= 24:
         language_score = max(0, language_score - 2)
         results['length_conclusion'] = 'החיבור קצר מדי – נוכו 2 נקודות מציון השפה .'
-        results['suggestions'].append(
-            "וודא שאורך החיבור תואם את הטווח המותר: 25-50 שורות."
-        )
+        if LENGTH_SUGGESTION not in results['suggestions']:
+            results['suggestions'].append(LENGTH_SUGGESTION)
     elif 25 <= essay_lines_count <= 50:
         results['length_conclusion'] = 'אורך החיבור תקין. אין ניכוי נקודות.'
     elif essay_lines_count > 50:
@@ -70,26 +76,142 @@ def calculate_results(results: dict, essay: str) -> dict:
     results['complete_score'] = (content_score + language_score) * 2.0
     return results
 
-async def check_essay_with_ai(question: str, essay: str) -> dict:
+def reuse_results(results: dict, essay: str) -> dict:
+    """Feedback of an earlier, near-identical essay, with the length rules applied to this one."""
+    reused = copy.deepcopy(results)
+    reused["suggestions"] = [
+        suggestion for suggestion in reused.get("suggestions", []) if suggestion != LENGTH_SUGGESTION
+    ]
+    reused.pop("length_conclusion", None)
+    return calculate_results(reused, essay)
+
+
+def build_grading_prompt(
+    question: str, essay: str, analysis: dict = None, prompts=None, question_analysis: dict = None
+) -> tuple[str, str]:
+    """
+    (system prompt, user prompt) of a full grading. `prompts` is a module with
+    the same names as config.llmPrompts, to try another prompt version.
+    """
+    if prompts is None:
+        # The prompt module is large; load it on first use (or in the lifespan warm-up).
+        import config.llmPrompts as prompts
+
+    prompt = prompts.essay_test_user_prompt.format(question=question, essay=essay)
+    if question_analysis:
+        prompt += prompts.essay_question_prompt.format(
+            question_analysis=format_question_analysis(question_analysis)
+        )
+    if analysis:
+        prompt += prompts.essay_facts_prompt.format(facts=format_analysis_facts(analysis))
+    return prompts.essay_test_system_prompt, prompt
+
+
+async def check_essay_with_ai(
+    question: str, essay: str, analysis: dict = None, question_analysis: dict = None
+) -> dict:
     """
     Uses OpenAI's API to check the essay against the question.
+    `analysis` (from services.text_analysis) is passed to the model as precomputed facts,
+    `question_analysis` (from services.question_catalog) as the analysis of the question.
     Returns a dictionary with the results.
     """
     try:
         logger.info("Starting essay evaluation")
-        logger.debug(f"Question: {question}")
-        logger.debug(f"Essay (truncated): {essay[:200]}...")
+        log_payload(logger, "Question: %s, essay: %s", question, essay)
 
         # Proceed with LLM evaluation
-        prompt = essay_test_user_prompt.format(question=question, essay=essay)
-        response = await prompt_llm(system_message=essay_test_system_prompt, prompt=prompt) 
-        response = calculate_results(response, essay)
+        system_prompt, prompt = build_grading_prompt(
+            question, essay, analysis, question_analysis=question_analysis
+        )
+        with track_stage("llm"):
+            response = await prompt_llm(system_message=system_prompt, prompt=prompt)
+        if question_analysis:
+            # The same topic for every test of the question, for analytics.
+            response["task_topic"] = question_analysis["topic"]
+        with track_stage("calculate_results"):
+            response = calculate_results(response, essay)
 
         logger.info("Essay evaluation completed successfully")
-        logger.debug(f"LLM Response: {response}")
+        log_payload(logger, "LLM response: %s", response)
 
         return response
 
     except Exception as e:
         logger.exception("Error occurred during essay evaluation")
         raise ValueError(f"Error checking essay with AI: {e}")
+
+
+def merge_revision(previous_results: dict, revision: dict) -> dict:
+    """
+    Applies a partial re-evaluation on top of the previous results: criteria are
+    replaced by name, conclusions and suggestions only when the model sent them.
+    Scores are left to calculate_results.
+    """
+    merged = copy.deepcopy(previous_results)
+    sections = (("content", "content_conclusion"), ("language", "language_conclusion"))
+    for section, conclusion_key in sections:
+        updates = revision.get(section) or {}
+        target = merged.setdefault(section, {})
+        if updates.get(conclusion_key):
+            target[conclusion_key] = updates[conclusion_key]
+        updated = {c.get("criterion"): c for c in updates.get("criterias") or []}
+        target["criterias"] = [
+            updated.pop(c.get("criterion"), c) for c in target.get("criterias", [])
+        ]
+
+    if revision.get("general_conclusion"):
+        merged["general_conclusion"] = revision["general_conclusion"]
+    if revision.get("suggestions"):
+        merged["suggestions"] = list(revision["suggestions"])
+    return merged
+
+
+async def regrade_revision_with_ai(
+    question: str, essay: str, previous_results: dict, diff: dict, analysis: dict = None
+) -> dict:
+    """
+    Re-evaluates only the paragraphs that changed since the previous version,
+    with the previous criterion feedback and the neighbouring sentences as
+    context (not the whole essay), and merges the result.
+    """
+    from config.llmPrompts import (
+        essay_facts_prompt,
+        essay_revision_user_prompt,
+        essay_test_system_prompt,
+    )
+
+    try:
+        logger.info("Starting incremental re-evaluation of %d paragraphs", len(diff["changed"]))
+
+        previous_feedback = "\n".join(
+            f"- {c.get('criterion')}: {c.get('score')} - {c.get('feedback')}"
+            for section in ("content", "language")
+            for c in previous_results.get(section, {}).get("criterias", [])
+        )
+        prompt = essay_revision_user_prompt.format(
+            question=question,
+            previous_feedback=previous_feedback,
+            changed_paragraphs="\n\n".join(
+                f"[פסקה {p['index'] + 1}] {p['text']}" for p in diff["changed"]
+            ) or "אין",
+            removed_paragraphs="\n\n".join(diff["removed"]) or "אין",
+            context="\n".join(
+                f"[פסקה {p['index'] + 1}] {p['text']}" for p in diff.get("context", [])
+            ) or "אין",
+        )
+        if analysis:
+            prompt += essay_facts_prompt.format(facts=format_analysis_facts(analysis))
+
+        # Same system prompt as a full grading, so its prefix stays in the provider's prompt cache.
+        with track_stage("llm"):
+            revision = await prompt_llm(system_message=essay_test_system_prompt, prompt=prompt)
+        with track_stage("calculate_results"):
+            response = calculate_results(merge_revision(previous_results, revision), essay)
+
+        logger.info("Incremental re-evaluation completed successfully")
+        return response
+
+    except Exception as e:
+        logger.exception("Error occurred during incremental re-evaluation")
+        raise ValueError(f"Error re-checking essay with AI: {e}")
@@ -0,0 +1,107 @@
+"""
+MinHash signatures and LSH buckets for near-duplicate essay detection.
+
+Each test stores a 128-value MinHash signature of its word 3-gram shingles and
+16 LSH band keys (8 rows per band). Two essays with Jaccard similarity 0.8
+share at least one band key with ~95% probability (0.9: >99.9%, 0.5: ~6%),
+so candidates come from one indexed `$in` query on `lsh_buckets` instead of
+pairwise comparison; the stored signatures then estimate the similarity.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import struct
+
+from utils.hashing import question_hash
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+# Resubmissions at least this similar to the user's own earlier essay reuse its feedback.
+REUSE_THRESHOLD = float(os.getenv("MINHASH_REUSE_THRESHOLD", "0.9"))
+# Essays this similar to other users' essays count as copies.
+COPY_THRESHOLD = float(os.getenv("MINHASH_COPY_THRESHOLD", "0.8"))
+MASS_COPY_MIN_USERS = int(os.getenv("MINHASH_MASS_COPY_MIN_USERS", "3"))
+
+_MAX_HASH = (1 << 32) - 1
+_hash_values = struct.Struct(f"<{NUM_PERM}I")
+
+_word_re = re.compile(r"[א-תA-Za-z0-9]+")
+
+
+def _hash_row(shingle: str) -> tuple[int, ...]:
+    # One SHAKE-128 digest yields NUM_PERM independent 32-bit hash functions,
+    # stable across processes and deploys (unlike the builtin hash()).
+    return _hash_values.unpack(hashlib.shake_128(shingle.encode()).digest(NUM_PERM * 4))
+
+
+def shingles(text: str) -> set[str]:
+    words = _word_re.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash_signature(text: str) -> list[int]:
+    rows = [_hash_row(shingle) for shingle in shingles(text)]
+    if not rows:
+        return [_MAX_HASH] * NUM_PERM
+    return list(map(min, zip(*rows)))
+
+
+def lsh_buckets(signature: list[int]) -> list[str]:
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS : (band + 1) * ROWS]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=8).hexdigest()
+        buckets.append(f"{band}:{digest}")
+    return buckets
+
+
+def estimate_similarity(a: list[int], b: list[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+async def find_near_duplicates(
+    db, user_id: str, question: str, signature: list[int], buckets: list[str]
+) -> dict:
+    """
+    Looks up earlier tests similar to this essay.
+    Returns the user's own most similar earlier test on the same question
+    (a candidate for reusing feedback) and how many other users submitted a
+    near-identical essay (a mass-copy signal).
+    """
+    # Separate lookups, so other users' essays in the same buckets can never
+    # crowd the user's own earlier submissions out of the candidate limit.
+    own, others = await asyncio.gather(
+        db.find_lsh_candidates(buckets, user_id=user_id, question_key=question_hash(question)),
+        db.find_lsh_candidates(buckets, exclude_user_id=user_id),
+    )
+    reuse_test_id, reuse_similarity = None, 0.0
+    for candidate in own:
+        similarity = estimate_similarity(signature, candidate.get("minhash") or [])
+        if similarity >= REUSE_THRESHOLD and similarity > reuse_similarity:
+            reuse_test_id, reuse_similarity = candidate["_id"], similarity
+
+    other_users = {
+        candidate["user_id"]
+        for candidate in others
+        if estimate_similarity(signature, candidate.get("minhash") or []) >= COPY_THRESHOLD
+    }
+
+    return {
+        "reused_from": reuse_test_id,
+        "reuse_similarity": reuse_similarity,
+        "copied_by_other_users": len(other_users),
+        "mass_copy": len(other_users) >= MASS_COPY_MIN_USERS,
+    }
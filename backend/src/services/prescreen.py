@@ -0,0 +1,102 @@
+"""
+Local gate in front of the LLM: rejects essays that are clearly not in Hebrew
+or clearly unrelated to the question, which the grading prompt scores 0 anyway.
+A rejection is a 422: no test is stored and no credit is spent, so a false
+positive only costs the student a resubmission.
+
+Language is the share of Hebrew letters among all letters. Relatedness is the
+cosine similarity of sublinear-TF profiles of stemmed content words of the
+essay and the question. On-topic essays score around 0.3 and unrelated ones
+below 0.05, so only clear failures are rejected. Every decision is logged to
+the `essaycheck.audit.prescreen` logger.
+"""
+
+import logging
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass
+
+from services.text_analysis import STOPWORDS, hebrew_word_re, stem_word
+
+audit_logger = logging.getLogger("essaycheck.audit.prescreen")
+
+MIN_HEBREW_RATIO = float(os.getenv("PRESCREEN_MIN_HEBREW_RATIO", "0.6"))
+MIN_SIMILARITY = float(os.getenv("PRESCREEN_MIN_SIMILARITY", "0.05"))
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "true").lower() == "true"
+
+_letter_re = re.compile(r"[^\W\d_]", re.UNICODE)
+_hebrew_re = re.compile(r"[א-ת]")
+
+
+@dataclass
+class PrescreenResult:
+    passed: bool
+    reason: str
+    hebrew_ratio: float
+    similarity: float
+
+
+def hebrew_ratio(text: str) -> float:
+    letters = len(_letter_re.findall(text))
+    if not letters:
+        return 0.0
+    return len(_hebrew_re.findall(text)) / letters
+
+
+def _term_profile(text: str) -> dict[str, float]:
+    """Sublinear TF weights of the stemmed content words of a text."""
+    counts = Counter(
+        stem_word(word)
+        for word in hebrew_word_re.findall(text)
+        if word not in STOPWORDS and len(word) > 2
+    )
+    return {term: 1 + math.log(count) for term, count in counts.items()}
+
+
+def question_similarity(question: str, essay: str) -> float:
+    """Cosine similarity of the term profiles of question and essay."""
+    q, e = _term_profile(question), _term_profile(essay)
+    if not q or not e:
+        return 0.0
+    dot = sum(weight * e[term] for term, weight in q.items() if term in e)
+    q_norm = math.sqrt(sum(w * w for w in q.values()))
+    e_norm = math.sqrt(sum(w * w for w in e.values()))
+    return dot / (q_norm * e_norm)
+
+
+def prescreen_essay(question: str, essay: str, user_id: str = None) -> PrescreenResult:
+    ratio = hebrew_ratio(essay)
+    similarity = question_similarity(question, essay)
+
+    if not PRESCREEN_ENABLED:
+        result = PrescreenResult(True, "disabled", ratio, similarity)
+    elif ratio < MIN_HEBREW_RATIO:
+        result = PrescreenResult(False, "not_hebrew", ratio, similarity)
+    elif similarity < MIN_SIMILARITY:
+        result = PrescreenResult(False, "off_topic", ratio, similarity)
+    else:
+        result = PrescreenResult(True, "ok", ratio, similarity)
+
+    audit_logger.info(
+        "prescreen user=%s decision=%s reason=%s hebrew_ratio=%.3f similarity=%.3f",
+        user_id,
+        "pass" if result.passed else "reject",
+        result.reason,
+        result.hebrew_ratio,
+        result.similarity,
+        extra={"prescreen": asdict(result), "user_id": user_id},
+    )
+    return result
+
+
+REJECTION_DETAILS = {
+    "not_hebrew": "Essay is not written in Hebrew",
+    "off_topic": "Essay does not address the question",
+}
+
+
+def rejection_detail(result: PrescreenResult) -> str:
+    """422 detail for a rejected essay; the check is neither stored nor charged."""
+    return REJECTION_DETAILS[result.reason]
@@ -0,0 +1,152 @@
+"""
+Catalog of essay questions, keyed by question_hash.
+
+Questions come from a limited bank, so each one is analyzed once (topic, key
+arguments, expected stances) and the analysis is attached to every grading
+prompt for it. A question seen for the first time is graded without one while
+its analysis is computed in the background; the next gradings get it. After a
+failed analysis, or while another worker holds the claim, this worker leaves
+the question alone for a while instead of looking it up on every grading.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Optional
+
+from controllers.db import PsycheckDB
+from utils.hashing import question_hash
+from utils.metrics import QUESTION_CATALOG_LOOKUPS
+from utils.openAI import prompt_llm, track_llm_usage
+
+logger = logging.getLogger(__name__)
+
+QUESTION_CATALOG_ENABLED = os.getenv("QUESTION_CATALOG_ENABLED", "true").lower() == "true"
+MAX_KEY_ARGUMENTS = 6
+MAX_STANCES = 4
+# Ready analyses never change, so each worker keeps the ones it has used.
+CACHE_SIZE = 512
+
+# Seconds before a question is looked up again after a failed analysis, and
+# after finding another worker analyzing it.
+RETRY_AFTER_FAILURE = float(os.getenv("QUESTION_ANALYSIS_RETRY_SECONDS", "300"))
+RECHECK_PENDING = 30.0
+
+# Ledger owner of the analysis calls, which belong to no user.
+LEDGER_OWNER = "question_catalog"
+
+_ready: dict[str, dict] = {}
+_analyzing: dict[str, asyncio.Task] = {}
+_retry_at: dict[str, float] = {}
+
+
+def _remember(key: str, analysis: dict):
+    if len(_ready) >= CACHE_SIZE:
+        _ready.pop(next(iter(_ready)))
+    _ready[key] = analysis
+
+
+def _back_off(key: str, seconds: float):
+    if key not in _retry_at and len(_retry_at) >= CACHE_SIZE:
+        _retry_at.pop(next(iter(_retry_at)))
+    _retry_at[key] = time.monotonic() + seconds
+
+
+def _clean_list(value, limit: int) -> list[str]:
+    if not isinstance(value, list):
+        return []
+    return [item.strip() for item in value if isinstance(item, str) and item.strip()][:limit]
+
+
+async def analyze_question(question: str) -> dict:
+    from config.llmPrompts import question_analysis_system_prompt, question_analysis_user_prompt
+
+    response = await prompt_llm(
+        system_message=question_analysis_system_prompt,
+        prompt=question_analysis_user_prompt.format(question=question),
+    )
+    topic = response.get("topic")
+    if not isinstance(topic, str) or not topic.strip():
+        raise ValueError("Question analysis without a topic")
+    return {
+        "topic": topic.strip(),
+        "key_arguments": _clean_list(response.get("key_arguments"), MAX_KEY_ARGUMENTS),
+        "stances": _clean_list(response.get("stances"), MAX_STANCES),
+    }
+
+
+def format_question_analysis(analysis: dict) -> str:
+    """Compact Hebrew lines for the grading prompt."""
+    lines = [f"- נושא: {analysis['topic']}"]
+    if analysis.get("key_arguments"):
+        lines.append("- טיעונים מרכזיים: " + "; ".join(analysis["key_arguments"]))
+    if analysis.get("stances"):
+        lines.append("- עמדות אפשריות: " + "; ".join(analysis["stances"]))
+    return "\n".join(lines)
+
+
+async def _analyze(db: PsycheckDB, key: str, question: str):
+    if not await db.claim_catalog_question(key, question):
+        # Ready by now, or another worker is on it.
+        _back_off(key, RECHECK_PENDING)
+        return
+    analysis = None
+    try:
+        with track_llm_usage() as usage:
+            analysis = await analyze_question(question)
+    except Exception:
+        logger.exception("Analysis of question %s failed", key)
+    finally:
+        if usage.calls:
+            await db.record_llm_spend(LEDGER_OWNER, usage.as_dict(), graded=False)
+        await db.finish_catalog_question(key, analysis)
+    if analysis is None:
+        _back_off(key, RETRY_AFTER_FAILURE)
+        return
+    _retry_at.pop(key, None)
+    _remember(key, analysis)
+    logger.info("Question %s added to the catalog", key)
+
+
+def schedule_analysis(db: PsycheckDB, key: str, question: str):
+    if key in _analyzing:
+        return
+    # A fresh context: the task must not inherit the request's deadline or usage tracker.
+    task = asyncio.create_task(_analyze(db, key, question), context=contextvars.Context())
+    _analyzing[key] = task
+    task.add_done_callback(lambda _: _analyzing.pop(key, None))
+
+
+async def get_question_analysis(db: PsycheckDB, question: str) -> Optional[dict]:
+    """The catalog analysis of `question`, or None (scheduling it) when not ready yet."""
+    if not QUESTION_CATALOG_ENABLED:
+        return None
+    key = question_hash(question)
+    analysis = _ready.get(key)
+    if analysis is None and _retry_at.get(key, 0.0) > time.monotonic():
+        QUESTION_CATALOG_LOOKUPS.labels(outcome="backoff").inc()
+        return None
+    if analysis is None:
+        entry = await db.get_catalog_question(key)
+        if entry and entry.get("status") == "ready":
+            analysis = entry["analysis"]
+            _remember(key, analysis)
+    if analysis is None:
+        QUESTION_CATALOG_LOOKUPS.labels(outcome="miss").inc()
+        # The claim makes sure only one worker analyzes it.
+        schedule_analysis(db, key, question)
+        return None
+    QUESTION_CATALOG_LOOKUPS.labels(outcome="hit").inc()
+    return analysis
+
+
+async def close_question_catalog():
+    """Cancels analyses still running at shutdown; their claims time out for a retry."""
+    tasks = list(_analyzing.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _ready.clear()
+    _retry_at.clear()
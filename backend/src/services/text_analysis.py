@@ -0,0 +1,241 @@
+"""
+Deterministic local pre-analysis of Hebrew essays.
+
+Computes the countable language facts (connectives, punctuation density, slang,
+repeated roots, paragraphs and sentence length) that the model would otherwise
+estimate, so they can be passed to it as facts and stored with the test.
+All patterns are compiled once; an essay is analyzed in a few milliseconds.
+"""
+
+import re
+from collections import Counter
+from difflib import SequenceMatcher
+
+HEBREW_LETTER = "א-ת"
+WORDS_PER_LINE = 12
+LONG_SENTENCE_WORDS = 35
+MAX_UNWRAPPED_LINES = 15
+
+# מילות קישור, longest first so multi-word phrases win over their prefixes.
+CONNECTIVES = sorted(
+    [
+        "ראשית", "ראשית כל", "שנית", "שלישית", "בנוסף", "נוסף על כך", "כמו כן",
+        "יתר על כן", "יתרה מזאת", "זאת ועוד", "לכן", "לפיכך", "על כן", "אי לכך",
+        "לאור זאת", "כתוצאה מכך", "בעקבות זאת", "אם כן", "אולם", "ואולם", "אך",
+        "אבל", "מנגד", "לעומת זאת", "עם זאת", "אף על פי כן", "למרות זאת",
+        "אמנם", "ברם", "כלומר", "דהיינו", "לדוגמה", "למשל", "כגון", "לסיכום",
+        "לסיכומו של דבר", "לבסוף", "לסיום", "מכיוון", "מאחר", "משום", "היות",
+        "הואיל", "בשל", "עקב", "כדי", "על מנת", "בניגוד", "לעומת", "בדומה",
+    ],
+    key=len,
+    reverse=True,
+)
+
+SLANG = sorted(
+    [
+        "סבבה", "אחלה", "וואלה", "יאללה", "תכלס", "באסה", "מגניב", "פדיחה",
+        "סחתיין", "בקטע", "חבל על הזמן", "חולה על", "דפוק", "בלאגן",
+    ],
+    key=len,
+    reverse=True,
+)
+
+# Function words ignored when looking for repeated roots (connectives are too).
+STOPWORDS = frozenset(
+    "של את על עם זה זו זאת הוא היא הם הן אני אנו אנחנו לא כי אם או גם כל יש אין "
+    "הרבה מאוד רק עוד כך כמו בין אשר שלא לכן אך אבל כדי היה היתה היו להיות יותר "
+    "פחות אלא אף כן לו לה להם אותו אותה אותם ביותר כאשר מה מי איך למה דבר דברים".split()
+)
+
+PREFIXES = "והבכלמש"
+# "יים" before "ים" and "י", so שינויים and שינוי share a stem.
+SUFFIXES = ("יים", "ים", "ות", "ה", "ת", "י", "ו")
+FINAL_LETTERS = str.maketrans("ךםןףץ", "כמנפצ")
+# A prefix letter is only stripped when this much of the word is left.
+MIN_STEM = 4
+
+_connective_set = frozenset(CONNECTIVES)
+_connective_re = re.compile(
+    rf"(?<![{HEBREW_LETTER}])ו?(?:{'|'.join(map(re.escape, CONNECTIVES))})(?![{HEBREW_LETTER}])"
+)
+_slang_re = re.compile(
+    rf"(?<![{HEBREW_LETTER}])[{PREFIXES}]?(?:{'|'.join(map(re.escape, SLANG))})(?![{HEBREW_LETTER}])"
+)
+hebrew_word_re = re.compile(rf"[{HEBREW_LETTER}]+")
+_sentence_split_re = re.compile(r"[.!?]+")
+_punctuation_re = re.compile(r"[.,;:!?\-–—()\"״]")
+_blank_line_re = re.compile(r"\n\s*\n")
+_paragraph_end_re = re.compile(r"[.!?:][\"'״]?\s*$")
+_sentence_boundary_re = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_words_and_lines(essay: str) -> tuple[int, int]:
+    """Word count and estimated line count (12 words per line), as the grader counts them."""
+    word_count = len(essay.split())
+    return word_count, word_count // WORDS_PER_LINE
+
+
+def split_paragraphs(essay: str) -> list[str]:
+    blocks = [block.strip() for block in _blank_line_re.split(essay) if block.strip()]
+    if len(blocks) > 1:
+        return blocks
+
+    lines = [line.strip() for line in essay.splitlines() if line.strip()]
+    if len(lines) <= MAX_UNWRAPPED_LINES:
+        return lines
+
+    # Many lines without blank lines: the essay was copied from a wrapped answer
+    # sheet. A paragraph ends on a line that ends a sentence and is either short
+    # or followed by a line opening with a connective.
+    short_line = 0.8 * sorted(len(line) for line in lines)[len(lines) // 2]
+    paragraphs, current = [], []
+    for i, line in enumerate(lines):
+        current.append(line)
+        next_line = lines[i + 1] if i + 1 < len(lines) else ""
+        if _paragraph_end_re.search(line) and (
+            len(line) < short_line or _connective_re.match(next_line)
+        ):
+            paragraphs.append(" ".join(current))
+            current = []
+    if current:
+        paragraphs.append(" ".join(current))
+    return paragraphs
+
+
+def _normalize_connective(match: str) -> str:
+    # "ולכן" counts as "לכן", but "ואולם" is a connective in its own right.
+    if match not in _connective_set and match.startswith("ו"):
+        return match[1:]
+    return match
+
+
+def stem_word(word: str) -> str:
+    """
+    Crude Hebrew stem: strips one plural/gender suffix, normalizes final
+    letters, then strips up to two prefix letters while MIN_STEM letters remain.
+    """
+    for suffix in SUFFIXES:
+        if len(word) - len(suffix) >= 3 and word.endswith(suffix):
+            word = word[: -len(suffix)]
+            break
+    word = word.translate(FINAL_LETTERS)
+    for _ in range(2):
+        if len(word) > MIN_STEM and word[0] in PREFIXES:
+            word = word[1:]
+    return word
+
+
+def _is_function_word(word: str) -> bool:
+    return any(
+        form in STOPWORDS or form in _connective_set
+        for form in (word, word[1:] if word.startswith("ו") else word)
+    )
+
+
+def analyze_essay(essay: str) -> dict:
+    word_count, line_count = count_words_and_lines(essay)
+    paragraphs = split_paragraphs(essay)
+
+    sentence_lengths = [
+        len(sentence.split())
+        for sentence in _sentence_split_re.split(essay)
+        if sentence.strip()
+    ]
+    sentence_count = len(sentence_lengths)
+
+    connectives = Counter(_normalize_connective(match) for match in _connective_re.findall(essay))
+    paragraph_openers = sum(
+        1 for paragraph in paragraphs[1:] if _connective_re.match(paragraph)
+    )
+
+    punctuation_count = len(_punctuation_re.findall(essay))
+    comma_count = essay.count(",")
+
+    stems, forms = Counter(), {}
+    for word in hebrew_word_re.findall(essay):
+        if len(word) < 3 or _is_function_word(word):
+            continue
+        stem = stem_word(word)
+        stems[stem] += 1
+        forms.setdefault(stem, Counter())[word] += 1
+    # Reported by the most common surface form, which reads better than the stem.
+    repeated_roots = [
+        {"root": forms[stem].most_common(1)[0][0], "count": count}
+        for stem, count in stems.most_common(5)
+        if count >= 4
+    ]
+
+    return {
+        "word_count": word_count,
+        "line_count": line_count,
+        "paragraph_count": len(paragraphs),
+        "sentence_count": sentence_count,
+        "avg_sentence_words": round(word_count / sentence_count, 1) if sentence_count else 0.0,
+        "max_sentence_words": max(sentence_lengths, default=0),
+        "long_sentences": sum(1 for length in sentence_lengths if length > LONG_SENTENCE_WORDS),
+        "punctuation_per_100_words": (
+            round(punctuation_count * 100 / word_count, 1) if word_count else 0.0
+        ),
+        "commas_per_sentence": round(comma_count / sentence_count, 2) if sentence_count else 0.0,
+        "connective_count": sum(connectives.values()),
+        "distinct_connectives": sorted(connectives, key=lambda c: (-connectives[c], c))[:12],
+        "paragraphs_opening_with_connective": paragraph_openers,
+        "slang": sorted(set(_slang_re.findall(essay))),
+        "repeated_roots": repeated_roots,
+    }
+
+
+def format_analysis_facts(analysis: dict) -> str:
+    """Compact Hebrew fact lines for the grading prompt."""
+    later_paragraphs = max(0, analysis["paragraph_count"] - 1)
+    roots = ", ".join(f"{r['root']}×{r['count']}" for r in analysis["repeated_roots"]) or "אין"
+    return "\n".join(
+        [
+            f"- מילים: {analysis['word_count']}, שורות משוערות: {analysis['line_count']}, פסקאות: {analysis['paragraph_count']}",
+            f"- משפטים: {analysis['sentence_count']}, ממוצע מילים למשפט: {analysis['avg_sentence_words']}, "
+            f"המשפט הארוך ביותר: {analysis['max_sentence_words']} מילים, משפטים ארוכים מ-{LONG_SENTENCE_WORDS} מילים: {analysis['long_sentences']}",
+            f"- סימני פיסוק ל-100 מילים: {analysis['punctuation_per_100_words']}, פסיקים למשפט: {analysis['commas_per_sentence']}",
+            f"- מילות קישור: {analysis['connective_count']} ({', '.join(analysis['distinct_connectives']) or 'אין'}); "
+            f"פסקאות (מלבד הראשונה) הנפתחות במילת קישור: {analysis['paragraphs_opening_with_connective']} מתוך {later_paragraphs}",
+            f"- מילים בשפה דיבורית/סלנג: {', '.join(analysis['slang']) or 'אין'}",
+            f"- שורשים חוזרים: {roots}",
+        ]
+    )
+
+
+def diff_paragraphs(old_essay: str, new_essay: str) -> dict:
+    """Paragraph-level diff of two versions of an essay."""
+    old, new = split_paragraphs(old_essay), split_paragraphs(new_essay)
+    normalize = lambda paragraph: " ".join(paragraph.split())  # noqa: E731
+    matcher = SequenceMatcher(
+        a=[normalize(p) for p in old], b=[normalize(p) for p in new], autojunk=False
+    )
+
+    changed, removed = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if tag == "delete":
+            removed.extend(old[i1:i2])
+        changed.extend({"index": j, "text": new[j]} for j in range(j1, j2))
+
+    # The sentence of each unchanged neighbour that touches a changed paragraph,
+    # so the model sees the transitions without the whole essay.
+    changed_indexes = {p["index"] for p in changed}
+    context = []
+    for j, paragraph in enumerate(new):
+        if j in changed_indexes:
+            continue
+        sentences = _sentence_boundary_re.split(paragraph)
+        if j + 1 in changed_indexes:
+            context.append({"index": j, "text": sentences[-1]})
+        elif j - 1 in changed_indexes:
+            context.append({"index": j, "text": sentences[0]})
+
+    return {
+        "changed": changed,
+        "removed": removed,
+        "context": context,
+        "paragraph_count": len(new),
+        "changed_ratio": len(changed) / len(new) if new else 1.0,
+    }
@@ -1,34 +1,73 @@
-from dotenv import load_dotenv
-from fastapi import HTTPException, Depends, Request
-from clerk_backend_api import Clerk, AuthenticateRequestOptions
+from fastapi import HTTPException, Depends, Request, WebSocket
+from starlette.datastructures import Headers
 import os
+from typing import TYPE_CHECKING, Optional
 
 from controllers.db import PsycheckDB
+from utils.metrics import track_stage
+from utils.tracing import traced
+from utils.http import get_http_client
 
-load_dotenv()
-CLERK_SECRET = os.getenv("CLERK_SECRET_KEY")
-JWT_KEY = os.getenv("JWT_KEY")
+if TYPE_CHECKING:
+    from clerk_backend_api import AuthenticateRequestOptions, Clerk
 
-if not CLERK_SECRET or not JWT_KEY:
-    raise RuntimeError("Missing required Clerk environment variables")
+CLERK_API_URL = "https://api.clerk.com/v1/"
 
-clerk_sdk = Clerk(bearer_auth=CLERK_SECRET)
+AUTHORIZED_PARTIES = [
+    "http://localhost:5173",
+    "http://localhost:5174",
+    "http://localhost:8080",
+    "https://psycheck-frontend-1i2thi1zi-gils-projects-ac09edb0.vercel.app",
+    "https://psycheck.gchshell.uk",
+]
+
+# One SDK instance per worker process, created in the app lifespan (after fork).
+_clerk_sdk: Optional["Clerk"] = None
+_auth_options: Optional["AuthenticateRequestOptions"] = None
+
+
+def get_clerk() -> "Clerk":
+    global _clerk_sdk, _auth_options
+    if _clerk_sdk is None:
+        # Imported lazily to keep the SDK out of the app import path.
+        from clerk_backend_api import AuthenticateRequestOptions, Clerk
+
+        clerk_secret = os.getenv("CLERK_SECRET_KEY")
+        jwt_key = os.getenv("JWT_KEY")
+
+        if not clerk_secret or not jwt_key:
+            raise RuntimeError("Missing required Clerk environment variables")
+
+        _auth_options = AuthenticateRequestOptions(
+            authorized_parties=AUTHORIZED_PARTIES,
+            jwt_key=jwt_key,
+        )
+        _clerk_sdk = Clerk(bearer_auth=clerk_secret, async_client=get_http_client())
+    return _clerk_sdk
+
+
+async def warm_up_clerk():
+    """Pre-opens a keep-alive connection to the Clerk API."""
+    get_clerk()
+    await get_http_client().head(CLERK_API_URL)
+
+
+def close_clerk():
+    global _clerk_sdk
+    _clerk_sdk = None
+
+
+def admin_clerk_ids() -> set[str]:
+    return {
+        clerk_id.strip()
+        for clerk_id in os.getenv("ADMIN_CLERK_IDS", "").split(",")
+        if clerk_id.strip()
+    }
 
 
 def authenticate_user(request: Request):
-    request_state = clerk_sdk.authenticate_request(
-        request,
-        AuthenticateRequestOptions(
-            authorized_parties=[
-                "http://localhost:5173",
-                "http://localhost:5174",
-                "http://localhost:8080",
-                "https://psycheck-frontend-1i2thi1zi-gils-projects-ac09edb0.vercel.app",
-                "https://psycheck.gchshell.uk",
-            ],
-            jwt_key=JWT_KEY,
-        ),
-    )
+    clerk_sdk = get_clerk()
+    request_state = clerk_sdk.authenticate_request(request, _auth_options)
 
     if not request_state.is_signed_in:
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -37,13 +76,57 @@ def authenticate_user(request: Request):
     return {"user_id": user_id}
 
 
+class _TokenRequest:
+    """What the Clerk SDK reads from a request, with a session token from the query string."""
+
+    def __init__(self, websocket: WebSocket, token: str):
+        self.headers = Headers(
+            raw=[(b"authorization", f"Bearer {token}".encode("latin-1")), *websocket.headers.raw]
+        )
+
+
+def websocket_origin_allowed(websocket: WebSocket) -> bool:
+    """
+    CORS does not apply to WebSockets, so a page on any site could open one
+    with the user's __session cookie. Browsers always send Origin; clients
+    that don't are not browsers and have no cookies to abuse.
+    """
+    origin = websocket.headers.get("origin")
+    return origin is None or origin in AUTHORIZED_PARTIES
+
+
+def websocket_auth_request(websocket: WebSocket):
+    """
+    Browsers can't set headers on a WebSocket handshake, so the session token
+    may come as `?token=` (redacted in the logs, see utils.logs); otherwise the
+    __session cookie or header is used.
+    """
+    token = websocket.query_params.get("token")
+    if not token:
+        return websocket
+    try:
+        return _TokenRequest(websocket, token)
+    except UnicodeEncodeError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+@traced("auth_and_get_user")
 async def auth_and_get_user(request: Request, db: PsycheckDB):
-    clerk_user_details = authenticate_user(request)
+    with track_stage("auth"):
+        clerk_user_details = authenticate_user(request)
     clerk_id = clerk_user_details.get("user_id")
     if not isinstance(clerk_id, str) or not clerk_id:
         raise HTTPException(401, "Invalid or missing user_id")
 
-    user_obj = await db.get_user_obj(clerk_id)
-    if not user_obj:
-        user_obj = await db.create_user(clerk_id)
+    with track_stage("user_load"):
+        user_obj = await db.get_user_obj(clerk_id)
+        if not user_obj:
+            user_obj = await db.create_user(clerk_id)
     return user_obj
+
+
+def require_admin(request: Request):
+    clerk_id = authenticate_user(request).get("user_id")
+    if clerk_id not in admin_clerk_ids():
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return clerk_id
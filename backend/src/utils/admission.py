@@ -0,0 +1,134 @@
+"""
+Admission control for grading work.
+
+Each worker runs at most GRADING_MAX_CONCURRENCY gradings at once, of which
+GRADING_RESERVED_PRIORITY slots only priority users (admins, or users with
+`priority: true`) may take. Further requests wait in a short queue, priority
+first; when the queue is full or the wait exceeds GRADING_QUEUE_TIMEOUT_SECONDS
+the request is shed with 503 and a Retry-After estimate. Nothing else is
+limited, so reads keep being served while grading is saturated.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from utils.ClerkAuth import admin_clerk_ids
+from utils.metrics import GRADING_IN_FLIGHT, GRADING_QUEUED, GRADING_SHED, track_stage
+
+MAX_CONCURRENCY = int(os.getenv("GRADING_MAX_CONCURRENCY", "16"))
+RESERVED_PRIORITY = int(os.getenv("GRADING_RESERVED_PRIORITY", "4"))
+MAX_QUEUE = int(os.getenv("GRADING_MAX_QUEUE", "32"))
+QUEUE_TIMEOUT = float(os.getenv("GRADING_QUEUE_TIMEOUT_SECONDS", "10"))
+MAX_RETRY_AFTER = 120
+
+
+def is_priority_user(user: dict) -> bool:
+    return bool(user.get("priority")) or user.get("clerk_id") in admin_clerk_ids()
+
+
+class AdmissionController:
+    def __init__(self, capacity: int, reserved: int, max_queue: int, queue_timeout: float):
+        self.capacity = capacity
+        self.reserved = min(reserved, capacity - 1)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiters: deque[tuple[bool, asyncio.Future]] = deque()
+        # Moving average of grading duration, for Retry-After.
+        self.avg_seconds = 20.0
+
+    def _limit(self, priority: bool) -> int:
+        return self.capacity if priority else self.capacity - self.reserved
+
+    def _shed(self, priority: bool):
+        GRADING_SHED.labels(priority=str(priority).lower()).inc()
+        backlog = len(self.waiters) + self.in_flight - self.capacity + 1
+        retry_after = math.ceil(self.avg_seconds * max(1, backlog) / self.capacity)
+        raise HTTPException(
+            503,
+            "Grading is busy, please try again shortly",
+            headers={"Retry-After": str(min(MAX_RETRY_AFTER, max(1, retry_after)))},
+        )
+
+    def _wake(self):
+        # Priority waiters first, then everyone else in arrival order.
+        for want_priority in (True, False):
+            for entry in list(self.waiters):
+                priority, future = entry
+                if want_priority and not priority:
+                    continue
+                if future.done():
+                    self.waiters.remove(entry)
+                    continue
+                if self.in_flight >= self._limit(priority):
+                    continue
+                self.waiters.remove(entry)
+                self.in_flight += 1
+                future.set_result(None)
+        GRADING_QUEUED.set(len(self.waiters))
+        GRADING_IN_FLIGHT.set(self.in_flight)
+
+    def _queue_ahead(self, priority: bool) -> bool:
+        # Priority requests only queue behind other priority requests.
+        return any(p for p, _ in self.waiters) if priority else bool(self.waiters)
+
+    async def acquire(self, priority: bool):
+        if self.in_flight < self._limit(priority) and not self._queue_ahead(priority):
+            self.in_flight += 1
+            GRADING_IN_FLIGHT.set(self.in_flight)
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            self._shed(priority)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, future)
+        self.waiters.append(entry)
+        GRADING_QUEUED.set(len(self.waiters))
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Admitted in the same loop iteration as the timeout: the slot is ours.
+                return
+            self._drop(entry)
+            self._shed(priority)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we were cancelled: hand the slot on.
+                self.release(None)
+            else:
+                self._drop(entry)
+            raise
+
+    def _drop(self, entry):
+        if entry in self.waiters:
+            self.waiters.remove(entry)
+        GRADING_QUEUED.set(len(self.waiters))
+
+    def release(self, seconds: float | None):
+        self.in_flight -= 1
+        if seconds is not None:
+            self.avg_seconds = 0.2 * seconds + 0.8 * self.avg_seconds
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority: bool):
+        with track_stage("admission"):
+            await self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+
+grading_admission = AdmissionController(
+    MAX_CONCURRENCY, RESERVED_PRIORITY, MAX_QUEUE, QUEUE_TIMEOUT
+)
@@ -0,0 +1,109 @@
+"""
+Per-request deadlines and client-disconnect cancellation for LLM work.
+
+`CancelPolicy.interactive(request)` runs the work in a child task and cancels
+it when the client disconnects or the deadline passes; the deadline is also
+propagated to each LLM attempt as its timeout via `remaining_time`.
+`CancelPolicy.persistent()` never cancels: it is used where the result is
+stored for a later retry (idempotent requests), so paid work is not thrown away.
+"""
+
+import asyncio
+import os
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Awaitable, Optional, TypeVar
+
+from fastapi import HTTPException, Request
+
+from utils.metrics import LLM_CANCELLATIONS
+
+T = TypeVar("T")
+
+# Upper bound for interactive checks; clients may ask for less with X-Request-Timeout.
+CHECK_DEADLINE_SECONDS = float(os.getenv("CHECK_DEADLINE_SECONDS", "60"))
+MIN_DEADLINE_SECONDS = 5.0
+
+# nginx's "client closed request"; never seen by the client, but shows up in logs.
+CLIENT_CLOSED_REQUEST = 499
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left until the current request's deadline, or None without one."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - asyncio.get_running_loop().time())
+
+
+async def _wait_for_disconnect(request: Request):
+    # The body has already been read, so the next message is the disconnect.
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+@dataclass
+class CancelPolicy:
+    deadline: Optional[float] = None
+    request: Optional[Request] = None
+
+    @classmethod
+    def interactive(cls, request: Request) -> "CancelPolicy":
+        timeout = CHECK_DEADLINE_SECONDS
+        requested = request.headers.get("x-request-timeout")
+        if requested:
+            try:
+                timeout = min(timeout, max(MIN_DEADLINE_SECONDS, float(requested)))
+            except ValueError:
+                pass
+        return cls(deadline=asyncio.get_running_loop().time() + timeout, request=request)
+
+    @classmethod
+    def persistent(cls) -> "CancelPolicy":
+        return cls()
+
+    async def run(self, work: Awaitable[T]) -> T:
+        if self.deadline is None and self.request is None:
+            return await work
+
+        token = _deadline.set(self.deadline)
+        try:
+            # The child task copies the context, deadline included.
+            task = asyncio.ensure_future(work)
+        finally:
+            _deadline.reset(token)
+        watcher = (
+            asyncio.create_task(_wait_for_disconnect(self.request))
+            if self.request is not None
+            else None
+        )
+
+        timeout = None
+        if self.deadline is not None:
+            timeout = max(0.0, self.deadline - asyncio.get_running_loop().time())
+        try:
+            done, _ = await asyncio.wait(
+                {task} | ({watcher} if watcher else set()),
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+        if task in done:
+            return task.result()
+
+        task.cancel()
+        if watcher is not None and watcher in done:
+            LLM_CANCELLATIONS.labels(reason="disconnect").inc()
+            raise HTTPException(CLIENT_CLOSED_REQUEST, "Client disconnected")
+        LLM_CANCELLATIONS.labels(reason="deadline").inc()
+        raise HTTPException(504, "Grading took too long")
@@ -0,0 +1,171 @@
+"""
+Negotiated Brotli/gzip response compression.
+
+Applied after serialization: the first body chunk decides. A complete body
+below COMPRESSION_MIN_BYTES is sent as-is; larger bodies are compressed in one
+go, and streaming responses are compressed chunk by chunk with a flush after
+each one so the client never waits for the end of the stream. A strong ETag on a
+compressed response is made weak: the bytes differ per encoding, so a strong
+tag shared with the identity response would be wrong (RFC 9110, 8.8.3).
+
+Brotli needs the `compression` extra; without it clients get gzip. Time spent
+compressing is reported as the `compress` Server-Timing stage and in the
+`response_compression_seconds` histogram.
+"""
+
+import logging
+import os
+import time
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.metrics import RESPONSE_COMPRESSION_SECONDS
+from utils.timing import record_timing
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Brotli quality 4-5 compresses better than gzip -6 at similar CPU cost;
+# 11 is far slower and only worth it for static assets.
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported encoding from an Accept-Encoding header, honouring q-values."""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+
+    wildcard = offered.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = offered.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits 31: gzip container.
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+        spent = 0.0
+
+        def compress(data: bytes, final: bool) -> bytes:
+            nonlocal spent
+            began = time.perf_counter()
+            out = compressor.compress(data, final)
+            spent += time.perf_counter() - began
+            return out
+
+        def finish_timing():
+            RESPONSE_COMPRESSION_SECONDS.labels(encoding=encoding).observe(spent)
+            record_timing("compress", spent)
+
+        async def send_compressed(message: Message):
+            nonlocal start_message, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(
+                    COMPRESSIBLE_TYPES
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held back until the first body chunk shows whether to compress.
+                    start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body and len(body) < COMPRESSION_MIN_BYTES:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding)
+                compressed = compress(body, final=not more_body)
+                if not more_body:
+                    finish_timing()
+
+                headers = MutableHeaders(raw=list(start_message.get("headers", [])))
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["etag"] = "W/" + etag
+                if more_body:
+                    del headers["content-length"]
+                else:
+                    headers["content-length"] = str(len(compressed))
+                start_message["headers"] = headers.raw
+                await send(start_message)
+                await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+                return
+
+            compressed = compress(body, final=not more_body)
+            if not more_body:
+                finish_timing()
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
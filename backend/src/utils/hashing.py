@@ -0,0 +1,9 @@
+"""Stable content keys shared by storage, similarity and the question catalog."""
+
+import hashlib
+
+
+def question_hash(question: str) -> str:
+    """Stable key for a question, insensitive to whitespace differences."""
+    normalized = " ".join(question.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
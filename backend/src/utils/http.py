@@ -0,0 +1,58 @@
+"""
+One shared, tuned async HTTP client per worker, injected into the OpenAI and
+Clerk SDKs so they share keep-alive connections and explicit pool limits.
+"""
+
+import logging
+import os
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def http_timeout() -> "httpx.Timeout":
+    import httpx
+
+    return httpx.Timeout(
+        connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+        read=float(os.getenv("HTTP_READ_TIMEOUT", "60")),
+        write=float(os.getenv("HTTP_WRITE_TIMEOUT", "10")),
+        pool=float(os.getenv("HTTP_POOL_TIMEOUT", "5")),
+    )
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    global _client
+    if _client is None:
+        import httpx
+
+        http2 = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but h2 is not installed, using HTTP/1.1")
+                http2 = False
+
+        _client = httpx.AsyncClient(
+            http2=http2,
+            timeout=http_timeout(),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+                keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+            ),
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,45 @@
+"""
+Conditional GET helpers: weak ETags, If-None-Match and 304 responses.
+
+ETags are derived from identifiers and versions the handler already has
+(the test id, the user's `history_version`), never from the response body,
+so a matching request is answered before loading or serializing anything.
+They are weak because one tag covers every content encoding of the response.
+"""
+
+import hashlib
+
+from fastapi import Request, Response
+
+# Bump when the serialized shape of a cached response changes.
+ETAG_SCHEMA_VERSION = "1"
+
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    key = ":".join(str(part) for part in (ETAG_SCHEMA_VERSION, *parts))
+    return 'W/"{}"'.format(hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison, as RFC 9110 prescribes for If-None-Match."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def cache_headers(response: Response, etag: str, cache_control: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    response = Response(status_code=304)
+    cache_headers(response, etag, cache_control)
+    return response
@@ -0,0 +1,265 @@
+"""
+OpenAI-compatible LLM providers with latency-aware routing and failover.
+
+Providers come from LLM_PROVIDERS, a JSON list; without it there is a single
+"openai" provider built from OPENAI_API_KEY / OPENAI_BASE_URL as before:
+
+    LLM_PROVIDERS='[
+      {"name": "openai", "api_key_env": "OPENAI_API_KEY", "model": "gpt-4o"},
+      {"name": "azure", "kind": "azure", "endpoint": "https://x.openai.azure.com",
+       "api_version": "2024-10-21", "model": "gpt-4o-prod", "pricing_model": "gpt-4o",
+       "api_key_env": "AZURE_OPENAI_API_KEY"},
+      {"name": "local", "base_url": "http://localhost:8100/v1", "api_key": "fake"}
+    ]'
+
+"local" here is scripts/fake_openai_server.py, or any self-hosted server
+speaking the chat-completions API (vLLM, llama.cpp, ...).
+
+Every call updates the provider's moving averages of latency and error rate.
+Requests go to the healthy provider with the lowest expected latency, with a
+small share sent elsewhere to keep the other estimates fresh. A provider that
+fails LLM_ROUTER_FAILURE_THRESHOLD times in a row is skipped for
+LLM_ROUTER_COOLDOWN_SECONDS, and a failed call moves on to the next provider.
+With more than one provider the SDK does not retry (max_retries=0): failing
+over is faster than retrying the provider that just failed. Each attempt gets
+what is left of the request deadline as its timeout.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional
+
+from utils.cancellation import remaining_time
+from utils.http import get_http_client, http_timeout
+from utils.metrics import LLM_PROVIDER_REQUESTS, LLM_PROVIDER_SECONDS
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o"
+
+EWMA_ALPHA = float(os.getenv("LLM_ROUTER_EWMA_ALPHA", "0.2"))
+EXPLORE_RATE = float(os.getenv("LLM_ROUTER_EXPLORE_RATE", "0.05"))
+FAILURE_THRESHOLD = int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", "3"))
+COOLDOWN_SECONDS = float(os.getenv("LLM_ROUTER_COOLDOWN_SECONDS", "30"))
+# Each point of error rate counts as this many times the latency.
+ERROR_PENALTY = 4.0
+
+
+@dataclass
+class ProviderConfig:
+    name: str
+    model: str = DEFAULT_MODEL
+    kind: str = "openai"  # "openai" or "azure"
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    api_key_env: Optional[str] = None
+    endpoint: Optional[str] = None  # azure
+    api_version: Optional[str] = None  # azure
+    pricing_model: Optional[str] = None
+    max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+    def resolve_api_key(self) -> str:
+        api_key = self.api_key or (os.getenv(self.api_key_env) if self.api_key_env else None)
+        if not api_key:
+            source = self.api_key_env or "api_key"
+            raise ValueError(f"LLM provider {self.name!r}: {source} not found in environment variables.")
+        return api_key
+
+
+@dataclass
+class Provider:
+    config: ProviderConfig
+    client: "AsyncOpenAI"
+    latency_ewma: Optional[float] = None
+    error_ewma: float = 0.0
+    consecutive_failures: int = 0
+    open_until: float = 0.0
+    calls: int = 0
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    @property
+    def model(self) -> str:
+        return self.config.model
+
+    @property
+    def pricing_model(self) -> str:
+        return self.config.pricing_model or self.config.model
+
+    def available(self, now: float) -> bool:
+        return now >= self.open_until
+
+    def score(self) -> float:
+        # Unmeasured providers look fast so they get tried.
+        latency = self.latency_ewma if self.latency_ewma is not None else 0.0
+        return latency * (1 + ERROR_PENALTY * self.error_ewma)
+
+    def record(self, seconds: float, ok: bool):
+        self.calls += 1
+        if ok:
+            self.latency_ewma = (
+                seconds
+                if self.latency_ewma is None
+                else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.latency_ewma
+            )
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= FAILURE_THRESHOLD:
+                self.open_until = time.monotonic() + COOLDOWN_SECONDS
+                logger.warning(
+                    "LLM provider %s failed %d times in a row, skipping it for %.0fs",
+                    self.name,
+                    self.consecutive_failures,
+                    COOLDOWN_SECONDS,
+                )
+        self.error_ewma = EWMA_ALPHA * (0.0 if ok else 1.0) + (1 - EWMA_ALPHA) * self.error_ewma
+        LLM_PROVIDER_REQUESTS.labels(provider=self.name, outcome="ok" if ok else "error").inc()
+        LLM_PROVIDER_SECONDS.labels(provider=self.name).observe(seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "latency_ewma": self.latency_ewma,
+            "error_ewma": round(self.error_ewma, 4),
+            "consecutive_failures": self.consecutive_failures,
+            "available": self.available(time.monotonic()),
+            "calls": self.calls,
+        }
+
+
+def load_provider_configs() -> list[ProviderConfig]:
+    raw = os.getenv("LLM_PROVIDERS")
+    if not raw:
+        return [
+            ProviderConfig(
+                name="openai",
+                api_key_env="OPENAI_API_KEY",
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+            )
+        ]
+    try:
+        return [ProviderConfig(**entry) for entry in json.loads(raw)]
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid LLM_PROVIDERS: {e}")
+
+
+def build_client(config: ProviderConfig) -> "AsyncOpenAI":
+    # Imported lazily: the openai SDK is the heaviest import in the app.
+    from openai import AsyncAzureOpenAI, AsyncOpenAI
+
+    common = {
+        "api_key": config.resolve_api_key(),
+        "http_client": get_http_client(),
+        "timeout": http_timeout(),
+        "max_retries": config.max_retries,
+    }
+    if config.kind == "azure":
+        if not config.endpoint or not config.api_version:
+            raise ValueError(f"LLM provider {config.name!r}: azure needs endpoint and api_version")
+        return AsyncAzureOpenAI(
+            azure_endpoint=config.endpoint, api_version=config.api_version, **common
+        )
+    return AsyncOpenAI(base_url=config.base_url, **common)
+
+
+class LLMRouter:
+    def __init__(self, providers: list[Provider]):
+        if not providers:
+            raise ValueError("No LLM providers configured.")
+        self.providers = providers
+
+    def ranked(self) -> list[Provider]:
+        """Providers in the order to try them: healthy by score, then the cooling-down ones."""
+        now = time.monotonic()
+        healthy = sorted(
+            (p for p in self.providers if p.available(now)), key=lambda p: p.score()
+        )
+        cooling = sorted(
+            (p for p in self.providers if not p.available(now)), key=lambda p: p.open_until
+        )
+        if len(healthy) > 1 and random.random() < EXPLORE_RATE:
+            explored = random.choice(healthy[1:])
+            healthy.remove(explored)
+            healthy.insert(0, explored)
+        # With every provider cooling down, still try them rather than fail outright.
+        return healthy + cooling
+
+    async def create(self, **kwargs) -> tuple[Provider, Any]:
+        """chat.completions.create on the best provider, failing over on transient errors."""
+        from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+        last_error = None
+        for provider in self.ranked():
+            # The deadline is shared by all attempts, so it is re-read before each one.
+            timeout = remaining_time()
+            if timeout is not None:
+                if timeout <= 0 and last_error is not None:
+                    break
+                kwargs["timeout"] = timeout
+            start = time.perf_counter()
+            try:
+                response = await provider.client.chat.completions.create(
+                    model=provider.model, **kwargs
+                )
+            except (APIConnectionError, APITimeoutError) as e:
+                provider.record(time.perf_counter() - start, ok=False)
+                last_error = e
+            except APIStatusError as e:
+                if e.status_code != 429 and e.status_code < 500:
+                    # The request itself is wrong; another provider won't help.
+                    raise
+                provider.record(time.perf_counter() - start, ok=False)
+                last_error = e
+            else:
+                provider.record(time.perf_counter() - start, ok=True)
+                return provider, response
+            logger.warning("LLM provider %s failed (%r), failing over", provider.name, last_error)
+        raise last_error
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return [provider.snapshot() for provider in self.providers]
+
+
+# One router per worker process, created in the app lifespan (after fork).
+_router: Optional[LLMRouter] = None
+
+
+def get_llm_router() -> LLMRouter:
+    global _router
+    if _router is None:
+        configs = load_provider_configs()
+        if len(configs) > 1:
+            for config in configs:
+                config.max_retries = 0
+        _router = LLMRouter([Provider(config, build_client(config)) for config in configs])
+    return _router
+
+
+async def warm_up_llm():
+    """Opens the TLS connection to every provider; listing models is free."""
+    router = get_llm_router()
+    results = await asyncio.gather(
+        *(provider.client.models.list() for provider in router.providers),
+        return_exceptions=True,
+    )
+    for provider, result in zip(router.providers, results):
+        if isinstance(result, BaseException):
+            logger.warning("Warm-up of LLM provider %s failed: %r", provider.name, result)
+
+
+def close_llm_router():
+    # The underlying HTTP client is shared and closed by utils.http.
+    global _router
+    _router = None
@@ -0,0 +1,107 @@
+"""
+Logging setup: records are put on an in-memory queue and written out by a
+background thread (QueueListener), so log I/O never blocks the event loop.
+Formatting happens on that thread as well (see `DeferredQueueHandler`).
+uvicorn's loggers go through the same queue. Session tokens passed as
+`?token=` (WebSocket handshakes) are redacted from every record.
+
+APP_ENV=development logs at DEBUG with every payload log; production (the
+default) logs at INFO and samples payload logs at LOG_PAYLOAD_SAMPLE_RATE.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+DEVELOPMENT = os.getenv("APP_ENV", "production").lower() == "development"
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "debug" if DEVELOPMENT else "info").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+# Share of payload logs (questions, essays, LLM responses) kept when DEBUG is on.
+PAYLOAD_SAMPLE_RATE = float(
+    os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1" if DEVELOPMENT else "0.01")
+)
+PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+
+_TOKEN_QUERY_RE = re.compile(r"([?&]token=)[^&\s\"']+")
+
+_listener: Optional[QueueListener] = None
+
+
+def redact_tokens(value):
+    if isinstance(value, str):
+        return _TOKEN_QUERY_RE.sub(r"\1[redacted]", value)
+    return value
+
+
+class RedactTokensFilter(logging.Filter):
+    """Masks query-string tokens, e.g. in uvicorn's "WebSocket /path?token=..." lines."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.msg = redact_tokens(record.msg)
+        if isinstance(record.args, tuple):
+            record.args = tuple(redact_tokens(arg) for arg in record.args)
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler.prepare() formats the message and traceback on the calling
+    thread, so that records can be pickled. Our queue is in-process, so the
+    record is queued as is and the listener's handler formats it. The catch:
+    arguments are rendered later, so they must not be mutated after logging.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging():
+    """Routes the root and uvicorn loggers through the queue; safe to call twice."""
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    log_queue = queue.SimpleQueue()
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RedactTokensFilter())
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Writes out what is still queued and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_payload(logger: logging.Logger, msg: str, *payloads):
+    """
+    DEBUG log of large values, sampled and truncated. Nothing is formatted
+    unless DEBUG is enabled for `logger` and the record is sampled.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= PAYLOAD_SAMPLE_RATE:
+        return
+    logger.debug(msg, *(str(payload)[:PAYLOAD_MAX_CHARS] for payload in payloads))
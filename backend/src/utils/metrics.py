@@ -0,0 +1,167 @@
+"""
+Prometheus metrics for the grading pipeline.
+
+When running several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty,
+writable directory before the workers start. Every worker then writes its
+samples there and /metrics aggregates them.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from utils.timing import record_timing
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+REQUEST_STAGE_SECONDS = Histogram(
+    "request_stage_seconds",
+    "Duration of each stage of the request pipeline",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "LLM tokens used, by model and kind (prompt, completion, cached)",
+    ["model", "kind"],
+)
+
+LLM_COST_USD = Counter(
+    "llm_cost_usd_total",
+    "Estimated LLM cost in USD, by model",
+    ["model"],
+)
+
+LLM_IN_FLIGHT = Gauge(
+    "llm_in_flight_calls",
+    "LLM calls currently in flight",
+    multiprocess_mode="livesum",
+)
+
+MONGO_OPERATION_SECONDS = Histogram(
+    "mongo_operation_seconds",
+    "Latency of PsycheckDB methods",
+    ["method"],
+    buckets=STAGE_BUCKETS,
+)
+
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total",
+    "Requests rejected by the rate limiter",
+    ["path"],
+)
+
+LLM_PROVIDER_REQUESTS = Counter(
+    "llm_provider_requests_total",
+    "LLM calls per provider, by outcome (ok, error)",
+    ["provider", "outcome"],
+)
+
+LLM_PROVIDER_SECONDS = Histogram(
+    "llm_provider_seconds",
+    "Latency of LLM calls per provider",
+    ["provider"],
+    buckets=STAGE_BUCKETS,
+)
+
+LLM_CANCELLATIONS = Counter(
+    "llm_cancellations_total",
+    "LLM calls abandoned before completion, by reason (disconnect, deadline)",
+    ["reason"],
+)
+
+GRADING_IN_FLIGHT = Gauge(
+    "grading_in_flight",
+    "Gradings admitted and running",
+    multiprocess_mode="livesum",
+)
+
+GRADING_QUEUED = Gauge(
+    "grading_queued",
+    "Gradings waiting for admission",
+    multiprocess_mode="livesum",
+)
+
+GRADING_SHED = Counter(
+    "grading_shed_total",
+    "Gradings rejected with 503 by admission control",
+    ["priority"],
+)
+
+QUESTION_CATALOG_LOOKUPS = Counter(
+    "question_catalog_lookups_total",
+    "Gradings by whether a precomputed question analysis was attached (hit, miss, backoff)",
+    ["outcome"],
+)
+
+RESPONSE_COMPRESSION_SECONDS = Histogram(
+    "response_compression_seconds",
+    "CPU time spent compressing one response body, by encoding",
+    ["encoding"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+
+@contextmanager
+def track_stage(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        REQUEST_STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+        record_timing(stage, elapsed)
+
+
+def observe_db_method(func):
+    """Records the latency of an async PsycheckDB method."""
+    histogram = MONGO_OPERATION_SECONDS.labels(method=func.__name__)
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            histogram.observe(elapsed)
+            record_timing("db", elapsed)
+
+    return wrapper
+
+
+def record_llm_usage(
+    model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int, cost: float
+):
+    LLM_TOKENS.labels(model=model, kind="prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(model=model, kind="completion").inc(completion_tokens)
+    LLM_TOKENS.labels(model=model, kind="cached").inc(cached_tokens)
+    LLM_COST_USD.labels(model=model).inc(cost)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead():
+    """Drops this worker's live gauges from the multiprocess directory on shutdown."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,32 +1,119 @@
 import json
-import os
-from dotenv import load_dotenv
-from openai import AsyncOpenAI
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Optional
+from config.llmPricing import estimate_cost
+from utils.metrics import LLM_IN_FLIGHT, record_llm_usage
+from utils.tracing import start_span
+from utils.llm_router import get_llm_router
 
-load_dotenv()
+# Sampling settings of every grading call (also used by scripts/replay_tests.py).
+COMPLETION_OPTIONS = {
+    "max_tokens": 3000,
+    "response_format": {"type": "json_object"},
+    "temperature": 0.7,
+}
 
-api_key = os.getenv("OPENAI_API_KEY")
 
-if not api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment variables.")
+@dataclass
+class LLMUsage:
+    """Token and cost totals of the prompt_llm calls made inside `track_llm_usage`."""
 
-client = AsyncOpenAI(api_key=api_key)
+    calls: int = 0
+    # Provider, deployment and priced model of the latest call, i.e. the one
+    # that produced the result.
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    pricing_model: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+
+    def add(
+        self,
+        provider: str,
+        model: str,
+        pricing_model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int,
+        cost: float,
+    ):
+        self.calls += 1
+        self.provider, self.model, self.pricing_model = provider, model, pricing_model
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_tokens += cached_tokens
+        self.cost_usd += cost
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+_usage: ContextVar[Optional[LLMUsage]] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_llm_usage():
+    """Collects the usage of every prompt_llm call in this context, child tasks included."""
+    usage = LLMUsage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
 
 
 async def prompt_llm(prompt: str, system_message: str = None) -> dict:
     if not system_message:
         system_message = "Only reply with the asked description text and nothing else!"
 
-    response = await client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": prompt},
-        ],
-        max_tokens=3000,
-        response_format={"type": "json_object"},
-        temperature=0.7,
-    )
+    # The router passes what is left of the request deadline to each attempt.
+    with start_span("prompt_llm") as span:
+        with LLM_IN_FLIGHT.track_inprogress():
+            provider, response = await get_llm_router().create(
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt},
+                ],
+                **COMPLETION_OPTIONS,
+            )
+        if span is not None:
+            span.set_attribute("llm.provider", provider.name)
+            span.set_attribute("llm.model", provider.model)
+
+        # Self-hosted servers may omit usage: the call still counts, with no tokens.
+        prompt_tokens = completion_tokens = cached_tokens = 0
+        cost = 0.0
+        usage = response.usage
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached_tokens = getattr(details, "cached_tokens", 0) or 0
+            cost = estimate_cost(
+                provider.pricing_model, prompt_tokens, completion_tokens, cached_tokens
+            )
+            record_llm_usage(
+                provider.pricing_model, prompt_tokens, completion_tokens, cached_tokens, cost
+            )
+            if span is not None:
+                span.set_attribute("llm.prompt_tokens", prompt_tokens)
+                span.set_attribute("llm.completion_tokens", completion_tokens)
+                span.set_attribute("llm.cached_tokens", cached_tokens)
+
+        tracked = _usage.get()
+        if tracked is not None:
+            tracked.add(
+                provider.name,
+                provider.model,
+                provider.pricing_model,
+                prompt_tokens,
+                completion_tokens,
+                cached_tokens,
+                cost,
+            )
 
     response_content = response.choices[0].message.content.strip()
     return json.loads(response_content)
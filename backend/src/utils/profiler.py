@@ -0,0 +1,132 @@
+"""
+Opt-in sampling profiler for slow or randomly sampled requests.
+
+Uses pyinstrument (the `profiling` extra) and writes speedscope JSON files,
+which load directly as flamegraphs in https://www.speedscope.app.
+
+Settings come from the environment and can be changed at runtime through
+the control file (PROFILER_CONTROL_FILE), which every worker re-reads when
+it changes. `routes/admin.py` exposes it over HTTP.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime
+from pathlib import Path
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+CONTROL_FILE = Path(os.getenv("PROFILER_CONTROL_FILE", "profiler.json"))
+CONTROL_CHECK_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class ProfilerSettings:
+    enabled: bool = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+    # Fraction of requests to profile regardless of latency.
+    sample_rate: float = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))
+    # Keep profiles of requests slower than this (0 = off). When set, every
+    # request is profiled and only the slow ones are written out.
+    slow_threshold_ms: float = float(os.getenv("PROFILER_SLOW_THRESHOLD_MS", "0"))
+    interval: float = float(os.getenv("PROFILER_INTERVAL", "0.001"))
+    output_dir: str = os.getenv("PROFILER_OUTPUT_DIR", "profiles")
+
+
+_settings = ProfilerSettings()
+_control_mtime = None
+_last_check = 0.0
+
+
+def get_settings() -> ProfilerSettings:
+    """Current settings, refreshed from the control file at most once per second."""
+    global _settings, _control_mtime, _last_check
+    now = time.monotonic()
+    if now - _last_check < CONTROL_CHECK_INTERVAL:
+        return _settings
+    _last_check = now
+
+    try:
+        mtime = CONTROL_FILE.stat().st_mtime
+    except FileNotFoundError:
+        return _settings
+    if mtime == _control_mtime:
+        return _settings
+
+    try:
+        overrides = json.loads(CONTROL_FILE.read_text())
+        _settings = replace(ProfilerSettings(), **overrides)
+        _control_mtime = mtime
+        logger.info("Profiler settings updated: %s", asdict(_settings))
+    except (ValueError, TypeError):
+        logger.exception("Ignoring invalid profiler control file %s", CONTROL_FILE)
+        _control_mtime = mtime
+    return _settings
+
+
+def update_settings(**overrides) -> ProfilerSettings:
+    """Writes new settings to the control file so all workers pick them up."""
+    global _settings, _control_mtime
+    settings = replace(get_settings(), **overrides)
+    CONTROL_FILE.write_text(json.dumps(asdict(settings)))
+    _settings = settings
+    _control_mtime = CONTROL_FILE.stat().st_mtime
+    return settings
+
+
+def _write_profile(profiler, path: Path):
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(profiler.output(renderer=SpeedscopeRenderer()))
+
+
+class ProfilerMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        settings = get_settings()
+        if scope["type"] != "http" or not settings.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        sampled = random.random() < settings.sample_rate
+        if not sampled and settings.slow_threshold_ms <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("Profiler enabled but pyinstrument is not installed")
+            await self.app(scope, receive, send)
+            return
+
+        profiler = Profiler(interval=settings.interval, async_mode="enabled")
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if sampled or elapsed_ms >= settings.slow_threshold_ms:
+                name = "{}-{}-{}-{:.0f}ms.speedscope.json".format(
+                    datetime.utcnow().strftime("%Y%m%dT%H%M%S%f"),
+                    scope["method"],
+                    scope["path"].strip("/").replace("/", "_") or "root",
+                    elapsed_ms,
+                )
+                path = Path(settings.output_dir) / name
+                try:
+                    await asyncio.to_thread(_write_profile, profiler, path)
+                    logger.info("Wrote profile %s", path)
+                except OSError:
+                    logger.exception("Failed to write profile %s", path)
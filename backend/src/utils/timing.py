@@ -0,0 +1,76 @@
+"""
+Per-request stage timings exposed as a `Server-Timing` response header.
+
+Stages record into a request-scoped dict (see `record_timing`); the
+middleware renders auth, db, llm, serialize and compress durations plus the total
+when the response starts.
+"""
+
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SERVER_TIMING_STAGES = ("auth", "db", "llm", "serialize", "compress")
+
+_request_timings: ContextVar[dict | None] = ContextVar("request_timings", default=None)
+
+
+def record_timing(stage: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+class TimedRoute(APIRoute):
+    """Marks when the endpoint returns so the middleware can time serialization."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        @wraps(endpoint)
+        async def timed_endpoint(*args, **kw):
+            try:
+                return await endpoint(*args, **kw)
+            finally:
+                timings = _request_timings.get()
+                if timings is not None:
+                    timings["_endpoint_done"] = time.perf_counter()
+
+        super().__init__(path, timed_endpoint, **kwargs)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: dict = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                endpoint_done = timings.pop("_endpoint_done", None)
+                if endpoint_done is not None:
+                    timings["serialize"] = now - endpoint_done
+                entries = [
+                    f"{stage};dur={timings[stage] * 1000:.1f}"
+                    for stage in SERVER_TIMING_STAGES
+                    if stage in timings
+                ]
+                entries.append(f"total;dur={(now - start) * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(entries).encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
@@ -0,0 +1,127 @@
+"""
+Optional OpenTelemetry tracing.
+
+Disabled unless TRACING_EXPORTER is set to one of:
+    otlp     export over OTLP/HTTP (endpoint from OTEL_EXPORTER_OTLP_ENDPOINT)
+    console  print finished spans to stdout
+    file     append finished spans as JSON lines to TRACING_FILE_PATH
+
+Requires the `tracing` extra (opentelemetry-sdk and the OTLP exporter).
+When disabled, `start_span` and `traced` cost a single global lookup.
+"""
+
+import inspect
+import logging
+import os
+from contextlib import nullcontext
+from functools import wraps
+
+from fastapi import FastAPI, Request
+
+logger = logging.getLogger(__name__)
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "essaycheck-backend")
+
+_tracer = None
+
+
+def _build_exporter(kind: str):
+    if kind == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+
+    if kind == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter()
+
+    if kind == "file":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        # ConsoleSpanExporter writes to any stream; one compact JSON span per line.
+        return ConsoleSpanExporter(
+            out=open(TRACING_FILE_PATH, "a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+
+    raise ValueError(f"Unknown TRACING_EXPORTER: {kind}")
+
+
+def setup_tracing(app: FastAPI):
+    """Installs the tracer provider and the per-request server span middleware."""
+    global _tracer
+    if TRACING_EXPORTER in ("", "none"):
+        return
+
+    try:
+        from opentelemetry import propagate, trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("TRACING_EXPORTER is set but opentelemetry is not installed")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(_build_exporter(TRACING_EXPORTER)))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("essaycheck")
+
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        with _tracer.start_as_current_span(
+            f"{request.method} {request.url.path}",
+            context=propagate.extract(request.headers),
+            kind=trace.SpanKind.SERVER,
+            attributes={"http.method": request.method, "http.target": request.url.path},
+        ) as span:
+            response = await call_next(request)
+            route = request.scope.get("route")
+            if route is not None:
+                span.update_name(f"{request.method} {route.path}")
+                span.set_attribute("http.route", route.path)
+            span.set_attribute("http.status_code", response.status_code)
+            return response
+
+    logger.info("Tracing enabled with %s exporter", TRACING_EXPORTER)
+
+
+def start_span(name: str, **attributes):
+    """Context manager yielding the active span, or None when tracing is disabled."""
+    if _tracer is None:
+        return nullcontext(None)
+    return _tracer.start_as_current_span(name, attributes=attributes or None)
+
+
+def traced(name: str = None):
+    """Wraps a sync or async function in a span named `name` (default: qualname)."""
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return await func(*args, **kwargs)
+                with _tracer.start_as_current_span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.start_as_current_span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,13 @@
+import asyncio
+
+from routes.admin import UserLLMSpend, top_spenders
+
+
+def test_top_spenders_rows_are_keyed_by_user_id():
+    class FakeDB:
+        async def top_llm_spenders(self, since, limit):
+            return [{"_id": "u1", "calls": 3, "cost_usd": 0.12}]
+
+    (row,) = asyncio.run(top_spenders(days=7, limit=20, db=FakeDB()))
+    assert row == {"user_id": "u1", "calls": 3, "cost_usd": 0.12}
+    assert UserLLMSpend.model_validate(row).user_id == "u1"
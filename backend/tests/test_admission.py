@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from utils.admission import AdmissionController
+
+
+def controller(capacity=2, reserved=1, max_queue=2, queue_timeout=1.0):
+    return AdmissionController(capacity, reserved, max_queue, queue_timeout)
+
+
+def test_reserved_slots_are_for_priority_users():
+    async def main():
+        admission = controller()
+        await admission.acquire(priority=False)
+        waiting = asyncio.create_task(admission.acquire(priority=False))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        await admission.acquire(priority=True)
+        assert admission.in_flight == 2
+        waiting.cancel()
+
+    asyncio.run(main())
+
+
+def test_priority_waiters_are_admitted_first():
+    async def main():
+        admission = controller(capacity=1, reserved=0, max_queue=4)
+        await admission.acquire(priority=False)
+        order = []
+
+        async def wait(name, priority):
+            await admission.acquire(priority)
+            order.append(name)
+
+        tasks = [asyncio.create_task(wait("normal", False)), asyncio.create_task(wait("priority", True))]
+        await asyncio.sleep(0)
+        admission.release(1.0)
+        await asyncio.sleep(0)
+        admission.release(1.0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["priority", "normal"]
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def main():
+        admission = controller(capacity=1, reserved=0, max_queue=1)
+        await admission.acquire(priority=False)
+        waiting = asyncio.create_task(admission.acquire(priority=False))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as error:
+            await admission.acquire(priority=False)
+        waiting.cancel()
+        return error.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 503
+    assert int(error.headers["Retry-After"]) >= 1
+
+
+def test_waiting_too_long_is_shed():
+    async def main():
+        admission = controller(capacity=1, reserved=0, queue_timeout=0.01)
+        await admission.acquire(priority=False)
+        with pytest.raises(HTTPException):
+            await admission.acquire(priority=False)
+        assert not admission.waiters
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        admission = controller(capacity=1, reserved=0)
+        await admission.acquire(priority=False)
+        waiting = asyncio.create_task(admission.acquire(priority=False))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        admission.release(1.0)
+        assert admission.in_flight == 0 and not admission.waiters
+
+    asyncio.run(main())
+
+
+def test_waiter_admitted_as_it_times_out_keeps_its_slot(monkeypatch):
+    admission = controller(capacity=1, reserved=0)
+
+    async def wait_for(future, timeout):
+        # The holder releases, and _wake admits the waiter, in the same loop
+        # iteration in which the wait times out.
+        admission.release(1.0)
+        assert future.done()
+        raise asyncio.TimeoutError
+
+    async def main():
+        await admission.acquire(priority=False)
+        monkeypatch.setattr(asyncio, "wait_for", wait_for)
+        await admission.acquire(priority=False)
+        monkeypatch.undo()
+        assert admission.in_flight == 1
+        admission.release(1.0)
+        assert admission.in_flight == 0
+
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from routes import checks
+from utils.cancellation import CLIENT_CLOSED_REQUEST, CancelPolicy, remaining_time
+
+QUESTION = "האם לדעתכם יש לאפשר להורים לחנך את ילדיהם בחינוך ביתי?"
+ON_TOPIC = (
+    "לדעתי יש לאפשר להורים לחנך את ילדיהם בחינוך ביתי. החינוך הביתי מאפשר להורים "
+    "להתאים את הלימודים לילדים, והילדים לומדים בקצב שלהם. עם זאת, חינוך ביתי דורש "
+    "מההורים זמן רב, ולא כל ההורים יכולים לחנך את ילדיהם בבית."
+)
+ESSAY = " ".join([ON_TOPIC] * 4)
+
+
+def client_request(disconnect_after=None, headers=()):
+    async def receive():
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": list(headers)}
+    return Request(scope, receive)
+
+
+async def forever():
+    await asyncio.sleep(3600)
+
+
+def test_deadline_expiry_is_a_504():
+    async def main():
+        policy = CancelPolicy(deadline=asyncio.get_running_loop().time() + 0.05)
+        with pytest.raises(HTTPException) as error:
+            await policy.run(forever())
+        return error.value
+
+    assert asyncio.run(main()).status_code == 504
+
+
+def test_client_disconnect_is_a_499():
+    async def main():
+        policy = CancelPolicy(request=client_request(disconnect_after=0.01))
+        with pytest.raises(HTTPException) as error:
+            await policy.run(forever())
+        return error.value
+
+    assert asyncio.run(main()).status_code == CLIENT_CLOSED_REQUEST
+
+
+def test_interactive_deadline_is_bounded_by_the_client_header():
+    async def main():
+        request = client_request(headers=[(b"x-request-timeout", b"1")])
+        policy = CancelPolicy.interactive(request)
+        return policy.deadline - asyncio.get_running_loop().time()
+
+    # Clamped up to MIN_DEADLINE_SECONDS.
+    assert 4 < asyncio.run(main()) <= 5
+
+
+def test_persistent_work_is_never_cancelled():
+    async def work():
+        await asyncio.sleep(0.05)
+        return remaining_time()
+
+    async def main():
+        return await CancelPolicy.persistent().run(work())
+
+    assert asyncio.run(main()) is None
+
+
+class FakeDB:
+    def __init__(self):
+        self.spent = self.refunded = 0
+        self.created = []
+
+    async def find_lsh_candidates(self, buckets, **filters):
+        return []
+
+    async def spend_credit(self, user_id):
+        self.spent += 1
+        return {"_id": user_id}
+
+    async def refund_credit(self, user_id):
+        self.refunded += 1
+
+    async def record_llm_spend(self, user_id, usage, graded):
+        pass
+
+    async def create_test(self, **fields):
+        self.created.append(fields)
+        return fields
+
+
+def test_disconnect_during_grading_refunds_the_credit(monkeypatch):
+    async def no_analysis(db, question):
+        return None
+
+    async def slow_grading(**kwargs):
+        await forever()
+
+    monkeypatch.setattr(checks, "get_question_analysis", no_analysis)
+    monkeypatch.setattr(checks, "check_essay_with_ai", slow_grading)
+    db = FakeDB()
+    payload = checks.CheckEssayPayload(question=QUESTION, essay=ESSAY)
+    user = {"_id": "u1", "credits": 1, "clerk_id": "c1"}
+
+    async def main():
+        policy = CancelPolicy.interactive(client_request(disconnect_after=0.05))
+        with pytest.raises(HTTPException) as error:
+            await checks.run_essay_check(payload, user, db, policy)
+        return error.value
+
+    assert asyncio.run(main()).status_code == CLIENT_CLOSED_REQUEST
+    assert (db.spent, db.refunded, db.created) == (1, 1, [])
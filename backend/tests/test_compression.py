@@ -0,0 +1,74 @@
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from utils import compression
+from utils.compression import CompressionMiddleware, negotiate_encoding
+
+BODY = {"text": "מילה " * 1000}
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br;q=0, gzip;q=0", None),
+        ("*", "br"),
+        ("*;q=0.2, gzip;q=0.1", "br"),
+    ],
+)
+@pytest.mark.skipif(compression.brotli is None, reason="needs the compression extra")
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_gzip_only_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate_encoding("br, gzip;q=0.1") == "gzip"
+    assert negotiate_encoding("br") is None
+
+
+def make_client():
+    async def large(request):
+        return JSONResponse(BODY, headers={"ETag": '"abc"'})
+
+    async def small(request):
+        return JSONResponse({"ok": True}, headers={"ETag": '"abc"'})
+
+    async def image(request):
+        return Response(b"\0" * 4096, media_type="image/png")
+
+    app = Starlette(routes=[Route("/large", large), Route("/small", small), Route("/image", image)])
+    return TestClient(CompressionMiddleware(app))
+
+
+def test_large_json_is_compressed_with_a_weak_etag():
+    response = make_client().get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == BODY
+
+
+def test_small_and_binary_responses_are_sent_as_is():
+    client = make_client()
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.headers["etag"] == '"abc"'
+    image = client.get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in image.headers
+
+
+def test_streamed_chunks_are_flushed():
+    compressor = compression._Compressor("gzip")
+    first = compressor.compress(b"a" * 100, final=False)
+    last = compressor.compress(b"b" * 100, final=True)
+    assert gzip.decompress(first + last) == b"a" * 100 + b"b" * 100
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+
+from controllers.db import CREDIT_REFILL_INTERVAL, DAILY_CREDITS, available_credits
+
+NOW = datetime(2026, 1, 10, 12, 0)
+
+
+def test_new_user_gets_a_refill():
+    assert available_credits({}, NOW) == DAILY_CREDITS
+
+
+def test_no_refill_before_the_interval():
+    user = {"credits": 0, "last_credit_update": NOW - CREDIT_REFILL_INTERVAL + timedelta(minutes=1)}
+    assert available_credits(user, NOW) == 0
+
+
+def test_refill_once_the_interval_has_passed():
+    user = {"credits": 0, "last_credit_update": NOW - CREDIT_REFILL_INTERVAL}
+    assert available_credits(user, NOW) == DAILY_CREDITS
+
+
+def test_refill_keeps_extra_credits():
+    user = {"credits": DAILY_CREDITS + 3, "last_credit_update": NOW - 2 * CREDIT_REFILL_INTERVAL}
+    assert available_credits(user, NOW) == DAILY_CREDITS + 3
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services.essay_checker import (
+    LENGTH_SUGGESTION,
+    calculate_results,
+    merge_revision,
+    reuse_results,
+)
+
+
+def criteria(score):
+    return [{"criterion": name, "score": score, "feedback": ""} for name in ("א", "ב")]
+
+
+def results(content=4, language=4):
+    return {
+        "content": {"criterias": criteria(content)},
+        "language": {"criterias": criteria(language)},
+        "suggestions": [],
+    }
+
+
+def essay(lines):
+    return " ".join(["מילה"] * (12 * lines))
+
+
+def test_calculate_results_scores_a_valid_essay():
+    graded = calculate_results(results(5, 3), essay(30))
+    assert graded["content"]["score"] == 5
+    assert graded["language"]["score"] == 3
+    assert graded["complete_score"] == 16
+
+
+def test_calculate_results_deducts_for_a_short_essay():
+    graded = calculate_results(results(4, 4), essay(15))
+    assert graded["language"]["score"] == 3
+    assert LENGTH_SUGGESTION in graded["suggestions"]
+
+
+def test_reuse_results_applies_the_new_length():
+    short = calculate_results(results(4, 4), essay(15))
+    reused = reuse_results(short, essay(30))
+    assert reused["language"]["score"] == 4
+    assert reused["length_conclusion"] == "אורך החיבור תקין. אין ניכוי נקודות."
+    assert LENGTH_SUGGESTION not in reused["suggestions"]
+    # The stored results are left untouched.
+    assert short["language"]["score"] == 3
+
+
+def test_merge_revision_replaces_criteria_by_name():
+    previous = calculate_results(results(3, 3), essay(30))
+    revision = {
+        "content": {"criterias": [{"criterion": "א", "score": 6, "feedback": "טוב"}]},
+        "suggestions": ["חדש"],
+    }
+    merged = merge_revision(previous, revision)
+    assert [c["score"] for c in merged["content"]["criterias"]] == [6, 3]
+    assert merged["language"]["criterias"] == previous["language"]["criterias"]
+    assert merged["suggestions"] == ["חדש"]
+    # The previous results are not modified.
+    assert previous["content"]["criterias"][0]["score"] == 3
+
+
+def test_revision_of_results_without_criteria_is_graded_in_full(monkeypatch):
+    from routes import checks
+
+    calls = []
+
+    async def full_grading(**kwargs):
+        calls.append(kwargs)
+        return {"graded": "full"}
+
+    monkeypatch.setattr(checks, "check_essay_with_ai", full_grading)
+    rejected = {"content": {"criterias": []}, "language": {"criterias": []}}
+    revised = {"essay": "פסקה ישנה.\n\nסיום.", "results": rejected}
+    payload = checks.CheckEssayPayload(question="שאלה", essay="פסקה חדשה.\n\nסיום.")
+    assert asyncio.run(checks.regrade_revision(payload, revised, {})) == {"graded": "full"}
+    assert len(calls) == 1
+
+
+def test_revision_of_a_test_of_another_question_is_rejected():
+    from routes import checks
+
+    class FakeDB:
+        async def get_test(self, test_id):
+            return {"_id": test_id, "user_id": "u1", "question": "שאלה  ישנה", "results": {}}
+
+    user = {"_id": "u1"}
+    same = checks.CheckEssayPayload(
+        question="שאלה ישנה", essay="חיבור", previous_test_id="a" * 24
+    )
+    assert asyncio.run(checks.load_revised_test(FakeDB(), same, user))["_id"] == "a" * 24
+
+    other = same.model_copy(update={"question": "שאלה אחרת"})
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(checks.load_revised_test(FakeDB(), other, user))
+    assert error.value.status_code == 422
@@ -0,0 +1,39 @@
+from starlette.requests import Request
+
+from utils.http_cache import (
+    IMMUTABLE_CACHE_CONTROL,
+    etag_matches,
+    make_etag,
+    not_modified,
+)
+
+
+def request_with(if_none_match=None):
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_make_etag_is_weak_and_stable():
+    etag = make_etag("test", "abc", 1)
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == make_etag("test", "abc", 1)
+    assert etag != make_etag("test", "abc", 2)
+
+
+def test_etag_matches():
+    etag = make_etag("test", "abc")
+    opaque = etag.removeprefix("W/")
+    assert not etag_matches(request_with(), etag)
+    assert etag_matches(request_with(etag), etag)
+    assert etag_matches(request_with(opaque), etag)
+    assert etag_matches(request_with(f'"other", {etag}'), etag)
+    assert etag_matches(request_with("*"), etag)
+    assert not etag_matches(request_with('W/"other"'), etag)
+
+
+def test_not_modified():
+    response = not_modified('W/"abc"', IMMUTABLE_CACHE_CONTROL)
+    assert response.status_code == 304
+    assert response.headers["etag"] == 'W/"abc"'
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.body == b""
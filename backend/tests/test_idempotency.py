@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+
+from routes import checks
+
+PAYLOAD = checks.CheckEssayPayload(question="שאלה", essay="חיבור")
+USER = {"_id": "u1"}
+
+
+class FakeDB:
+    def __init__(self, record, test=None):
+        self.record = record
+        self.test = test
+        self.touched = 0
+        self.finished = []
+
+    async def claim_idempotency_key(self, user_id, key, fingerprint):
+        if self.record is None:
+            self.record = {"fingerprint": fingerprint, "status": "pending"}
+            return True, self.record
+        return False, {**self.record, "fingerprint": fingerprint}
+
+    async def get_idempotency_record(self, user_id, key):
+        return self.record
+
+    async def get_test(self, test_id):
+        return self.test
+
+    async def touch_idempotency_key(self, user_id, key):
+        self.touched += 1
+
+    async def finish_idempotency_key(self, user_id, key, test_id):
+        self.finished.append(test_id)
+
+
+def run(db):
+    response = Response()
+    test = asyncio.run(checks.check_essay_idempotent(PAYLOAD, USER, "key", response, db))
+    return test, response
+
+
+def test_owner_refreshes_the_key_while_checking(monkeypatch):
+    monkeypatch.setattr(checks, "IDEMPOTENCY_HEARTBEAT_SECONDS", 0.01)
+
+    async def slow_check(payload, user, db, policy):
+        await asyncio.sleep(0.05)
+        return {"_id": "t1"}
+
+    monkeypatch.setattr(checks, "run_essay_check", slow_check)
+    db = FakeDB(None)
+    test, _ = run(db)
+    assert test == {"_id": "t1"}
+    assert db.touched >= 2
+    assert db.finished == ["t1"]
+
+
+def test_retry_of_a_finished_request_is_replayed():
+    db = FakeDB({"status": "done", "test_id": "t1"}, test={"_id": "t1"})
+    test, response = run(db)
+    assert test == {"_id": "t1"}
+    assert response.headers["Idempotent-Replayed"] == "true"
+
+
+def test_finished_request_whose_test_is_missing_is_an_error():
+    db = FakeDB({"status": "done", "test_id": "t1"}, test=None)
+    with pytest.raises(HTTPException) as error:
+        run(db)
+    assert error.value.status_code == 500
+
+
+def test_claims_are_bounded():
+    # A failed record that this request never manages to claim.
+    db = FakeDB({"status": "failed", "test_id": None})
+    with pytest.raises(HTTPException) as error:
+        run(db)
+    assert error.value.status_code == 409
@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIConnectionError
+
+from utils import llm_router
+from utils.cancellation import CancelPolicy, _deadline
+from utils.llm_router import LLMRouter, Provider, ProviderConfig
+
+
+def fake_provider(name, delay=0.0, fail=False):
+    timeouts = []
+
+    async def create(model, timeout=None, **kwargs):
+        timeouts.append(timeout)
+        await asyncio.sleep(delay)
+        if fail:
+            raise APIConnectionError(request=httpx.Request("POST", "http://llm"))
+        return name
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    provider = Provider(ProviderConfig(name=name), client)
+    provider.timeouts = timeouts
+    return provider
+
+
+def run_with_deadline(router, seconds):
+    async def main():
+        policy = CancelPolicy(deadline=asyncio.get_running_loop().time() + seconds)
+        return await policy.run(router.create(messages=[]))
+
+    return asyncio.run(main())
+
+
+@pytest.fixture(autouse=True)
+def no_exploration(monkeypatch):
+    monkeypatch.setattr(llm_router, "EXPLORE_RATE", 0.0)
+
+
+def test_fails_over_with_the_remaining_deadline():
+    first = fake_provider("first", delay=0.1, fail=True)
+    second = fake_provider("second")
+    provider, response = run_with_deadline(LLMRouter([first, second]), 5)
+    assert (provider, response) == (second, "second")
+    assert second.timeouts[0] < first.timeouts[0] - 0.05
+
+
+def test_no_failover_once_the_deadline_has_passed():
+    first = fake_provider("first", delay=0.05, fail=True)
+    second = fake_provider("second")
+
+    async def main():
+        # Only the deadline, without a CancelPolicy cancelling the work when it passes.
+        _deadline.set(asyncio.get_running_loop().time() + 0.01)
+        with pytest.raises(APIConnectionError):
+            await LLMRouter([first, second]).create(messages=[])
+
+    asyncio.run(main())
+    assert second.timeouts == []
+
+
+def test_sdk_retries_are_disabled_with_several_providers(monkeypatch):
+    monkeypatch.setattr(
+        llm_router,
+        "load_provider_configs",
+        lambda: [ProviderConfig(name="a", max_retries=2), ProviderConfig(name="b", max_retries=2)],
+    )
+    monkeypatch.setattr(llm_router, "build_client", lambda config: None)
+    monkeypatch.setattr(llm_router, "_router", None)
+    router = llm_router.get_llm_router()
+    assert [p.config.max_retries for p in router.providers] == [0, 0]
+
+
+@pytest.mark.parametrize("usage", [None, SimpleNamespace(prompt_tokens=10, completion_tokens=5)])
+def test_provider_and_model_are_tracked_with_or_without_usage(monkeypatch, usage):
+    from utils import openAI
+
+    config = ProviderConfig(name="local", model="llama-3", pricing_model="gpt-4o")
+    message = SimpleNamespace(content='{"ok": true}')
+    response = SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    class Router:
+        async def create(self, **kwargs):
+            return Provider(config, None), response
+
+    monkeypatch.setattr(openAI, "get_llm_router", lambda: Router())
+
+    async def main():
+        with openAI.track_llm_usage() as tracked:
+            assert await openAI.prompt_llm("prompt") == {"ok": True}
+        return tracked
+
+    tracked = asyncio.run(main())
+    assert (tracked.calls, tracked.provider, tracked.model, tracked.pricing_model) == (
+        1,
+        "local",
+        "llama-3",
+        "gpt-4o",
+    )
+    assert tracked.prompt_tokens == (10 if usage else 0)
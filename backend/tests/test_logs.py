@@ -0,0 +1,15 @@
+import logging
+import queue
+
+from utils.logs import DeferredQueueHandler
+
+
+def test_records_are_queued_unformatted():
+    log_queue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    record = logging.LogRecord("test", logging.INFO, "", 0, "score %d", (5,), None)
+    handler.handle(record)
+    queued = log_queue.get_nowait()
+    assert queued is record
+    assert (queued.msg, queued.args) == ("score %d", (5,))
+    assert queued.getMessage() == "score 5"
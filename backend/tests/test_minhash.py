@@ -0,0 +1,83 @@
+import asyncio
+
+from services.minhash import (
+    BANDS,
+    estimate_similarity,
+    find_near_duplicates,
+    lsh_buckets,
+    minhash_signature,
+)
+from utils.hashing import question_hash
+
+ESSAY = " ".join(f"מילה{i} משפט{i % 7} רעיון{i % 11}" for i in range(120))
+
+
+class FakeDB:
+    """Returns the stored candidates matching the filters find_near_duplicates uses."""
+
+    def __init__(self, tests):
+        self.tests = tests
+        self.calls = []
+
+    async def find_lsh_candidates(self, buckets, user_id=None, exclude_user_id=None, question_key=None):
+        self.calls.append((user_id, exclude_user_id, question_key))
+        return [
+            test
+            for test in self.tests
+            if set(test["buckets"]) & set(buckets)
+            and (user_id is None or test["user_id"] == user_id)
+            and (exclude_user_id is None or test["user_id"] != exclude_user_id)
+            and (question_key is None or test["question_hash"] == question_key)
+        ]
+
+
+def stored(test_id, user_id, essay, question="שאלה"):
+    signature = minhash_signature(essay)
+    return {
+        "_id": test_id,
+        "user_id": user_id,
+        "minhash": signature,
+        "buckets": lsh_buckets(signature),
+        "question_hash": question_hash(question),
+    }
+
+
+def test_identical_texts_have_identical_signatures():
+    assert estimate_similarity(minhash_signature(ESSAY), minhash_signature(ESSAY)) == 1.0
+    assert len(lsh_buckets(minhash_signature(ESSAY))) == BANDS
+
+
+def test_small_edit_stays_similar_and_shares_a_bucket():
+    edited = ESSAY.replace("מילה5 ", "מילה חדשה ", 1)
+    a, b = minhash_signature(ESSAY), minhash_signature(edited)
+    assert estimate_similarity(a, b) > 0.9
+    assert set(lsh_buckets(a)) & set(lsh_buckets(b))
+
+
+def test_unrelated_texts_are_dissimilar():
+    other = " ".join(f"אחר{i} טקסט{i % 5}" for i in range(120))
+    assert estimate_similarity(minhash_signature(ESSAY), minhash_signature(other)) < 0.1
+
+
+def test_own_resubmission_is_found_and_copies_are_counted():
+    signature = minhash_signature(ESSAY)
+    db = FakeDB(
+        [stored("own", "u1", ESSAY)]
+        + [stored(f"copy{i}", f"u{i + 2}", ESSAY) for i in range(3)]
+    )
+    result = asyncio.run(
+        find_near_duplicates(db, "u1", "שאלה", signature, lsh_buckets(signature))
+    )
+    assert result["reused_from"] == "own"
+    assert result["copied_by_other_users"] == 3
+    assert result["mass_copy"]
+    assert ("u1", None, question_hash("שאלה")) in db.calls
+
+
+def test_resubmission_on_another_question_is_not_reused():
+    signature = minhash_signature(ESSAY)
+    db = FakeDB([stored("own", "u1", ESSAY, question="שאלה אחרת")])
+    result = asyncio.run(
+        find_near_duplicates(db, "u1", "שאלה", signature, lsh_buckets(signature))
+    )
+    assert result["reused_from"] is None
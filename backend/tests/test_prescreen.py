@@ -0,0 +1,38 @@
+from services.prescreen import hebrew_ratio, prescreen_essay, rejection_detail
+
+QUESTION = "האם לדעתכם יש לאפשר להורים לחנך את ילדיהם בחינוך ביתי?"
+ON_TOPIC = (
+    "לדעתי יש לאפשר להורים לחנך את ילדיהם בחינוך ביתי. החינוך הביתי מאפשר להורים "
+    "להתאים את הלימודים לילדים, והילדים לומדים בקצב שלהם. עם זאת, חינוך ביתי דורש "
+    "מההורים זמן רב, ולא כל ההורים יכולים לחנך את ילדיהם בבית."
+)
+
+
+def test_hebrew_ratio():
+    assert hebrew_ratio("שלום world") == 4 / 9
+    assert hebrew_ratio("123") == 0.0
+
+
+def test_on_topic_essay_passes():
+    result = prescreen_essay(QUESTION, ON_TOPIC)
+    assert result.passed
+    assert result.reason == "ok"
+
+
+def test_hebrew_essay_with_english_quotes_passes():
+    essay = ON_TOPIC + ' כפי שנאמר: "home schooling is freedom".'
+    assert prescreen_essay(QUESTION, essay).passed
+
+
+def test_english_essay_is_rejected():
+    result = prescreen_essay(QUESTION, "Parents should be allowed to home school their kids. " * 5)
+    assert not result.passed
+    assert result.reason == "not_hebrew"
+    assert rejection_detail(result) == "Essay is not written in Hebrew"
+
+
+def test_unrelated_essay_is_rejected():
+    essay = "הים התיכון חם מאוד בקיץ, והדגים שוחים בין הסלעים ליד החוף הצפוני של הארץ."
+    result = prescreen_essay(QUESTION, essay)
+    assert not result.passed
+    assert result.reason == "off_topic"
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+from config.llmPrompts import question_analysis_system_prompt, question_analysis_user_prompt
+from scripts.fake_openai_server import build_content
+from services import question_catalog
+
+QUESTION = "האם לאפשר חינוך ביתי?"
+
+
+class FakeDB:
+    def __init__(self):
+        self.lookups = self.claims = 0
+        self.finished = []
+
+    async def get_catalog_question(self, key):
+        self.lookups += 1
+        return None
+
+    async def claim_catalog_question(self, key, question):
+        self.claims += 1
+        return True
+
+    async def finish_catalog_question(self, key, analysis):
+        self.finished.append(analysis)
+
+    async def record_llm_spend(self, user_id, usage, graded):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def empty_catalog():
+    asyncio.run(question_catalog.close_question_catalog())
+    yield
+    asyncio.run(question_catalog.close_question_catalog())
+
+
+def lookup_twice(db):
+    async def main():
+        first = await question_catalog.get_question_analysis(db, QUESTION)
+        await asyncio.gather(*question_catalog._analyzing.values())
+        second = await question_catalog.get_question_analysis(db, QUESTION)
+        await asyncio.gather(*question_catalog._analyzing.values())
+        return first, second
+
+    return asyncio.run(main())
+
+
+def test_failed_analysis_is_not_retried_on_every_grading(monkeypatch):
+    async def failing(question):
+        raise ValueError("Question analysis without a topic")
+
+    monkeypatch.setattr(question_catalog, "analyze_question", failing)
+    db = FakeDB()
+    assert lookup_twice(db) == (None, None)
+    assert (db.lookups, db.claims, db.finished) == (1, 1, [None])
+
+
+def test_analysis_is_cached_once_ready(monkeypatch):
+    async def analyze(question):
+        return {"topic": "חינוך ביתי", "key_arguments": [], "stances": []}
+
+    monkeypatch.setattr(question_catalog, "analyze_question", analyze)
+    db = FakeDB()
+    first, second = lookup_twice(db)
+    assert first is None and second["topic"] == "חינוך ביתי"
+    assert db.lookups == 1
+
+
+def test_fake_server_answers_the_question_analysis_prompt():
+    messages = [
+        {"role": "system", "content": question_analysis_system_prompt},
+        {"role": "user", "content": question_analysis_user_prompt.format(question=QUESTION)},
+    ]
+    analysis = json.loads(build_content(messages))
+    assert analysis["topic"] == QUESTION
+    assert analysis["key_arguments"] and analysis["stances"]
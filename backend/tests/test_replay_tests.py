@@ -0,0 +1,46 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from scripts.replay_tests import has_criteria, replay_one, score_deltas
+
+
+def test_prescreen_rejections_have_no_criteria():
+    assert not has_criteria(None)
+    assert not has_criteria({"content": {"criterias": []}, "language": {"criterias": []}})
+    assert has_criteria({"content": {"criterias": [{"criterion": "א", "score": 3}]}})
+
+
+def test_score_deltas():
+    stored = {"complete_score": 14, "content": {"score": 4, "criterias": [{"criterion": "א", "score": 4}]}}
+    replayed = {"complete_score": 16, "content": {"score": 5, "criterias": [{"criterion": "א", "score": 5}]}}
+    deltas = score_deltas(stored, replayed)
+    assert deltas["complete"] == 2
+    assert deltas["content"] == 1
+    assert deltas["content:א"] == 1.0
+
+
+def test_replay_uses_the_catalog_analysis():
+    graded = {
+        "task_topic": "נושא אחר",
+        "content": {"criterias": [{"criterion": "א", "score": 4}]},
+        "language": {"criterias": [{"criterion": "ב", "score": 4}]},
+        "suggestions": [],
+    }
+    prompts_seen = []
+
+    class Router:
+        async def create(self, messages, **options):
+            prompts_seen.append(messages[1]["content"])
+            message = SimpleNamespace(content=json.dumps(graded))
+            return None, SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    test = {
+        "_id": "t1",
+        "question": "שאלה",
+        "essay": " ".join(["מילה"] * 360),
+        "results": {"complete_score": 16},
+    }
+    row = asyncio.run(replay_one(Router(), None, test, {"topic": "חינוך ביתי"}))
+    assert "error" not in row
+    assert "חינוך ביתי" in prompts_seen[0]
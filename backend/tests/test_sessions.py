@@ -0,0 +1,73 @@
+import asyncio
+import logging
+
+import pytest
+from fastapi import HTTPException
+from starlette.websockets import WebSocket
+
+from routes import sessions
+from utils.ClerkAuth import websocket_auth_request, websocket_origin_allowed
+from utils.logs import RedactTokensFilter
+
+
+def handshake(query=b"", origin=None):
+    headers = [(b"origin", origin.encode())] if origin else []
+    scope = {"type": "websocket", "path": "/sessions/grading", "query_string": query, "headers": headers}
+    return WebSocket(scope, receive=None, send=None)
+
+
+def test_origin_check():
+    assert websocket_origin_allowed(handshake(origin="https://psycheck.gchshell.uk"))
+    assert websocket_origin_allowed(handshake())
+    assert not websocket_origin_allowed(handshake(origin="https://evil.example"))
+
+
+def test_token_from_the_query_string():
+    request = websocket_auth_request(handshake(b"token=abc"))
+    assert request.headers["authorization"] == "Bearer abc"
+
+
+def test_token_that_is_not_latin_1_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        websocket_auth_request(handshake(b"token=%D7%90%D7%91"))
+    assert error.value.status_code == 401
+
+
+def test_tokens_are_redacted_from_logs():
+    record = logging.LogRecord(
+        "uvicorn.error", logging.INFO, "", 0, '%s - "WebSocket %s" [accepted]',
+        ("127.0.0.1:5000", "/sessions/grading?token=eyJ.secret&x=1"), None,
+    )
+    RedactTokensFilter().filter(record)
+    assert "secret" not in record.getMessage()
+    assert "?token=[redacted]&x=1" in record.getMessage()
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+def test_session_checks_are_rate_limited(monkeypatch):
+    graded = []
+
+    async def grade(self, payload, request_id):
+        graded.append(request_id)
+
+    monkeypatch.setattr(sessions.GradingSession, "grade", grade)
+    socket = FakeSocket()
+    session = sessions.GradingSession(socket, db=None, user={"_id": "rate-limited-user"})
+
+    async def main():
+        for i in range(6):
+            await session.handle({"type": "check", "question": "שאלה", "essay": "חיבור", "request_id": str(i)})
+            await session.check_task
+
+    asyncio.run(main())
+    assert graded == ["0", "1", "2", "3", "4"]
+    error = socket.sent[-1]
+    assert (error["status"], error["request_id"]) == (429, "5")
+    assert 1 <= error["retry_after"] <= 60
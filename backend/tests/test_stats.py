@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime
+
+from controllers.db import PsycheckDB
+from routes.admin import QuestionStats, question_stats
+from routes.users import UserStats, format_user_stats
+
+USER_ID = "0123456789abcdef01234567"
+NOW = datetime(2026, 1, 10, 12, 0)
+
+
+class CapturingCollection:
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, filter, update, upsert=False):
+        self.updates.append(update)
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        return self.setdefault(name, CapturingCollection())
+
+
+def record(results):
+    db = PsycheckDB(FakeDatabase())
+    asyncio.run(db.record_test_stats(USER_ID, NOW, results))
+    (update,) = db.user_stats.updates
+    return update
+
+
+def test_graded_test_is_folded_into_the_stats():
+    update = record(
+        {
+            "complete_score": 16,
+            "content": {"score": 5, "criterias": [{"criterion": "טיעון.ראשי", "score": 5}]},
+            "language": {"score": 3, "criterias": [{"criterion": "לשון", "score": 3}]},
+        }
+    )
+    assert update["$inc"]["count"] == 1
+    assert update["$inc"]["sum_complete"] == 16
+    assert update["$inc"]["criteria.טיעון_ראשי.sum"] == 5
+    assert update["$set"]["criteria.טיעון_ראשי.name"] == "טיעון.ראשי"
+    assert update["$max"] == {"best_score": 16}
+
+
+def test_test_without_scores_or_criteria_is_counted_as_zero():
+    update = record({"content": {"criterias": []}, "language": {"criterias": []}})
+    assert update["$inc"] == {
+        "count": 1,
+        "sum_complete": 0.0,
+        "sum_content": 0.0,
+        "sum_language": 0.0,
+    }
+    assert set(update["$push"]) == {"recent"}
+
+
+def test_user_without_gradings_gets_empty_stats():
+    assert format_user_stats(None) == UserStats()
+    assert format_user_stats({"count": 0}) == UserStats()
+
+
+def test_user_stats_averages():
+    stats = format_user_stats(
+        {
+            "count": 2,
+            "sum_complete": 30,
+            "sum_content": 9,
+            "sum_language": 7,
+            "best_score": 16,
+            "criteria": {"לשון": {"name": "לשון", "section": "language", "sum": 7, "count": 2}},
+        }
+    )
+    assert stats.average_complete == 15
+    assert stats.criteria["לשון"].average == 3.5
+
+
+def test_question_without_gradings_has_no_averages():
+    class FakeDB:
+        async def question_stats(self, since, limit):
+            # $avg over tests whose scores are all null (pre-screen rejections).
+            return [
+                {
+                    "_id": "abc",
+                    "tests": 2,
+                    "users": 1,
+                    "avg_complete": None,
+                    "avg_content": None,
+                    "avg_language": None,
+                    "last_test_at": NOW,
+                }
+            ]
+
+    rows = asyncio.run(question_stats(days=30, limit=50, db=FakeDB()))
+    assert rows[0]["question_hash"] == "abc" and "_id" not in rows[0]
+    stats = QuestionStats.model_validate(rows[0])
+    assert stats.avg_complete is None and stats.topic is None
@@ -0,0 +1,134 @@
+import asyncio
+from datetime import datetime
+
+from bson import Binary, ObjectId
+
+from controllers.db import PsycheckDB, assemble_test, pack_json, pack_text, unpack_json, unpack_text
+from routes import checks
+
+USER_ID = "0123456789abcdef01234567"
+
+RESULTS = {
+    "length_conclusion": "אורך תקין",
+    "complete_score": 16,
+    "task_topic": "חינוך ביתי",
+    "general_conclusion": "חיבור טוב. " * 40,
+    "content": {"score": 5, "criterias": [{"criterion": "טיעון", "score": 5, "feedback": "טוב"}]},
+    "language": {"score": 3, "criterias": [{"criterion": "לשון", "score": 3, "feedback": "סביר"}]},
+    "suggestions": ["להוסיף דוגמה"],
+}
+
+
+def matches(doc, filter):
+    for field, condition in filter.items():
+        if isinstance(condition, dict) and "$in" in condition:
+            if doc.get(field) not in condition["$in"]:
+                return False
+        elif doc.get(field) != condition:
+            return False
+    return True
+
+
+def project(doc, projection):
+    if not projection:
+        return dict(doc)
+    if all(value == 0 for value in projection.values()):
+        return {k: v for k, v in doc.items() if k not in projection}
+    # Inclusion, by top-level field.
+    fields = {name.split(".")[0] for name in projection} | {"_id"}
+    return {k: v for k, v in doc.items() if k in fields}
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    async def update_one(self, filter, update, upsert=False):
+        pass
+
+    async def find_one(self, filter, projection=None):
+        return next((project(d, projection) for d in self.docs if matches(d, filter)), None)
+
+    def find(self, filter, projection=None):
+        return Cursor([project(d, projection) for d in self.docs if matches(d, filter)])
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name):
+        return self.setdefault(name, FakeCollection())
+
+
+def store_tests(*created_at):
+    db = PsycheckDB(FakeDatabase())
+
+    async def create(moment):
+        return await db.create_test(
+            user_id=USER_ID,
+            created_at=moment,
+            results=RESULTS,
+            question="האם לאפשר חינוך ביתי?",
+            essay="חינוך ביתי מאפשר גמישות. " * 60,
+            analysis={"word_count": 240},
+            minhash=[1, 2, 3],
+            lsh_buckets=["0:abc"],
+        )
+
+    created = [asyncio.run(create(moment)) for moment in created_at]
+    return db, created
+
+
+def test_text_round_trip():
+    short, long = "קצר", "ארוך " * 500
+    assert pack_text(short) == short
+    assert isinstance(pack_text(long), Binary)
+    assert unpack_text(pack_text(long)) == long
+    assert unpack_json(pack_json(RESULTS)) == RESULTS
+    # Results stored before the split are plain documents.
+    assert unpack_json(RESULTS) == RESULTS
+
+
+def test_document_from_before_the_split_is_returned_as_is():
+    legacy = {"_id": ObjectId(), "question": "שאלה", "essay": "חיבור", "results": RESULTS}
+    assert assemble_test(legacy, None) is legacy
+
+
+def test_split_test_reassembles_into_the_same_payload():
+    db, (created,) = store_tests(datetime(2026, 1, 1))
+    details = db.test_details.docs[0]
+    assert isinstance(details["essay"], Binary) and isinstance(details["results"], Binary)
+    assert "essay" not in db.tests.docs[0]
+
+    fetched = asyncio.run(db.get_test(created["_id"]))
+    assert "minhash" not in fetched and "lsh_buckets" not in fetched
+    expected = checks.Test.model_validate(created).model_dump()
+    assert checks.Test.model_validate(fetched).model_dump() == expected
+    (listed,) = asyncio.run(db.get_user_tests(USER_ID))
+    assert checks.Test.model_validate(listed).model_dump() == expected
+
+
+def test_history_and_summaries_share_the_order():
+    db, created = store_tests(datetime(2026, 1, 2), datetime(2026, 1, 1))
+    full = asyncio.run(db.get_user_tests(USER_ID))
+    summaries = asyncio.run(db.get_user_test_summaries(USER_ID))
+    assert [t["_id"] for t in full] == [t["_id"] for t in summaries] == [
+        created[1]["_id"],
+        created[0]["_id"],
+    ]
+    summary = checks.TestSummary.model_validate(summaries[0])
+    assert summary.topic == "חינוך ביתי"
+    assert summary.scores.complete == 16
@@ -0,0 +1,83 @@
+import pytest
+
+from services.text_analysis import (
+    analyze_essay,
+    count_words_and_lines,
+    diff_paragraphs,
+    stem_word,
+)
+
+
+@pytest.mark.parametrize(
+    "singular, plural",
+    [
+        ("טלפון", "טלפונים"),
+        ("שינוי", "שינויים"),
+        ("מערכת", "מערכות"),
+        ("ילד", "ילדים"),
+    ],
+)
+def test_singular_and_plural_share_a_stem(singular, plural):
+    assert stem_word(singular) == stem_word(plural)
+
+
+def test_final_letters_are_normalized():
+    assert stem_word("טלפון") == "טלפונ"
+
+
+def test_root_letter_of_short_word_is_kept():
+    assert stem_word("מערכת") == "מערכ"
+    assert stem_word("שלום") == "שלומ"
+
+
+def test_prefixes_are_stripped_from_long_words():
+    assert stem_word("והמערכת") == stem_word("מערכת")
+    assert stem_word("בטלפון") == stem_word("טלפון")
+
+
+def test_count_words_and_lines():
+    assert count_words_and_lines("מילה " * 25) == (25, 2)
+
+
+def test_everyday_words_are_not_slang():
+    analysis = analyze_essay("כאילו היה זה ממש סתם רעיון, אחי אמר. זה היה סבבה.")
+    assert analysis["slang"] == ["סבבה"]
+
+
+def test_connectives_are_not_repeated_roots():
+    essay = " ".join(["ולכן החינוך חשוב. אולם החינוך יקר."] * 6)
+    roots = {root["root"] for root in analyze_essay(essay)["repeated_roots"]}
+    assert "החינוך" in roots
+    assert not roots & {"ולכן", "אולם", "לכן"}
+
+
+def test_connectives_are_counted():
+    analysis = analyze_essay("ראשית, זה נכון.\n\nולכן זה חשוב.\n\nלסיכום, כך הדבר.")
+    assert analysis["connective_count"] == 3
+    assert analysis["paragraphs_opening_with_connective"] == 2
+    assert "לכן" in analysis["distinct_connectives"]
+
+
+def test_diff_paragraphs_reports_changes_and_neighbouring_context():
+    old = "פתיחה. סוף הפתיחה.\n\nאמצע ישן.\n\nסיום ראשון. סיום שני."
+    new = "פתיחה. סוף הפתיחה.\n\nאמצע חדש.\n\nסיום ראשון. סיום שני."
+    diff = diff_paragraphs(old, new)
+    assert diff["changed"] == [{"index": 1, "text": "אמצע חדש."}]
+    assert diff["removed"] == []
+    assert diff["context"] == [
+        {"index": 0, "text": "סוף הפתיחה."},
+        {"index": 2, "text": "סיום ראשון."},
+    ]
+    assert diff["changed_ratio"] == 1 / 3
+
+
+def test_diff_paragraphs_of_identical_essays_is_empty():
+    essay = "פסקה ראשונה.\n\nפסקה שנייה."
+    diff = diff_paragraphs(essay, essay.replace("\n\n", "\n\n  "))
+    assert not diff["changed"] and not diff["removed"] and not diff["context"]
+
+
+def test_diff_paragraphs_reports_removed_paragraphs():
+    diff = diff_paragraphs("א.\n\nב.\n\nג.", "א.\n\nג.")
+    assert diff["removed"] == ["ב."]
+    assert diff["changed"] == []